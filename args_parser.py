@@ -28,3 +28,7 @@ def parse_args():
 
     # Load the .env file
     load_dotenv(os.path.join(os.getcwd(), args.envfile))
+
+    # Warm up the services in the background (once per process; serve.py usually started it already)
+    import services.warmup
+    services.warmup.start()
@@ -0,0 +1,138 @@
+"""
+Measure what reducing the book index's embedding dimensions costs in recall, and what it
+saves in memory and search time.
+
+Usage:
+    python -m benchmarks.embedding_dimensions [--questions questions.txt] [--sample 200]
+        [--dimensions 768 384 192 96] [--reductions api pca] [--k 5] [--output report.json]
+
+The queries are embedded once at full size (they need valid API credentials in `.env`, or
+OPENAI_API_BASE_URL pointing at `benchmarks.mock_servers`) and every size is derived from
+them locally, the same way `services.rag_index` reduces the index. Recall is measured
+against the full size index: recall@1 is how often the top chunk is the same, recall@k the
+share of the full size top k chunks that are also found in the reduced top k. Without
+--questions, the queries are the opening sentences of a sample of the book's chunks.
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from typing import Dict, List
+
+import numpy as np
+from dotenv import load_dotenv
+
+import services.llm
+from services import rag
+from services.rag_batch import read_questions
+
+
+def _top_k(queries: np.ndarray, vectors: np.ndarray, k: int) -> np.ndarray:
+    similarities = queries @ vectors.T
+    top = np.argpartition(-similarities, k - 1, axis=1)[:, :k]
+    order = np.take_along_axis(similarities, top, axis=1).argsort(axis=1)[:, ::-1]
+    return np.take_along_axis(top, order, axis=1)
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+def _search_ms(queries: np.ndarray, vectors: np.ndarray, k: int, repeat: int = 5) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        _top_k(queries, vectors, k)
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings)) * 1000 / len(queries)
+
+
+def sample_queries(embeddings: List[Dict], sample: int) -> List[str]:
+    """
+    Use the opening sentence (up to 200 characters) of `sample` random chunks as queries.
+    """
+    chunks = random.Random(0).sample(embeddings, min(sample, len(embeddings)))
+    return [" ".join(emb["context"].split())[:200].split(". ")[0] for emb in chunks]
+
+
+def evaluate(corpus: np.ndarray, queries: np.ndarray, dimensions: List[int], reductions: List[str],
+             k: int) -> List[Dict]:
+    """
+    Compare retrieval with reduced embeddings against retrieval with the full size ones.
+
+    Args:
+        corpus: full size embeddings of the index, one per row
+        queries: full size embeddings of the queries, one per row
+        dimensions: the reduced sizes to evaluate
+        reductions: "api" and/or "pca" (see `rag.reduce_index`)
+        k: the number of chunks compared for recall@k
+
+    Returns: one result per (reduction, size), starting with the full size baseline
+    """
+    full_vectors, full_queries = _normalize(corpus), _normalize(queries)
+    truth = _top_k(full_queries, full_vectors, k)
+    results = [{"reduction": None, "dimensions": corpus.shape[1], "recall_at_1": 1.0, "recall_at_k": 1.0,
+                "index_mb": full_vectors.nbytes / 1024 ** 2,
+                "search_ms_per_query": _search_ms(full_queries, full_vectors, k)}]
+    for reduction in reductions:
+        for size in dimensions:
+            if size >= corpus.shape[1]:
+                continue
+            if reduction == "api":
+                vectors, reduced_queries = rag.truncate(corpus, size), rag.truncate(queries, size)
+            else:
+                try:
+                    projection = rag.fit_projection(corpus, size)
+                except ValueError as e:
+                    print(f"⏭️ pca {size}: {e}")
+                    continue
+                vectors, reduced_queries = rag.project(corpus, projection), rag.project(queries, projection)
+            vectors, reduced_queries = _normalize(vectors), _normalize(reduced_queries)
+            found = _top_k(reduced_queries, vectors, k)
+            results.append({
+                "reduction": reduction,
+                "dimensions": size,
+                "recall_at_1": float((found[:, 0] == truth[:, 0]).mean()),
+                "recall_at_k": float(np.mean([len(set(a) & set(b)) / k for a, b in zip(found, truth)])),
+                "index_mb": vectors.nbytes / 1024 ** 2,
+                "search_ms_per_query": _search_ms(reduced_queries, vectors, k),
+            })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the recall cost of reduced embedding dimensions.")
+    parser.add_argument("--index", default=rag.CSV_FILE_PATH, help="embeddings CSV of full size embeddings")
+    parser.add_argument("--questions", help="text, CSV or JSONL file of questions to use as queries")
+    parser.add_argument("--sample", type=int, default=200, help="chunks to take queries from without --questions")
+    parser.add_argument("--dimensions", type=int, nargs="+", default=[768, 384, 192, 96], help="reduced sizes")
+    parser.add_argument("--reductions", nargs="+", choices=rag.REDUCTIONS, default=list(rag.REDUCTIONS))
+    parser.add_argument("--k", type=int, default=5, help="chunks compared for recall@k")
+    parser.add_argument("--output", help="write the JSON report to this file")
+    args = parser.parse_args()
+    load_dotenv()
+
+    if rag.read_index_metadata(args.index)["reduction"] is not None:
+        parser.error(f"{args.index} is already reduced; evaluate a full size index")
+    embeddings = rag.load_embeddings_from_csv(args.index)
+    corpus = np.array([emb["embedding"] for emb in embeddings])
+    questions = read_questions(args.questions) if args.questions else sample_queries(embeddings, args.sample)
+    queries = asyncio.run(rag.embed_queries(services.llm.get_client(), questions))
+    print(f"Evaluating {len(questions)} queries against {len(embeddings)} chunks of {corpus.shape[1]} dimensions")
+
+    results = evaluate(corpus, queries, args.dimensions, args.reductions, min(args.k, len(embeddings)))
+    print(f"{'reduction':<10} {'dims':>5} {'recall@1':>9} {'recall@k':>9} {'index MB':>9} {'ms/query':>9}")
+    for result in results:
+        print(f"{result['reduction'] or 'full':<10} {result['dimensions']:>5} {result['recall_at_1']:>9.3f} "
+              f"{result['recall_at_k']:>9.3f} {result['index_mb']:>9.2f} {result['search_ms_per_query']:>9.4f}")
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump({"queries": len(questions), "chunks": len(embeddings), "k": args.k, "results": results},
+                      output_file, indent=2)
+        print(f"Report written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
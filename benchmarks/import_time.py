@@ -0,0 +1,136 @@
+"""
+Measure the cold start import time of each Streamlit page with `python -X importtime`.
+
+Usage:
+    python -m benchmarks.import_time [--repeat 3] [--top 5] [--output report.json] [--check]
+
+Each page's module-level imports are run in a fresh interpreter that has already imported
+streamlit, as the Streamlit server has when it first runs a page, so the time reported
+is what the page itself adds to a cold pod's first page load. The slowest packages are
+listed by their own (self) import time.
+
+With --check the exit code is 1 when a page goes over its budget in PAGE_BUDGETS_MS or
+imports one of the DEFERRED_MODULES, which the services only import on first use.
+"""
+import argparse
+import ast
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PAGES = ["🏠_Home.py"] + sorted(os.path.join("pages", name) for name in os.listdir(os.path.join(ROOT, "pages"))
+                               if name.endswith(".py"))
+
+# Import time budget of each page, on top of streamlit itself
+DEFAULT_BUDGET_MS = 150
+PAGE_BUDGETS_MS: Dict[str, float] = {
+    # numpy and PIL, for the gallery thumbnails and for audio processing
+    os.path.join("pages", "5_🏞️_Images.py"): 300,
+    os.path.join("pages", "6_️🎤_Voice_Chat.py"): 300,
+}
+
+# Packages that take hundreds of milliseconds or more to import and are only needed once a
+# page makes a request; no page should import them to render
+DEFERRED_MODULES = ("sklearn", "openai", "google.generativeai", "pandas", "tiktoken", "pdf2image", "PyPDF2", "gtts")
+
+_IMPORT_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|( *)(\S+)$")
+
+
+def page_imports(page: str) -> str:
+    """
+    Return the module-level import statements of a page as source code.
+    """
+    with open(os.path.join(ROOT, page), encoding="utf-8") as page_file:
+        tree = ast.parse(page_file.read())
+    return "\n".join(ast.unparse(node) for node in tree.body if isinstance(node, (ast.Import, ast.ImportFrom)))
+
+
+def measure(source: str) -> List[Tuple[str, int, int, int]]:
+    """
+    Run `source` with -X importtime in a fresh interpreter after importing streamlit.
+
+    Returns: (module, self µs, cumulative µs, nesting depth) for every module imported by `source`
+    """
+    script = f"import streamlit\nprint('---', file=__import__('sys').stderr)\n{source}"
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", script], cwd=ROOT, capture_output=True,
+                            text=True, env={**os.environ, "PYTHONDONTWRITEBYTECODE": "1"})
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing failed:\n{result.stderr[-2000:]}")
+    lines = result.stderr.split("---\n", 1)[1].splitlines()
+    modules = []
+    for line in lines:
+        match = _IMPORT_LINE.match(line)
+        if match:
+            modules.append((match.group(4), int(match.group(1)), int(match.group(2)), len(match.group(3)) // 2))
+    return modules
+
+
+def benchmark_page(page: str, repeat: int, top: int) -> Dict:
+    source = page_imports(page)
+    totals, self_times = [], defaultdict(list)
+    for _ in range(repeat):
+        modules = measure(source)
+        totals.append(sum(cumulative for _, _, cumulative, depth in modules if depth == 0) / 1000)
+        by_package = defaultdict(int)
+        for name, self_us, _, _ in modules:
+            by_package[name.split(".")[0]] += self_us
+        for package, self_us in by_package.items():
+            self_times[package].append(self_us / 1000)
+    names = {name for name, _, _, _ in modules}
+    slowest = sorted(((package, statistics.median(times)) for package, times in self_times.items()),
+                     key=lambda item: item[1], reverse=True)[:top]
+    budget = PAGE_BUDGETS_MS.get(page, DEFAULT_BUDGET_MS)
+    return {
+        "page": page,
+        "median_ms": statistics.median(totals),
+        "max_ms": max(totals),
+        "budget_ms": budget,
+        "modules": len(names),
+        "slowest_packages": {package: round(ms, 1) for package, ms in slowest},
+        "deferred_imported": sorted(module for module in DEFERRED_MODULES
+                                    if any(name == module or name.startswith(module + ".") for name in names)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure each page's cold start import time.")
+    parser.add_argument("--repeat", type=int, default=3, help="fresh interpreters per page (the median is used)")
+    parser.add_argument("--top", type=int, default=5, help="number of slowest packages to list per page")
+    parser.add_argument("--output", help="write the JSON report to this file")
+    parser.add_argument("--check", action="store_true",
+                        help="exit with code 1 if a page is over budget or imports a deferred module")
+    args = parser.parse_args()
+
+    # Compile everything first so the measurements don't include writing bytecode caches
+    subprocess.run([sys.executable, "-m", "compileall", "-q", ROOT], check=False, capture_output=True)
+    reports, failures = [], []
+    for page in PAGES:
+        report = benchmark_page(page, args.repeat, args.top)
+        reports.append(report)
+        status = "✅" if report["median_ms"] <= report["budget_ms"] and not report["deferred_imported"] else "❌"
+        print(f"{status} {page}: {report['median_ms']:.0f} ms (budget {report['budget_ms']:.0f} ms, "
+              f"{report['modules']} modules)")
+        print("     " + ", ".join(f"{package} {ms:.0f} ms" for package, ms in report["slowest_packages"].items()))
+        if report["median_ms"] > report["budget_ms"]:
+            failures.append(f"{page} takes {report['median_ms']:.0f} ms, over its {report['budget_ms']:.0f} ms budget")
+        if report["deferred_imported"]:
+            failures.append(f"{page} imports {', '.join(report['deferred_imported'])} at startup")
+
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(reports, output_file, indent=2)
+        print(f"Report written to {args.output}")
+    for failure in failures:
+        print(f"❌ {failure}")
+    if args.check and failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
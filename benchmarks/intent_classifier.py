@@ -0,0 +1,105 @@
+"""
+Compare the local intent classifier against the LLM classifier.
+
+Usage:
+    python -m benchmarks.intent_classifier [--folds 5] [--threshold 0.55] [--skip-llm]
+
+Local accuracy is measured with stratified k-fold cross validation over the
+bundled labeled set, so every example is classified by a model that never saw it.
+The LLM classifier needs valid API credentials in `.env`.
+"""
+import argparse
+import asyncio
+import time
+from typing import Dict, List
+
+import numpy as np
+from dotenv import load_dotenv
+from sklearn.model_selection import StratifiedKFold
+
+from services import intent
+
+
+def _latency_summary(latencies: List[float]) -> Dict[str, float]:
+    millis = np.array(latencies) * 1000
+    return {"mean_ms": float(millis.mean()),
+            "p50_ms": float(np.percentile(millis, 50)),
+            "p95_ms": float(np.percentile(millis, 95))}
+
+
+def benchmark_local(examples, folds: int, threshold: float) -> Dict:
+    texts = np.array([text for text, _ in examples])
+    labels = np.array([label for _, label in examples])
+    predictions, confidences, sources, latencies = [], [], [], []
+
+    for train_index, test_index in StratifiedKFold(n_splits=folds, shuffle=True, random_state=0).split(texts, labels):
+        model = intent.train_model(list(zip(texts[train_index], labels[train_index])))
+        for text in texts[test_index]:
+            start = time.perf_counter()
+            label, confidence, source = intent.classify_locally(text, model)
+            latencies.append(time.perf_counter() - start)
+            predictions.append((text, label))
+            confidences.append(confidence)
+            sources.append(source)
+
+    expected = dict(examples)
+    correct = [expected[text] == label for text, label in predictions]
+    confident = [confidence >= threshold for confidence in confidences]
+    confident_correct = [c for c, sure in zip(correct, confident) if sure]
+    return {
+        "accuracy": float(np.mean(correct)),
+        "confident_share": float(np.mean(confident)),
+        "confident_accuracy": float(np.mean(confident_correct)) if confident_correct else 0.0,
+        "rule_share": float(np.mean([source == "rules" for source in sources])),
+        "confident_texts": {text for (text, _), sure in zip(predictions, confident) if sure},
+        "predictions": dict(predictions),
+        **_latency_summary(latencies),
+    }
+
+
+async def benchmark_llm(examples) -> Dict:
+    predictions, latencies = {}, []
+    for text, _ in examples:
+        start = time.perf_counter()
+        predictions[text] = await intent.classify_with_llm(text)
+        latencies.append(time.perf_counter() - start)
+
+    accuracy = np.mean([predictions[text] == label for text, label in examples])
+    return {"accuracy": float(accuracy), "predictions": predictions, **_latency_summary(latencies)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the local intent classifier against the LLM.")
+    parser.add_argument("--folds", type=int, default=5, help="number of cross validation folds")
+    parser.add_argument("--threshold", type=float, default=intent.CONFIDENCE_THRESHOLD,
+                        help="local confidence needed to skip the LLM")
+    parser.add_argument("--skip-llm", action="store_true", help="only benchmark the local classifier")
+    args = parser.parse_args()
+    load_dotenv()
+
+    examples = intent.load_examples()
+    local = benchmark_local(examples, args.folds, args.threshold)
+    print(f"Examples: {len(examples)}")
+    print(f"Local   accuracy={local['accuracy']:.3f} mean={local['mean_ms']:.2f}ms "
+          f"p50={local['p50_ms']:.2f}ms p95={local['p95_ms']:.2f}ms")
+    print(f"        rules={local['rule_share']:.1%} confident={local['confident_share']:.1%} "
+          f"confident accuracy={local['confident_accuracy']:.3f}")
+
+    if args.skip_llm:
+        return
+
+    llm = asyncio.run(benchmark_llm(examples))
+    print(f"LLM     accuracy={llm['accuracy']:.3f} mean={llm['mean_ms']:.2f}ms "
+          f"p50={llm['p50_ms']:.2f}ms p95={llm['p95_ms']:.2f}ms")
+
+    # The hybrid keeps confident local answers and pays for the LLM on the rest
+    hybrid = [local["predictions"][text] if text in local["confident_texts"] else llm["predictions"][text]
+              for text, _ in examples]
+    hybrid_accuracy = np.mean([prediction == label for prediction, (_, label) in zip(hybrid, examples)])
+    hybrid_mean = local["mean_ms"] + (1 - local["confident_share"]) * llm["mean_ms"]
+    print(f"Hybrid  accuracy={hybrid_accuracy:.3f} expected mean={hybrid_mean:.2f}ms "
+          f"llm calls={1 - local['confident_share']:.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,381 @@
+"""
+Load test the service layer with simulated concurrent sessions against local mock servers.
+
+Usage:
+    python -m benchmarks.load_test [--sessions 10] [--requests 5] [--scenarios chat,book,image,conversation]
+                                   [--provider openai|gemini] [--latency 0.2] [--tokens-per-second 50]
+                                   [--error-rate 0] [--output report.json]
+                                   [--max-p95-ms 5000] [--min-throughput 1] [--max-error-rate 0.01]
+
+Runs fully offline: the mock servers (see `benchmarks.mock_servers`) are started in a
+separate process so their CPU and memory are not counted, and every file the services
+write (the book index, generated images, thumbnails) goes to a temporary directory.
+
+Each session runs on its own thread with its own event loop, as Streamlit sessions do,
+and cycles through the scenarios:
+
+    chat          services.llm_switcher.converse (services.llm or services.gemini_llm)
+    book          services.rag.ask_book
+    image         services.images.generate_image
+    conversation  helpers.util.run_conversation, keeping the session's history
+
+The report gives throughput, p50/p95/p99 latency and time to first token, overall and per
+scenario, plus the CPU and resident memory of the process. With any of the --max/--min
+options the exit code is 1 when the run misses a threshold, so it can gate a release.
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import Dict, List
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCENARIOS = ("chat", "book", "image", "conversation")
+QUESTIONS = ["What is the DRY principle?", "How should I handle broken windows in a codebase?",
+             "When should I use tracer bullets?", "How do I keep my code easy to change?",
+             "What does orthogonality mean for software design?"]
+
+
+def _free_port() -> int:
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+
+def _start_mock_servers(args) -> subprocess.Popen:
+    """
+    Start the mock servers in a child process and wait until they accept connections.
+    """
+    process = subprocess.Popen([sys.executable, "-m", "benchmarks.mock_servers", "--port", str(args.port),
+                                "--latency", str(args.latency), "--tokens-per-second", str(args.tokens_per_second),
+                                "--response-tokens", str(args.response_tokens), "--error-rate", str(args.error_rate)],
+                               cwd=ROOT, stdout=subprocess.DEVNULL)
+    deadline = time.monotonic() + 15
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Mock servers exited with code {process.returncode}")
+        with contextlib.suppress(OSError), socket.create_connection(("127.0.0.1", args.port), timeout=0.5):
+            return process
+        time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError("Mock servers did not start")
+
+
+def _configure_environment(args, workdir: str) -> None:
+    """
+    Point every service at the mock servers and the temporary directory. Must run before the
+    services are imported, since they read their settings at import time.
+    """
+    base_url = f"http://127.0.0.1:{args.port}"
+    os.environ.update({
+        "OPENAI_API_BASE_URL": f"{base_url}/v1",
+        "OPENAI_API_KEY": "mock",
+        "OPENAI_API_MODEL": "mock-model",
+        "GEMINI_API_BASE_URL": base_url,
+        "GEMINI_API_KEY": "mock",
+        "USE_GEMINI": "true" if args.provider == "gemini" else "false",
+        "IMAGES_DIR": os.path.join(workdir, "images"),
+        "IMAGE_INDEX_PATH": os.path.join(workdir, "image_manifest.sqlite3"),
+        "THUMBNAIL_DIR": os.path.join(workdir, "thumbnails"),
+    })
+
+
+def _seed_book_index(csv_path: str) -> None:
+    """
+    Build a book index with one chunk per page and the mock server's embeddings, so the
+    book scenario measures queries rather than a one-off indexing run (which needs tiktoken
+    data that may not be available offline).
+    """
+    from PyPDF2 import PdfReader
+    from benchmarks.mock_servers import MockSettings, _embedding
+    from services import rag
+
+    with open(os.path.join(ROOT, "data", "ThePragmaticProgrammer.pdf"), "rb") as pdf_file:
+        pages = [(number, page.extract_text() or "") for number, page in enumerate(PdfReader(pdf_file).pages)]
+    pages = [(number, text[:6000]) for number, text in pages if text.strip()]
+    dimensions = MockSettings().embedding_dimensions
+    rag.save_embeddings_to_csv(csv_path, "ThePragmaticProgrammer", [number for number, _ in pages],
+                               [_embedding(text, dimensions) for _, text in pages], [text for _, text in pages])
+
+
+class _FirstTokenPlaceholder:
+    """
+    Stands in for the Streamlit placeholder `run_conversation` renders into, noting when
+    the first delta is shown.
+    """
+
+    def __init__(self):
+        self.first_token_at = None
+
+    def markdown(self, *args, **kwargs):
+        if self.first_token_at is None:
+            self.first_token_at = time.perf_counter()
+
+
+async def _run_request(scenario: str, session: int, turn: int, history: List[Dict[str, str]]) -> float | None:
+    """
+    Make one request of a scenario.
+
+    Returns: the time to first token in seconds, for streamed scenarios
+
+    Raises:
+        RuntimeError: if the service reported an error in-band rather than raising
+    """
+    from services import llm_switcher
+
+    question = QUESTIONS[(session + turn) % len(QUESTIONS)]
+    start = time.perf_counter()
+    if scenario == "chat":
+        first_token = None
+        async for delta in llm_switcher.converse([{"role": "user", "content": question}]):
+            if llm_switcher.is_error_response(delta):
+                raise RuntimeError(delta)
+            if first_token is None:
+                first_token = time.perf_counter() - start
+        return first_token
+    if scenario == "book":
+        from services import rag
+        result = await rag.ask_book(question)
+        if llm_switcher.is_error_response(result["answer"]):
+            raise RuntimeError(result["answer"])
+        return None
+    if scenario == "image":
+        from services import images
+        await images.generate_image(f"A rubber duck explaining code, session {session} turn {turn}",
+                                    quality="standard")
+        return None
+
+    from helpers.util import run_conversation
+    placeholder = _FirstTokenPlaceholder()
+    history.append({"role": "user", "content": question})
+    _, response = await run_conversation(history, placeholder)
+    if llm_switcher.is_error_response(response) or response.startswith(":red["):
+        raise RuntimeError(response)
+    return placeholder.first_token_at - start if placeholder.first_token_at is not None else None
+
+
+def _run_session(session: int, args, results: List[Dict], lock: threading.Lock) -> None:
+    scenarios = args.scenarios
+
+    async def run():
+        history = []
+        for turn in range(args.requests):
+            scenario = scenarios[(session + turn) % len(scenarios)]
+            start = time.perf_counter()
+            error = None
+            first_token = None
+            try:
+                first_token = await _run_request(scenario, session, turn, history)
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"[:300]
+            with lock:
+                results.append({"scenario": scenario, "session": session, "latency": time.perf_counter() - start,
+                                "first_token": first_token, "error": error})
+            if args.think_time:
+                await asyncio.sleep(args.think_time)
+
+    asyncio.run(run())
+
+
+def _percentiles(seconds: List[float]) -> Dict[str, float] | None:
+    if not seconds:
+        return None
+    millis = np.array(seconds) * 1000
+    return {"p50": float(np.percentile(millis, 50)), "p95": float(np.percentile(millis, 95)),
+            "p99": float(np.percentile(millis, 99)), "mean": float(millis.mean()), "max": float(millis.max())}
+
+
+def _summary(results: List[Dict], duration: float) -> Dict:
+    errors = [result for result in results if result["error"]]
+    return {
+        "requests": len(results),
+        "errors": len(errors),
+        "error_rate": len(errors) / len(results) if results else 0.0,
+        "throughput_rps": len(results) / duration if duration else 0.0,
+        "latency_ms": _percentiles([result["latency"] for result in results if not result["error"]]),
+        "ttft_ms": _percentiles([result["first_token"] for result in results if result["first_token"] is not None]),
+    }
+
+
+def _rss_bytes() -> int | None:
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        return None
+
+
+def run_load_test(args, workdir: str) -> Dict:
+    """
+    Run the sessions against services already configured by `_configure_environment`.
+
+    Returns: the report
+    """
+    from services import rag, registry
+
+    results, lock = [], threading.Lock()
+    rss_samples = []
+    sampling = threading.Event()
+
+    def sample_rss():
+        while not sampling.wait(0.25):
+            rss = _rss_bytes()
+            if rss is not None:
+                rss_samples.append(rss)
+
+    # Import everything up front so import time isn't counted as request latency
+    import helpers.util
+    import services.images
+    import services.llm_switcher  # noqa: F401
+    rag.CSV_FILE_PATH = os.path.join(workdir, "book.embeddings.csv")
+    _seed_book_index(rag.CSV_FILE_PATH)
+    # Measure a warm process, as serve.py gives in production
+    from services import warmup
+    warmup.warm_up()
+
+    usage_before = resource.getrusage(resource.RUSAGE_SELF)
+    sampler = threading.Thread(target=sample_rss, daemon=True)
+    sampler.start()
+    start = time.perf_counter()
+    threads = []
+    for session in range(args.sessions):
+        thread = threading.Thread(target=_run_session, args=(session, args, results, lock), daemon=True)
+        thread.start()
+        threads.append(thread)
+        if args.ramp_up:
+            time.sleep(args.ramp_up / args.sessions)
+    for thread in threads:
+        thread.join()
+    duration = time.perf_counter() - start
+    sampling.set()
+    usage_after = resource.getrusage(resource.RUSAGE_SELF)
+
+    cpu_seconds = (usage_after.ru_utime - usage_before.ru_utime) + (usage_after.ru_stime - usage_before.ru_stime)
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak_rss = usage_after.ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+    report = {
+        "settings": {"sessions": args.sessions, "requests_per_session": args.requests, "scenarios": args.scenarios,
+                     "provider": args.provider, "think_time": args.think_time, "ramp_up": args.ramp_up,
+                     "latency": args.latency, "tokens_per_second": args.tokens_per_second,
+                     "response_tokens": args.response_tokens, "error_rate": args.error_rate},
+        "duration_seconds": duration,
+        **_summary(results, duration),
+        "cpu_percent": 100 * cpu_seconds / duration if duration else 0.0,
+        "rss_mb": {"mean": float(np.mean(rss_samples)) / 1024 / 1024 if rss_samples else None,
+                   "peak": peak_rss / 1024 / 1024},
+        "scenarios": {scenario: _summary([result for result in results if result["scenario"] == scenario], duration)
+                      for scenario in args.scenarios},
+        "error_samples": sorted({result["error"] for result in results if result["error"]})[:5],
+        "resources": registry.stats(),
+    }
+    return report
+
+
+def _format_ms(stats: Dict | None) -> str:
+    if stats is None:
+        return "-"
+    return f"p50 {stats['p50']:.0f} ms, p95 {stats['p95']:.0f} ms, p99 {stats['p99']:.0f} ms"
+
+
+def _print_report(report: Dict) -> None:
+    print(f"\n{report['settings']['sessions']} sessions, {report['requests']} requests "
+          f"in {report['duration_seconds']:.1f}s ({report['settings']['provider']})")
+    print(f"  throughput  {report['throughput_rps']:.2f} requests/s")
+    print(f"  errors      {report['errors']} ({report['error_rate']:.1%})")
+    print(f"  latency     {_format_ms(report['latency_ms'])}")
+    print(f"  first token {_format_ms(report['ttft_ms'])}")
+    rss_mean = report["rss_mb"]["mean"]
+    print(f"  cpu         {report['cpu_percent']:.0f}%")
+    print(f"  rss         mean {rss_mean:.0f} MB, peak {report['rss_mb']['peak']:.0f} MB" if rss_mean is not None
+          else f"  rss         peak {report['rss_mb']['peak']:.0f} MB")
+    for scenario, summary in report["scenarios"].items():
+        print(f"  {scenario:<12} {summary['requests']} requests, {summary['errors']} errors, "
+              f"{_format_ms(summary['latency_ms'])}")
+    for error in report["error_samples"]:
+        print(f"  ❌ {error}")
+
+
+def _check_thresholds(report: Dict, args) -> List[str]:
+    failures = []
+    p95 = report["latency_ms"]["p95"] if report["latency_ms"] else float("inf")
+    ttft_p95 = report["ttft_ms"]["p95"] if report["ttft_ms"] else None
+    if args.max_p95_ms is not None and p95 > args.max_p95_ms:
+        failures.append(f"p95 latency {p95:.0f} ms is above {args.max_p95_ms:.0f} ms")
+    if args.max_ttft_p95_ms is not None and ttft_p95 is not None and ttft_p95 > args.max_ttft_p95_ms:
+        failures.append(f"p95 time to first token {ttft_p95:.0f} ms is above {args.max_ttft_p95_ms:.0f} ms")
+    if args.min_throughput is not None and report["throughput_rps"] < args.min_throughput:
+        failures.append(f"throughput {report['throughput_rps']:.2f} requests/s is below {args.min_throughput}")
+    if args.max_error_rate is not None and report["error_rate"] > args.max_error_rate:
+        failures.append(f"error rate {report['error_rate']:.1%} is above {args.max_error_rate:.1%}")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the services with concurrent sessions against mock APIs.")
+    parser.add_argument("--sessions", type=int, default=10, help="number of concurrent sessions")
+    parser.add_argument("--requests", type=int, default=5, help="requests per session")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS),
+                        help=f"comma separated scenarios to cycle through ({', '.join(SCENARIOS)})")
+    parser.add_argument("--provider", choices=["openai", "gemini"], default="openai",
+                        help="the text generation provider behind the chat and conversation scenarios")
+    parser.add_argument("--think-time", type=float, default=0.0, help="seconds each session waits between requests")
+    parser.add_argument("--ramp-up", type=float, default=0.0, help="seconds over which the sessions are started")
+    parser.add_argument("--port", type=int, default=0, help="port for the mock servers (default: a free port)")
+    parser.add_argument("--latency", type=float, default=0.2, help="mock seconds before the first byte")
+    parser.add_argument("--tokens-per-second", type=float, default=50.0, help="mock completion streaming rate")
+    parser.add_argument("--response-tokens", type=int, default=60, help="mock tokens per completion")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of mock requests that fail")
+    parser.add_argument("--output", help="write the JSON report to this file")
+    parser.add_argument("--verbose", action="store_true", help="show the services' own output")
+    parser.add_argument("--max-p95-ms", type=float, help="fail if the p95 latency is higher")
+    parser.add_argument("--max-ttft-p95-ms", type=float, help="fail if the p95 time to first token is higher")
+    parser.add_argument("--min-throughput", type=float, help="fail if fewer requests per second are served")
+    parser.add_argument("--max-error-rate", type=float, help="fail if a larger fraction of requests fails")
+    args = parser.parse_args()
+    args.scenarios = [scenario.strip() for scenario in args.scenarios.split(",") if scenario.strip()]
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+    args.port = args.port or _free_port()
+
+    # The book index and PDF paths are relative to the project root
+    os.chdir(ROOT)
+    mock_servers = _start_mock_servers(args)
+    try:
+        with tempfile.TemporaryDirectory(prefix="duckyai-load-") as workdir:
+            _configure_environment(args, workdir)
+            print(f"Running {args.sessions} sessions x {args.requests} requests against mock servers "
+                  f"on port {args.port}...")
+            with open(os.devnull, "w") as devnull, \
+                    contextlib.redirect_stdout(sys.stdout if args.verbose else devnull), \
+                    contextlib.redirect_stderr(sys.stderr if args.verbose else devnull):
+                report = run_load_test(args, workdir)
+    finally:
+        mock_servers.terminate()
+        mock_servers.wait()
+
+    _print_report(report)
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(report, output_file, indent=2)
+        print(f"Report written to {args.output}")
+
+    failures = _check_thresholds(report, args)
+    for failure in failures:
+        print(f"❌ {failure}")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
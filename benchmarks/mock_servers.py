@@ -0,0 +1,196 @@
+"""
+Local OpenAI- and Gemini-compatible mock servers for offline load tests.
+
+Usage:
+    python -m benchmarks.mock_servers [--port 8900] [--latency 0.2] [--tokens-per-second 50] [--error-rate 0]
+
+Point the app at them with `OPENAI_API_BASE_URL=http://127.0.0.1:<port>/v1` and
+`GEMINI_API_BASE_URL=http://127.0.0.1:<port>`. One server answers both APIs:
+
+    POST /v1/chat/completions                     streamed (SSE) or not
+    POST /v1/embeddings                           deterministic pseudo-random vectors
+    POST /v1/images/generations                   a small PNG as b64_json
+    POST /v1/audio/transcriptions                 a fixed transcript
+    POST /v1beta/models/<model>:generateContent   Gemini REST
+    POST /v1beta/models/<model>:streamGenerateContent
+
+Every response waits `latency` seconds before its first byte, and completions are
+sent at `tokens_per_second`. A fraction `error_rate` of requests fail with HTTP 500
+(or 429 for a tenth of those).
+"""
+import argparse
+import base64
+import hashlib
+import io
+import json
+import random
+import threading
+import time
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List
+
+import numpy as np
+from PIL import Image
+
+WORDS = ("the pragmatic programmer keeps code easy to change so write small functions test early and often "
+         "automate everything you repeat and fix broken windows before they spread").split()
+
+
+@dataclass
+class MockSettings:
+    latency: float = 0.2
+    tokens_per_second: float = 50.0
+    response_tokens: int = 60
+    error_rate: float = 0.0
+    embedding_dimensions: int = 1536
+
+
+def _tokens(count: int, seed: str) -> List[str]:
+    rng = random.Random(seed)
+    return [rng.choice(WORDS) + " " for _ in range(count)]
+
+
+def _embedding(text: str, dimensions: int) -> List[float]:
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "big")
+    vector = np.random.default_rng(seed).standard_normal(dimensions)
+    return (vector / np.linalg.norm(vector)).round(6).tolist()
+
+
+def _png() -> str:
+    buffer = io.BytesIO()
+    Image.new("RGB", (64, 64), (255, 200, 0)).save(buffer, format="PNG")
+    return base64.b64encode(buffer.getvalue()).decode("ascii")
+
+
+_PNG_B64 = _png()
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    settings = MockSettings()
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass  # Keep load test output readable
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        time.sleep(self.settings.latency)
+        if random.random() < self.settings.error_rate:
+            status = 429 if random.random() < 0.1 else 500
+            return self._json({"error": {"message": "Injected failure", "type": "server_error", "code": status}},
+                              status)
+
+        path = self.path.split("?")[0]
+        if path.endswith(":generateContent") or path.endswith(":streamGenerateContent"):
+            return self._gemini(json.loads(body or b"{}"), path.endswith(":streamGenerateContent"))
+        if path.endswith("/audio/transcriptions"):
+            return self._json({"text": "How do I keep my code easy to change?"})
+        request = json.loads(body or b"{}")
+        if path.endswith("/chat/completions"):
+            return self._chat(request)
+        if path.endswith("/embeddings"):
+            inputs = request["input"] if isinstance(request["input"], list) else [request["input"]]
+            dimensions = request.get("dimensions") or self.settings.embedding_dimensions
+            data = [{"object": "embedding", "index": index, "embedding": _embedding(text, dimensions)}
+                    for index, text in enumerate(inputs)]
+            return self._json({"object": "list", "model": request.get("model", "mock"), "data": data,
+                               "usage": {"prompt_tokens": 0, "total_tokens": 0}})
+        if path.endswith("/images/generations"):
+            return self._json({"created": int(time.time()), "data": [{"b64_json": _PNG_B64, "revised_prompt": None}]})
+        self._json({"error": {"message": f"Unknown endpoint {path}"}}, 404)
+
+    def _json(self, payload: Dict, status: int = 200):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _stream(self, events):
+        """
+        Send server-sent events, one token interval apart.
+        """
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+        interval = 1 / self.settings.tokens_per_second if self.settings.tokens_per_second > 0 else 0
+        for event in events:
+            self.wfile.write(f"data: {event}\n\n".encode("utf-8"))
+            self.wfile.flush()
+            time.sleep(interval)
+
+    def _chat(self, request: Dict):
+        prompt = json.dumps(request.get("messages", []))
+        tokens = _tokens(self.settings.response_tokens, prompt)
+        model = request.get("model") or "mock"
+        if not request.get("stream"):
+            # Non-streamed responses still take as long as generating every token
+            time.sleep(len(tokens) / self.settings.tokens_per_second if self.settings.tokens_per_second > 0 else 0)
+            return self._json({"id": "chatcmpl-mock", "object": "chat.completion", "created": int(time.time()),
+                               "model": model,
+                               "choices": [{"index": 0, "finish_reason": "stop",
+                                            "message": {"role": "assistant", "content": "".join(tokens)}}],
+                               "usage": {"prompt_tokens": 0, "completion_tokens": len(tokens), "total_tokens": 0}})
+
+        def events():
+            for token in tokens:
+                yield json.dumps({"id": "chatcmpl-mock", "object": "chat.completion.chunk",
+                                  "created": int(time.time()), "model": model,
+                                  "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}]})
+            yield "[DONE]"
+        self._stream(events())
+
+    def _gemini(self, request: Dict, stream: bool):
+        tokens = _tokens(self.settings.response_tokens, json.dumps(request.get("contents", [])))
+
+        def candidate(text, finished):
+            return {"candidates": [{"index": 0, "finishReason": "STOP" if finished else None,
+                                    "content": {"role": "model", "parts": [{"text": text}]}}]}
+        if not stream:
+            time.sleep(len(tokens) / self.settings.tokens_per_second if self.settings.tokens_per_second > 0 else 0)
+            return self._json(candidate("".join(tokens), True))
+        self._stream(json.dumps(candidate(token, index == len(tokens) - 1)) for index, token in enumerate(tokens))
+
+
+def start_mock_server(settings: MockSettings, port: int = 0) -> ThreadingHTTPServer:
+    """
+    Start a mock server on a background thread.
+
+    Args:
+        settings: the latency, token rate and error injection settings
+        port: the port to listen on (0 picks a free port, see `server.server_address`)
+
+    Returns: the running server; call `shutdown()` to stop it
+    """
+    handler = type("ConfiguredMockHandler", (MockHandler,), {"settings": settings})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run OpenAI- and Gemini-compatible mock servers.")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency", type=float, default=0.2, help="seconds before the first byte of a response")
+    parser.add_argument("--tokens-per-second", type=float, default=50.0, help="completion streaming rate")
+    parser.add_argument("--response-tokens", type=int, default=60, help="tokens per completion")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests that fail")
+    args = parser.parse_args()
+
+    server = start_mock_server(MockSettings(args.latency, args.tokens_per_second, args.response_tokens,
+                                            args.error_rate), args.port)
+    print(f"Mock servers listening on http://127.0.0.1:{server.server_address[1]} (Ctrl+C to stop)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,24 +1,42 @@
-from typing import List, Dict, Union, Tuple
+import inspect
+from typing import AsyncIterable, Callable, List, Dict, Union, Tuple
 
 import streamlit as st
 from streamlit.delta_generator import DeltaGenerator
 
-import services.rag
+import services.code_review
+from services.extract import FencedBlockParser
 # Use the service switcher
-from services.llm_switcher import converse
+from services.llm_switcher import converse, is_error_response
 
-async def run_conversation(messages: List[Dict[str, str]], message_placeholder: Union[DeltaGenerator, None] = None) \
+# st.image(**FULL_WIDTH) fills the container: streamlit 1.40 deprecated use_column_width for
+# use_container_width, which the pinned 1.39 doesn't have yet
+FULL_WIDTH = ({"use_container_width": True} if "use_container_width" in inspect.signature(st.image).parameters
+              else {"use_column_width": True})
+
+async def run_conversation(messages: List[Dict[str, str]], message_placeholder: Union[DeltaGenerator, None] = None,
+                           on_block: Union[Callable[[Dict], None], None] = None) \
         -> Tuple[List[Dict[str, str]], str]:
+    # on_block is called with each FencedBlockParser "close" event as soon as a
+    # fenced code block in the response is complete, while the rest keeps streaming.
+    # Blocks cut off by an error or the end of the stream are never passed on
     full_response = ""
+    failed = False
+    parser = FencedBlockParser() if on_block is not None else None
 
     chunks = converse(messages)
     chunk = await anext(chunks, "END OF CHAT")
     while chunk != "END OF CHAT":
         print(f"Received chunk from LLM service: {chunk}")
-        if chunk.startswith("EXCEPTION"):
+        if is_error_response(chunk):
             full_response = ":red[We are having trouble generating advice.  Please wait a minute and try again.]"
+            failed = True
             break
         full_response = full_response + chunk
+        if parser is not None:
+            for event in parser.feed(chunk):
+                if event["type"] == "close" and event["terminated"]:
+                    on_block(event)
 
         # Strip triple backticks if present
         display_response = full_response
@@ -34,6 +52,11 @@ async def run_conversation(messages: List[Dict[str, str]], message_placeholder:
 
         chunk = await anext(chunks, "END OF CHAT")
 
+    if parser is not None and not failed:
+        for event in parser.finish():
+            if event["type"] == "close" and event["terminated"]:
+                on_block(event)
+
     # Final display, strip triple backticks if present
     display_response = full_response
     if display_response.startswith("```") and display_response.endswith("```"):
@@ -49,6 +72,57 @@ async def run_conversation(messages: List[Dict[str, str]], message_placeholder:
     return messages, full_response
 
 
+async def stream_response(chunks: AsyncIterable[str], message_placeholder: Union[DeltaGenerator, None] = None) -> str:
+    """
+    Render an already available stream of deltas (e.g. a replayed stored answer) into the placeholder.
+    """
+    full_response = ""
+    async for chunk in chunks:
+        full_response += chunk
+        if message_placeholder is not None:
+            message_placeholder.markdown(full_response + "▌", unsafe_allow_html=False)
+    if message_placeholder is not None:
+        message_placeholder.markdown(full_response, unsafe_allow_html=False)
+    return full_response
+
+
+async def review_code(code: str, language: str, message_placeholder: Union[DeltaGenerator, None] = None) -> str:
+    """
+    Review code chunk by chunk, updating the placeholder as each chunk's findings
+    arrive, and return the merged findings as markdown ordered by line.
+    """
+    results = []
+    chunks = services.code_review.split_code(code, language)
+    chunk_count = len(chunks)
+    async for result in services.code_review.review_code(code, language, chunks=chunks):
+        results.append(result)
+        print(f"Reviewed chunk {result['chunk']['name']} ({len(results)}/{chunk_count})")
+        if message_placeholder is not None:
+            message_placeholder.markdown(
+                f"Reviewed {len(results)} of {chunk_count} parts...\n\n"
+                + __format_findings(services.code_review.merge_findings(results)) + "▌")
+
+    review = __format_findings(services.code_review.merge_findings(results))
+    if message_placeholder is not None:
+        message_placeholder.markdown(review)
+    return review
+
+
+def __format_findings(findings: List[Dict]) -> str:
+    if not findings:
+        return "No findings."
+    lines = []
+    for finding in findings:
+        if finding["line"] is None:
+            location = f"**{finding['chunk']}**"
+        elif finding["end_line"] != finding["line"]:
+            location = f"**Lines {finding['line']}-{finding['end_line']}**"
+        else:
+            location = f"**Line {finding['line']}**"
+        lines.append(f"- {location}: {finding['message']}")
+    return "\n".join(lines)
+
+
 # Chat with the LLM, and update the messages list with the response.
 # Handles the chat UI and partial responses along the way.
 async def chat(messages, prompt):
@@ -75,6 +149,9 @@ async def chat(messages, prompt):
     return messages
 
 async def ask_book(messages, prompt):
+    # The book's search stack (scikit-learn, pdf2image) is only imported once a book question is asked
+    import services.rag
+
     # Create an async function ask_book that takes a messages list and a prompt string as parameters
     # This function will:
     # 1. Use st.chat_message("user") to display the user's prompt in the chat UI using st.markdown(prompt)
@@ -89,22 +166,16 @@ async def ask_book(messages, prompt):
     #    a. Show a loading spinner with message "Asking the Pragmatic Programmer book..."
         with spinner_placeholder:
             with st.spinner("Asking the Pragmatic Programmer book..."):
-    #    b. Call services.rag.ask_book(prompt, return_image=True) which returns a dictionary with:
+    #    b. Call services.rag.ask_book(prompt) which returns a dictionary with:
     #       - answer: str - The AI-generated answer based on the book
     #       - context: str - The relevant text snippets from the book
     #       - page_number: int - The page number where the info was found
-    #       - image_data: bytes - The binary image data of the book page (if available)
-                rag_result = await services.rag.ask_book(prompt, return_image=True)
-
-    #    c. Extract all returned values from rag_result using dictionary access:
-    #       answer = rag_result["answer"]
-    #       context = rag_result["context"]
-    #       page_number = rag_result["page_number"]
-    #       image_data = rag_result["image_data"]
+                rag_result = await services.rag.ask_book(prompt)
+
+    #    c. Extract all returned values from rag_result using dictionary access
                 answer = rag_result["answer"]
                 context = rag_result["context"]
                 page_number = rag_result["page_number"]
-                image_data = rag_result["image_data"]
     
     #    d. Clear the spinner placeholder using spinner_placeholder.empty()
         spinner_placeholder.empty()
@@ -112,46 +183,40 @@ async def ask_book(messages, prompt):
     #    e. Display the answer using st.write(f"{answer}")
         st.write(f"{answer}")
 
-    # 4. Display the response:
-    #    a. Show the answer using st.write(f"{answer}")
-    #    b. Handle the image data:
-    #       - If image_data exists:
-    #         * Import base64 module
-    #         * Convert bytes to base64 using base64.b64encode(image_data).decode('utf-8')
-    #         * Create HTML img tag: f'<img src="data:image/png;base64,{image_base64}" style="max-width: 100%;">'
-    #       - If no image_data:
-    #         * Set image_html to "No image available."
-        if image_data:
-            import base64
-            image_base64 = base64.b64encode(image_data).decode('utf-8')
-            image_html = f'<img src="data:image/png;base64,{image_base64}" style="max-width: 100%;">'
-        else:
-            image_html = "No image available."
-    
-    # 5. Create an evidence section using an f-string with:
-    #    - A div for the page number in gray 10pt font
-    #    - The image_html content
-    #    Format:
-    #    f"""
-    #      <div style="color: gray; font-size: 10pt;">Page Number: {page_number}</div>
-    #      {image_html}
-    #    """
-        evidence = f"""
-          <div style="color: gray; font-size: 10pt;">Page Number: {page_number}</div>
-          {image_html}
-        """
-        st.markdown(evidence, unsafe_allow_html=True)
-
-    # 6. Update the chat history:
+    # 4. Show the evidence: the page number and the page image (see show_evidence)
+        show_evidence(page_number)
+
+    # 5. Update the chat history:
     #    a. Append the answer to messages with role "assistant"
-    #    b. Append the evidence to messages with:
-    #       - role: "evidence"
-    #       - content: the evidence f-string
-    #       - page_number: the page number
+    #    b. Append the evidence to messages with role "evidence" and the page number. The page
+    #       image is not stored in the session: it is looked up again whenever the message is shown
     #    c. Update st.session_state.messages with the new messages
         messages.append({"role": "assistant", "content": answer})
-        messages.append({"role": "evidence", "content": evidence, "page_number": page_number})
+        messages.append({"role": "evidence", "content": f"Page Number: {page_number}", "page_number": page_number})
         st.session_state.messages = messages
 
-    # 7. Return the messages list for chat history
+    # 6. Return the messages list for chat history
     return messages
+
+
+def show_evidence(page_number: int, key: str | None = None) -> None:
+    """
+    Show a book page as evidence for an answer. The image comes from the book page image
+    cache shared by all sessions (see `services.rag.page_image`) and Streamlit serves it as
+    a media file URL, so chat histories only keep the page number.
+
+    Args:
+        page_number (int): The book page.
+        key (str | None): For evidence in the chat history: the key of a toggle that shows the
+                          page, so reruns don't render a page image for every past answer.
+    """
+    import services.rag
+
+    st.markdown(f'<div style="color: gray; font-size: 10pt;">Page Number: {page_number}</div>', unsafe_allow_html=True)
+    if key is not None and not st.toggle(f"Show page {page_number}", key=key):
+        return
+    try:
+        st.image(services.rag.page_image(page_number), **FULL_WIDTH)
+    except Exception as e:
+        print(f"⚠️ Could not render book page {page_number}: {e}")
+        st.write("No image available.")
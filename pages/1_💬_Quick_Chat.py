@@ -25,13 +25,14 @@ if "messages" not in st.session_state:
     st.session_state.messages = initial_messages
 
 # Print all messages in the session state
-for message in [m for m in st.session_state.messages if m["role"] != "system"]:
+for index, message in enumerate(st.session_state.messages):
+    if message["role"] == "system":
+        continue
     avatar = "🔎" if message["role"] == "evidence" else None
     if avatar:
         with st.chat_message(message["role"], avatar=avatar):
-            page_number = message["page_number"]
-            with st.expander(f"See page {page_number}", expanded=False):
-                st.write(message["content"], unsafe_allow_html=True)
+            # The page image is only rendered when asked for: expanders run their body even when collapsed
+            util.show_evidence(message["page_number"], key=f"evidence_{index}")
 
     else:
         with st.chat_message(message["role"]):
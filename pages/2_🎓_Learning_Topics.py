@@ -3,8 +3,7 @@ import asyncio
 import streamlit as st
 import helpers.sidebar
 import helpers.util
-import services.prompts
-import services.llm
+import services.learning
 
 st.set_page_config(
     page_title="Learning Topics",
@@ -17,11 +16,9 @@ st.header("Learning Topics")
 helpers.sidebar.show()
 
 # Add a sidebar option to select a learner level
-learner_level = st.sidebar.selectbox("I'd like my answer as if I were a:",
-                                     ["5 year old", "high school student", "college student", "adult", "retiree"])
+learner_level = st.sidebar.selectbox("I'd like my answer as if I were a:", services.learning.LEARNER_LEVELS)
 
-response_format = st.sidebar.selectbox("I'd like my answer as a:",
-                                       ["set of bullet point notes", "article", "online course syllabus"])
+response_format = st.sidebar.selectbox("I'd like my answer as a:", services.learning.RESPONSE_FORMATS)
 
 answer_button_sb = st.sidebar.button("Get Answer&nbsp;&nbsp;➠", type="primary", key="answer_button_sb")
 
@@ -32,10 +29,14 @@ answer_button = st.button("Get Answer&nbsp;&nbsp;➠", type="primary")
 
 if answer_button or answer_button_sb:
     advice = st.markdown("### Ducky...")
-    learning_prompt = services.prompts.learning_prompt(learner_level, response_format, topic)
-    messages = services.llm.create_conversation_starter(services.prompts.system_learning_prompt())
-    messages.append({"role": "user", "content": learning_prompt})
-    asyncio.run(helpers.util.run_conversation(messages, advice))
+    # Popular topics are precomputed by `python -m services.learning`
+    cached_answer = services.learning.get_cached_answer(learner_level, response_format, topic)
+    if cached_answer is not None:
+        asyncio.run(helpers.util.stream_response(services.learning.replay(cached_answer), advice))
+    else:
+        # Stored for later readers once complete, unless the provider reported an error
+        answer = services.learning.stream_answer(learner_level, response_format, topic)
+        asyncio.run(helpers.util.stream_response(answer, advice))
 
 # Add footer
 helpers.sidebar.show_footer()
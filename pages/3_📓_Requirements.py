@@ -3,9 +3,12 @@ import asyncio
 import streamlit as st
 import helpers.sidebar
 import helpers.util
-from services.prompts import requirements_prompt, system_requirements_prompt
+from services.prompts import REQUIREMENT_TYPES, requirements_prompt, system_requirements_prompt
+from services.requirements import DocumentRun, combine_documents
 import services.llm
 
+ALL_DOCUMENTS = "All documents"
+
 st.set_page_config(
     page_title="Requirements",
     page_icon="📓",
@@ -22,11 +25,20 @@ product_name = st.text_input("What is the name of your product?", placeholder="E
 
 product_description = st.text_area("Describe your product.", placeholder="Enter a description of your product here.")
 
-requirement_type = st.selectbox("What type of requirement document should we generate?", ["Business Problem Statement", "Vision Statement", "Ecosystem map", "RACI Matrix"])
+requirement_type = st.selectbox("What type of requirement document should we generate?", REQUIREMENT_TYPES + [ALL_DOCUMENTS])
 
 generate_button = st.button("Generate document&nbsp;&nbsp;➠", type="primary")
 
-if generate_button:
+if generate_button and requirement_type == ALL_DOCUMENTS:
+    # Generate every document concurrently in the background; the fragment below polls it
+    previous_run = st.session_state.get("requirements_run")
+    if previous_run is not None:
+        for document_type in previous_run.requirement_types:
+            previous_run.cancel(document_type)
+    st.session_state.requirements_run = DocumentRun(product_name, product_description)
+    st.session_state.requirements_run.start()
+
+elif generate_button:
     advice = st.empty()
     spinner_placeholder = st.empty()
 
@@ -44,6 +56,40 @@ if generate_button:
     spinner_placeholder.empty()  # Clear the spinner
     st.write(full_response)
 
+requirements_run = st.session_state.get("requirements_run")
+if requirements_run is not None and requirement_type == ALL_DOCUMENTS:
+    @st.fragment(run_every=0.5 if requirements_run.is_running else None)
+    def show_documents():
+        columns = st.columns(2)
+        for index, (document_type, document) in enumerate(requirements_run.documents.items()):
+            with columns[index % 2].container(border=True):
+                st.subheader(document_type)
+                if document["status"] in ("pending", "running"):
+                    if st.button("Cancel", key=f"cancel_{document_type}"):
+                        requirements_run.cancel(document_type)
+                    st.markdown(document["text"] + "▌")
+                else:
+                    if document["seconds"] is not None:
+                        st.caption(f"{document['status'].capitalize()} in {document['seconds']:.1f}s")
+                    if document["error"]:
+                        st.error("We are having trouble generating this document.  Please wait a minute and try again.")
+                    st.markdown(document["text"])
+
+        if requirements_run.is_running:
+            return
+        if requirements_run.seconds is not None:
+            st.caption(f"Generated all documents in {requirements_run.seconds:.1f}s")
+            st.download_button("Download all documents",
+                               combine_documents(requirements_run.product_name, requirements_run.documents),
+                               file_name=f"{requirements_run.product_name or 'product'}_requirements.md",
+                               mime="text/markdown")
+        if st.session_state.get("requirements_polling"):
+            # Stop polling now that every document has finished
+            st.session_state.requirements_polling = False
+            st.rerun()
+
+    st.session_state.requirements_polling = requirements_run.is_running
+    show_documents()
+
 # Add footer
 helpers.sidebar.show_footer()
-
@@ -1,13 +1,17 @@
 import asyncio
+import time
 import streamlit as st
 from streamlit_ace import st_ace, KEYBINDINGS, LANGUAGES, THEMES
 from services.prompts import (
     review_prompt,
     modify_code_prompt,
+    modify_code_diff_prompt,
     debug_prompt,
-    classify_user_prompt,
     parse_code_and_request
 )
+from services.code_review import MAX_CHUNK_LINES
+from services.patch import PatchError, apply_patch
+from services.intent import classify_intent
 import helpers.util
 
 st.set_page_config(
@@ -28,27 +32,42 @@ if 'editor_id' not in st.session_state:
 # Code Editor on the left, user prompt on the right
 col1, col2 = st.columns([2, 1])
 
+language = st.sidebar.selectbox("Language mode", options=LANGUAGES, index=121, key="lang_mode_main")
+editor_settings = dict(
+    language=language,
+    placeholder="Write or paste your code here",
+    theme=st.sidebar.selectbox("Theme", options=THEMES, index=25, key="theme_main"),
+    keybinding=st.sidebar.selectbox("Keybinding", options=KEYBINDINGS, index=3, key="keybinding_main"),
+    font_size=st.sidebar.slider("Font size", 5, 24, 14, key="font_size_main"),
+    tab_size=st.sidebar.slider("Tab size", 1, 8, 4, key="tab_size_main"),
+    wrap=st.sidebar.checkbox("Wrap lines", value=False, key="wrap_lines_main"),
+    show_gutter=st.sidebar.checkbox("Show gutter", value=True, key="show_gutter_main"),
+    show_print_margin=st.sidebar.checkbox("Show print margin", value=True, key="show_print_margin_main"),
+    auto_update=st.sidebar.checkbox("Auto update", value=True, key="auto_update_main"),
+    readonly=False,
+    height=200,
+    min_lines=12,
+    max_lines=40
+)
+
+
+def show_editor(value: str) -> str:
+    # Show a Streamlit Ace editor for code input
+    with editor_placeholder:
+        return st_ace(value=value, key=f"{EDITOR_KEY_PREFIX}-{st.session_state.editor_id}", **editor_settings)
+
+
+def update_editor(new_code: str) -> None:
+    # Remount the editor under a new key so it shows the new code without a rerun
+    st.session_state.editor_code = new_code
+    st.session_state.editor_id += 1
+    show_editor(new_code)
+
+
 with col1:
     st.write("### Your Code")
-    # Show a Streamlit Ace editor for code input
-    code = st_ace(
-        value="",
-        language=st.sidebar.selectbox("Language mode", options=LANGUAGES, index=121, key="lang_mode_main"),
-        placeholder="Write or paste your code here",
-        theme=st.sidebar.selectbox("Theme", options=THEMES, index=25, key="theme_main"),
-        keybinding=st.sidebar.selectbox("Keybinding", options=KEYBINDINGS, index=3, key="keybinding_main"),
-        font_size=st.sidebar.slider("Font size", 5, 24, 14, key="font_size_main"),
-        tab_size=st.sidebar.slider("Tab size", 1, 8, 4, key="tab_size_main"),
-        wrap=st.sidebar.checkbox("Wrap lines", value=False, key="wrap_lines_main"),
-        show_gutter=st.sidebar.checkbox("Show gutter", value=True, key="show_gutter_main"),
-        show_print_margin=st.sidebar.checkbox("Show print margin", value=True, key="show_print_margin_main"),
-        auto_update=st.sidebar.checkbox("Auto update", value=True, key="auto_update_main"),
-        readonly=False,
-        key=f"{EDITOR_KEY_PREFIX}-{st.session_state.editor_id}",
-        height=200,
-        min_lines=12,
-        max_lines=40
-    )
+    editor_placeholder = st.empty()
+    code = show_editor(st.session_state.get("editor_code", ""))
 
 with col2:
     response_placeholder = st.empty()
@@ -58,20 +77,51 @@ with col2:
     if st.button("Send"):
         advice_placeholder = st.empty()
         try:
-            
-            classification_prompt = classify_user_prompt(user_prompt)
-            messages = [{"role": "user", "content": classification_prompt}]
-            messages, classification_result = asyncio.run(helpers.util.run_conversation(messages, advice_placeholder))
-            classification = classification_result.strip().lower()
+            # Classify locally, only paying for an LLM round trip on low confidence
+            classification, confidence, source = asyncio.run(classify_intent(user_prompt))
+            print(f"DEBUG: Classified request as {classification} ({source}, confidence {confidence:.2f})")
 
             # Build AI prompt
             ai_prompt = ""
-            if classification == "review":
+            full_response = None
+            modification = {}
+            start_time = time.perf_counter()
+
+            def apply_diff_block(block):
+                # Patch the editor as soon as the diff block closes, while the explanation streams.
+                # A diff cut off before its closing fence is never applied: the file is regenerated instead
+                if block["label"] != "diff" or not block["terminated"] or "code" in modification:
+                    return
+                try:
+                    modification["code"] = apply_patch(code, block["code"])
+                    update_editor(modification["code"])
+                    print(f"DEBUG: Applied diff after {time.perf_counter() - start_time:.1f}s")
+                except PatchError as e:
+                    print(f"DEBUG: Diff did not apply ({e})")
+
+            def apply_code_block(block):
+                # Show the regenerated file in the editor as soon as its code block closes
+                if block["terminated"] and "code" not in modification:
+                    modification["code"] = block["code"]
+                    update_editor(block["code"])
+
+            if classification == "review" and len(code.splitlines()) > MAX_CHUNK_LINES:
+                # Large files are reviewed in parallel chunks instead of one oversized prompt
+                st.write("### Reviewing code...")
+                full_response = asyncio.run(helpers.util.review_code(code, language, advice_placeholder))
+            elif classification == "review":
                 st.write("### Reviewing code...")
                 ai_prompt = review_prompt(code)
             elif classification == "modify":
                 st.write("### Modifying code...")
-                ai_prompt = modify_code_prompt(user_prompt, code)
+                # Ask for a diff so only the changed lines are generated
+                messages2 = [{"role": "user", "content": modify_code_diff_prompt(user_prompt, code)}]
+                messages2, full_response = asyncio.run(
+                    helpers.util.run_conversation(messages2, advice_placeholder, on_block=apply_diff_block))
+                if "code" not in modification:
+                    print("DEBUG: No applicable diff, regenerating the whole file")
+                    full_response = None
+                    ai_prompt = modify_code_prompt(user_prompt, code)
             elif classification == "debug":
                 st.write("### Debugging code...")
                 ai_prompt = debug_prompt(user_prompt, code)
@@ -79,8 +129,11 @@ with col2:
                 ai_prompt = "I'm unable to understand. Can you try explaining it again?"
             
             # Send the classified prompt to AI
-            messages2 = [{"role": "user", "content": ai_prompt}]
-            messages2, full_response = asyncio.run(helpers.util.run_conversation(messages2, advice_placeholder))
+            if full_response is None:
+                on_block = apply_code_block if classification == "modify" else None
+                messages2 = [{"role": "user", "content": ai_prompt}]
+                messages2, full_response = asyncio.run(
+                    helpers.util.run_conversation(messages2, advice_placeholder, on_block=on_block))
             advice_placeholder.empty()  #
             
             # Display AI response as a single final markdown output
@@ -1,8 +1,8 @@
 import streamlit as st
 import helpers.sidebar
+from helpers.util import FULL_WIDTH
 import asyncio
-import pandas as pd
-from services.images import generate_image, get_all_images, delete_image  # Ensure these functions are implemented in images.py
+from services.images import generate_images, get_images_page, delete_image  # Ensure these functions are implemented in images.py
 
 st.set_page_config(
     page_title="Images",
@@ -18,42 +18,105 @@ st.header("Image Generation")
 tab1, tab2 = st.tabs(["Image Generation", "Image List"])
 
 # Tab 1: Image Generation
+async def show_generated_images(prompts, variants, reuse_existing):
+    # Render each image into its own slot as soon as it is ready
+    requests = [prompt for prompt in prompts for _ in range(variants)]
+    columns = st.columns(min(len(requests), 4))
+    slots = []
+    for index in range(len(requests)):
+        slot = columns[index % len(columns)].empty()
+        slot.info(f"Generating image {index + 1} of {len(requests)}...")
+        slots.append(slot)
+    generated, reused = [], 0
+    async for result in generate_images(prompts, variants, reuse_existing=reuse_existing):
+        with slots[result["index"]].container():
+            if result["error"]:
+                st.error(f"Error generating image: {result['error']}")
+            else:
+                st.image(result["preview_path"], caption=result["prompt"], **FULL_WIDTH)
+                if result["cache"] == "hit":
+                    st.caption("♻️ Reused an existing image")
+                elif result["cache"] == "coalesced":
+                    st.caption("♻️ Shared with an identical request in progress")
+                else:
+                    generated.append(result["api_seconds"])
+                    st.caption(f"Generated in {result['api_seconds']:.1f}s, saved in {result['write_seconds']:.2f}s")
+        reused += result["cache"] != "miss"
+    if reused:
+        # Estimate the time saved from the images that did need generating
+        saved = f", saving about {sum(generated) / len(generated) * reused:.0f}s" if generated else ""
+        st.info(f"♻️ {reused} of {len(requests)} images reused without a new API call{saved}.")
+
+
 with tab1:
-    prompt = st.text_input("Prompt", placeholder="Enter a prompt for the image generation model")
+    prompt = st.text_area("Prompt", placeholder="Enter a prompt for the image generation model (one per line for several)")
+    variants = st.number_input("Variants per prompt", min_value=1, max_value=4, value=1)
+    reuse_existing = st.checkbox("Reuse existing images", value=False,
+                                 help="Show images previously generated with the same prompt and settings "
+                                      "instead of generating new ones")
     if st.button("Generate Image"):
-        if prompt.strip():
-            with st.spinner("Generating image..."):
-                try:
-                    image_path = asyncio.run(generate_image(prompt))
-                    if image_path:
-                        st.image(image_path[1], caption="Generated Image", use_column_width=True)
-                except Exception as e:
-                    st.error(f"Error generating image: {e}")
+        prompts = [line.strip() for line in prompt.splitlines() if line.strip()]
+        if prompts:
+            asyncio.run(show_generated_images(prompts, variants, reuse_existing))
         else:
             st.warning("Please enter a prompt before generating an image.")
 
 # Tab 2: Image List
 with tab2:
     try:
-        images_df = get_all_images()  # Fetch images as a Pandas DataFrame
-        if not images_df.empty:
-            for index, row in images_df.iterrows():
+        search_col, sort_col, size_col = st.columns([4, 2, 1])
+        with search_col:
+            search = st.text_input("Search prompts", placeholder="Filter images by prompt text")
+        with sort_col:
+            sort = st.selectbox("Sort by", ["newest", "oldest", "description"], format_func=str.capitalize)
+        with size_col:
+            page_size = st.selectbox("Per page", [10, 20, 50], index=1)
+
+        page = st.session_state.get("gallery_page", 0)
+        images, total = get_images_page(page, page_size, sort, search)  # Only the visible page is loaded
+        if total and page * page_size >= total:
+            # The filter or page size changed, go back to the first page
+            page = st.session_state.gallery_page = 0
+            images, total = get_images_page(page, page_size, sort, search)
+
+        if images:
+            for row in images:
+                image_key = row["Image"].rsplit("/", 1)[-1]
                 col1, col2, col3, col4 = st.columns([2, 4, 2, 2])
                 with col1:
-                    st.image(row["Image"], width=100)  # Display image thumbnail
+                    if row["Thumbnail"]:
+                        st.image(row["Thumbnail"], width=100)  # Display the small WebP thumbnail
+                    elif row["Thumbnail Failed"]:
+                        st.caption("No thumbnail")  # Could not be created; View shows the image
+                    else:
+                        st.caption("Thumbnail pending...")  # Being created in the background
                 with col2:
                     st.write(row["Description"])  # Display description
                 with col3:
                     st.write(row["Date Created"].strftime("%Y-%m-%d %H:%M:%S"))  # Format date
                 with col4:
-                    if st.button("View", key=f"view_{index}"):
-                        # Display image in a modal
-                        st.image(row["Image"], caption=row["Description"], use_column_width=True)
-                    if st.button("Delete", key=f"delete_{index}"):
+                    if st.button("View", key=f"view_{image_key}"):
+                        # Only the viewed image is loaded at full size
+                        st.image(row["Image"], caption=row["Description"], **FULL_WIDTH)
+                    if st.button("Delete", key=f"delete_{image_key}"):
                         # Delete image and refresh the list
-                        delete_image(row["Image"])  # Ensure this function deletes the file and updates the data source
+                        delete_image(row["Image"])  # Deletes the files and removes the image from the index
                         st.success("Image deleted successfully.")
-                        st.experimental_rerun()  # Refresh the page to update the list
+                        st.rerun()  # Refresh the page to update the list
+
+            page_count = (total + page_size - 1) // page_size
+            previous_col, status_col, next_col = st.columns([1, 4, 1])
+            with previous_col:
+                if st.button("◀ Previous", disabled=page == 0):
+                    st.session_state.gallery_page = page - 1
+                    st.rerun()
+            with status_col:
+                st.caption(f"Showing {page * page_size + 1}-{page * page_size + len(images)} of {total} "
+                           f"images (page {page + 1} of {page_count})")
+            with next_col:
+                if st.button("Next ▶", disabled=page + 1 >= page_count):
+                    st.session_state.gallery_page = page + 1
+                    st.rerun()
         else:
             st.info("No images found.")  # Display message if no images are available
     except Exception as e:
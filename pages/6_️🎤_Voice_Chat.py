@@ -1,7 +1,10 @@
 import streamlit as st
 import streamlit.components.v1 as components
-import os
-from datetime import datetime
+import asyncio
+import time
+
+from services import tts_cache
+from services.voice_pipeline import VoicePipeline
 
 st.set_page_config(
     page_title="Voice Chat",
@@ -9,10 +12,6 @@ st.set_page_config(
     layout="wide"
 )
 
-# Create audio directory if it doesn't exist
-audio_dir = os.path.join('data', 'audio')
-os.makedirs(audio_dir, exist_ok=True)
-
 # Hide the file uploader but keep it functional
 hide_streamlit_style = """
 <style>
@@ -25,17 +24,13 @@ st.markdown(hide_streamlit_style, unsafe_allow_html=True)
 
 # File uploader for audio blob
 uploaded_file = st.file_uploader("Audio", type=['wav'], key='audio_upload', label_visibility="hidden")
-if uploaded_file:
-    # Generate timestamp-based filename
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    filename = f"recording_{timestamp}.wav"
-    filepath = os.path.join(audio_dir, filename)
-    
-    # Save the file
-    with open(filepath, "wb") as f:
-        f.write(uploaded_file.getvalue())
-    
-    # Store the filepath in session state for transcription
+if uploaded_file and st.session_state.get("recording_id") != uploaded_file.file_id:
+    st.session_state.recording_id = uploaded_file.file_id
+    # A new recording replaces the answer that may still be in progress
+    if st.session_state.get("voice_pipeline") is not None:
+        st.session_state.voice_pipeline.cancel()
+
+    # Store the audio in session state for transcription
     st.session_state.audio_data = uploaded_file.getvalue()
 
 import helpers.sidebar
@@ -164,7 +159,79 @@ setupRecorder();
 </script>
 """
 
-from services.audio import transcribe_audio, generate_gpt_response, speak_text
+
+async def play_segments(segments, player):
+    """
+    Play audio segments from a queue in order, each replacing the player once the
+    previous one has finished. Returns the clips played.
+    """
+    clips, playing_until = [], time.monotonic()
+    while (segment := await segments.get()) is not None:
+        # Later segments keep being prepared while this one is still playing
+        await asyncio.sleep(max(0.0, playing_until - time.monotonic()))
+        clip = segment["audio"]
+        if clip in clips:
+            # Audio elements are identified by their data; trailing padding is skipped by MP3 decoders
+            clip += b"\0" * clips.count(segment["audio"])
+        player.audio(clip, format="audio/mp3", autoplay=True)
+        playing_until = time.monotonic() + segment["duration"] + 0.2
+        clips.append(segment["audio"])
+    await asyncio.sleep(max(0.0, playing_until - time.monotonic()))
+    if len(clips) > 1:
+        # MP3 frames can be concatenated, so the whole answer can be replayed from one player
+        player.audio(b"".join(clips), format="audio/mp3")
+    return clips
+
+
+async def answer(audio_data=None, question=None):
+    """
+    Run the voice pipeline for a recorded or typed question: show the question and the
+    answer as it streams, and speak the answer sentence by sentence while it is generated.
+    """
+    # Keeps a compact copy of the recording, subject to the retention policy, once it is preprocessed
+    pipeline = st.session_state.voice_pipeline = VoicePipeline(keep_recordings=True)
+    status = st.empty()
+    if question is None:
+        status.info("Transcribing audio...")
+    response, cached = "", 0
+    segments = asyncio.Queue()
+    playback = None
+    try:
+        async for event in pipeline.run(audio_data, question):
+            if event["type"] == "question":
+                with status.container():
+                    st.write("**Your Question:**")
+                    st.write(event["text"])
+                    st.write("**Assistant's Response:**")
+                    text_placeholder = st.empty()
+                    playback = asyncio.create_task(play_segments(segments, st.empty()))
+            elif event["type"] == "delta":
+                response += event["text"]
+                text_placeholder.markdown(response)
+            elif event["type"] == "audio" and event["audio"] is not None:
+                cached += event["cached"]
+                segments.put_nowait(event)
+            elif event["type"] == "cancelled":
+                st.info("Stopped for a newer recording.")
+            elif event["type"] == "done":
+                timings = event["timings"]
+                st.caption("⏱️ " + " · ".join(f"{stage.replace('_', ' ')} {seconds:.1f}s"
+                                              for stage, seconds in timings.items()))
+    finally:
+        segments.put_nowait(None)
+    clips = await playback if playback is not None else []
+    if clips:
+        cache_stats = tts_cache.stats()
+        st.caption(f"🔊 {cached} of {len(clips)} sentences from the speech cache · overall hit rate "
+                   f"{cache_stats['hit_rate']:.0%}, {cache_stats['seconds_saved']:.1f}s of synthesis saved")
+
+
+def show_answer(audio_data=None, question=None):
+    try:
+        asyncio.run(answer(audio_data, question))
+    except Exception as e:
+        st.error(f"Failed to generate response. Please try again. ({e})")
+
 
 # Create a container for the transcription and response
 result_container = st.container()
@@ -181,48 +248,13 @@ text_submit = st.button("Submit Question")
 # Process text input
 if text_submit and text_input:
     with result_container:
-        st.write("**Your Question:**")
-        st.write(text_input)
-        
-        with st.spinner("Generating response..."):
-            response = generate_gpt_response(text_input)
-            if response:
-                st.write("**Assistant's Response:**")
-                st.write(response)
-                
-                # Get audio response
-                audio_response = speak_text(response)
-                if audio_response:
-                    # Also show regular player for replay
-                    st.audio(audio_response, format='audio/mp3', autoplay=True)
-            else:
-                st.error("Failed to generate response. Please try again.")
+        show_answer(question=text_input)
 else:
     # Process any recorded audio
     if st.session_state.audio_data:
         with result_container:
-            with st.spinner("Transcribing audio..."):
-                transcribed_text = transcribe_audio(st.session_state.audio_data)
-                if transcribed_text:
-                    st.write("**Your Question:**")
-                    st.write(transcribed_text)
-                    
-                    with st.spinner("Generating response..."):
-                        response = generate_gpt_response(transcribed_text)
-                        if response:
-                            st.write("**Assistant's Response:**")
-                            st.write(response)
-                            
-                            # Get audio response
-                            audio_response = speak_text(response)
-                            if audio_response:
-                                # Also show regular player for replay
-                                st.audio(audio_response, format='audio/mp3', autoplay=True)
-                        else:
-                            st.error("Failed to generate response. Please try again.")
-                else:
-                    st.error("Failed to transcribe audio. Please try again.")
-    
+            show_answer(audio_data=st.session_state.audio_data)
+
     # Clear the audio data
     st.session_state.audio_data = None
 
@@ -0,0 +1,28 @@
+"""
+Start DuckyAI: begin warming up the services in the background, then run the Streamlit
+server in the same process so every session shares the warmed caches and clients.
+
+Usage:
+    python serve.py [streamlit run options, e.g. --server.port=8501]
+
+The warm-up writes WARMUP_READY_FILE (default: /tmp/duckyai.ready) when it is done;
+use it as the readiness probe so traffic is only routed to a warm process.
+"""
+import os
+import sys
+
+from streamlit.web import cli
+
+import services.warmup
+
+HOME_PAGE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "🏠_Home.py")
+
+
+def main():
+    services.warmup.start()
+    sys.argv = ["streamlit", "run", HOME_PAGE, *sys.argv[1:]]
+    sys.exit(cli.main())
+
+
+if __name__ == "__main__":
+    main()
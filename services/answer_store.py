@@ -0,0 +1,96 @@
+import os
+import re
+import sqlite3
+import time
+from contextlib import closing
+from typing import Dict
+
+ANSWER_STORE_PATH = os.getenv("ANSWER_STORE_PATH", os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "answers.sqlite3"))
+
+_initialized = set()
+
+
+def normalize_key(text: str) -> str:
+    """
+    Normalize free text (e.g. a topic) so trivially different spellings share an answer.
+    """
+    return re.sub(r"\s+", " ", text).strip().strip("?.!").strip().lower()
+
+
+def _connect(path: str) -> sqlite3.Connection:
+    if path not in _initialized:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    connection = sqlite3.connect(path, timeout=30)
+    if path not in _initialized:
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("""
+            CREATE TABLE IF NOT EXISTS answers (
+                kind TEXT NOT NULL,
+                key TEXT NOT NULL,
+                variant TEXT NOT NULL,
+                question TEXT NOT NULL,
+                answer TEXT NOT NULL,
+                version TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                pinned INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (kind, key, variant)
+            )""")
+        columns = {row[1] for row in connection.execute("PRAGMA table_info(answers)")}
+        if "pinned" not in columns:
+            # Stores created before answers could be pinned
+            connection.execute("ALTER TABLE answers ADD COLUMN pinned INTEGER NOT NULL DEFAULT 0")
+        connection.commit()
+        _initialized.add(path)
+    return connection
+
+
+def get_answer(kind: str, question: str, variant: str, version: str,
+               max_age_seconds: float | None = None, path: str | None = None) -> Dict | None:
+    """
+    Look up a stored answer.
+
+    Args:
+        kind: the answer family, e.g. "learning"
+        question: the question or topic; it is normalized with `normalize_key`
+        variant: what else the answer depends on, e.g. "adult|article"
+        version: the prompt template version the answer must have been generated with
+        max_age_seconds: optionally treat older answers as missing
+        path: the SQLite database file (default: ANSWER_STORE_PATH)
+
+    Returns: a dict with keys `question`, `answer`, `version` and `created_at`, or None
+    """
+    with closing(_connect(path or ANSWER_STORE_PATH)) as connection, connection:
+        row = connection.execute(
+            "SELECT question, answer, version, created_at FROM answers WHERE kind = ? AND key = ? AND variant = ?",
+            (kind, normalize_key(question), variant)).fetchone()
+    if row is None or row[2] != version:
+        return None
+    if max_age_seconds is not None and time.time() - row[3] > max_age_seconds:
+        return None
+    return {"question": row[0], "answer": row[1], "version": row[2], "created_at": row[3]}
+
+
+def save_answer(kind: str, question: str, variant: str, answer: str, version: str,
+                pinned: bool = False, max_unpinned: int | None = None, path: str | None = None) -> None:
+    """
+    Insert or replace a stored answer in a single transaction.
+
+    Args:
+        pinned: keep the answer regardless of `max_unpinned` (e.g. precomputed answers); an
+                answer stays pinned once it was saved pinned
+        max_unpinned: optionally keep only this many of the most recent unpinned answers of
+                      the kind, deleting the oldest others
+    """
+    with closing(_connect(path or ANSWER_STORE_PATH)) as connection, connection:
+        connection.execute(
+            "INSERT INTO answers (kind, key, variant, question, answer, version, created_at, pinned) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (kind, key, variant) DO UPDATE SET question = excluded.question, answer = excluded.answer, "
+            "version = excluded.version, created_at = excluded.created_at, pinned = MAX(pinned, excluded.pinned)",
+            (kind, normalize_key(question), variant, question, answer, version, time.time(), int(pinned)))
+        if max_unpinned is not None:
+            connection.execute(
+                "DELETE FROM answers WHERE kind = ? AND pinned = 0 AND rowid NOT IN "
+                "(SELECT rowid FROM answers WHERE kind = ? AND pinned = 0 ORDER BY created_at DESC LIMIT ?)",
+                (kind, kind, max_unpinned))
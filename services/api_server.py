@@ -0,0 +1,344 @@
+"""
+Headless HTTP API for Quick Chat, book questions, Learning Topics, requirements and code review.
+
+Usage:
+    python -m services.api_server [--port 8502] [--address 0.0.0.0]
+
+Runs alongside (or instead of) the Streamlit UI, using the same `services.*` functions
+without a script rerun per request. Every endpoint takes a JSON body:
+
+    POST /api/chat          {"messages": [...]} or {"prompt": "..."}
+    POST /api/book          {"question": "...", "include_image": false}
+    POST /api/learning      {"topic": "...", "learner_level": "...", "response_format": "..."}
+    POST /api/requirements  {"product_name": "...", "product_description": "...", "requirement_types": [...]}
+    POST /api/review        {"code": "...", "language": "python"}
+    GET  /api/health        liveness, warm-up readiness and open requests
+    GET  /api/stats         shared resource statistics (see `services.registry`)
+
+Responses are streamed as Server-Sent Events (`delta`, `chunk`, `done` and `error` events
+with JSON data), or returned as one JSON object when the body has `"stream": false` (the
+book endpoint always answers with JSON). Requests beyond API_MAX_CONCURRENT_REQUESTS get
+503 and requests from a client beyond API_MAX_REQUESTS_PER_CLIENT get 429. When API_KEY
+is set, requests need an `Authorization: Bearer <API_KEY>` header.
+"""
+import argparse
+import asyncio
+import base64
+import hmac
+import json
+import os
+from collections import defaultdict
+from typing import AsyncIterator, Dict, List, Tuple
+
+import tornado.httpserver
+import tornado.ioloop
+import tornado.iostream
+import tornado.web
+from dotenv import load_dotenv
+
+from services import code_review, learning, prompts, registry, warmup
+from services.llm_switcher import converse, is_error_response
+from services.prompts import REQUIREMENT_TYPES
+from services.requirements import DocumentRun, combine_documents
+
+load_dotenv()
+
+API_MAX_CONCURRENT_REQUESTS = int(os.getenv("API_MAX_CONCURRENT_REQUESTS", "64"))
+API_MAX_REQUESTS_PER_CLIENT = int(os.getenv("API_MAX_REQUESTS_PER_CLIENT", "4"))
+API_MAX_BODY_BYTES = int(float(os.getenv("API_MAX_BODY_MB", "1")) * 1024 * 1024)
+API_KEY = os.getenv("API_KEY")
+# Set to 1 only behind a trusted load balancer or reverse proxy, to take the client address from
+# X-Forwarded-For / X-Real-Ip; otherwise clients could pick their own address
+API_TRUST_PROXY_HEADERS = os.getenv("API_TRUST_PROXY_HEADERS", "0") == "1"
+# A header identifying the client for the per-client limit (e.g. set by an API gateway), instead of its address
+API_CLIENT_HEADER = os.getenv("API_CLIENT_HEADER")
+
+Event = Tuple[str, Dict]
+
+
+class ApiError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class _ApiHandler(tornado.web.RequestHandler):
+    """
+    Shared request handling: API key check, concurrency limits, JSON bodies and errors,
+    and sending an endpoint's events as SSE or as a single JSON response.
+
+    Subclasses provide `async def events(self, body: Dict) -> AsyncIterator[Event]`, an async
+    generator of (event name, data) pairs for the request body; raising ApiError from it
+    (before the first event) answers with that status instead.
+    """
+    active = 0
+    active_by_client: Dict[str, int] = defaultdict(int)
+    streams_json_only = False
+
+    def prepare(self):
+        self._counted = False
+        self._task = None
+        if API_KEY and not hmac.compare_digest(self.request.headers.get("Authorization", ""), f"Bearer {API_KEY}"):
+            raise tornado.web.HTTPError(401, reason="Missing or invalid API key")
+        client = self.client_key()
+        if _ApiHandler.active >= API_MAX_CONCURRENT_REQUESTS:
+            self.set_header("Retry-After", "5")
+            raise tornado.web.HTTPError(503, reason="Too many requests in progress")
+        if _ApiHandler.active_by_client[client] >= API_MAX_REQUESTS_PER_CLIENT:
+            self.set_header("Retry-After", "5")
+            raise tornado.web.HTTPError(429, reason="Too many requests in progress from this client")
+        _ApiHandler.active += 1
+        _ApiHandler.active_by_client[client] += 1
+        self._client = client
+        self._counted = True
+
+    def client_key(self) -> str:
+        """
+        Return who the per-client limit applies to: the API_CLIENT_HEADER value when it is set
+        and present, otherwise the client address.
+        """
+        if API_CLIENT_HEADER and self.request.headers.get(API_CLIENT_HEADER):
+            return f"{API_CLIENT_HEADER}:{self.request.headers[API_CLIENT_HEADER]}"
+        return self.request.remote_ip
+
+    def on_finish(self):
+        if getattr(self, "_counted", False):
+            self._counted = False
+            _ApiHandler.active -= 1
+            client = self._client
+            _ApiHandler.active_by_client[client] -= 1
+            if _ApiHandler.active_by_client[client] <= 0:
+                del _ApiHandler.active_by_client[client]
+
+    def on_connection_close(self):
+        # The client went away: stop generating for it
+        if getattr(self, "_task", None) is not None:
+            self._task.cancel()
+        self.on_finish()
+
+    def write_error(self, status_code: int, **kwargs):
+        self.finish({"error": self._reason})
+
+    def json_body(self) -> Dict:
+        try:
+            body = json.loads(self.request.body or b"{}")
+        except json.JSONDecodeError as e:
+            raise ApiError(400, f"Invalid JSON: {e}")
+        if not isinstance(body, dict):
+            raise ApiError(400, "The body must be a JSON object")
+        return body
+
+    async def post(self):
+        self._task = asyncio.current_task()
+        try:
+            body = self.json_body()
+            events = self.events(body)
+            if body.get("stream", True) and not self.streams_json_only:
+                await self._send_events(events)
+            else:
+                await self._send_result(events)
+        except ApiError as e:
+            self.set_status(e.status)
+            self.finish({"error": str(e)})
+        except asyncio.CancelledError:
+            print(f"🔌 {self.request.path}: client disconnected")
+
+    async def _send_events(self, events: AsyncIterator[Event]):
+        # Validate before committing to a 200 event stream
+        first = await anext(events, None)
+        self.set_header("Content-Type", "text/event-stream")
+        self.set_header("Cache-Control", "no-cache")
+        self.set_header("X-Accel-Buffering", "no")
+        try:
+            event = first
+            while event is not None:
+                name, data = event
+                self.write(f"event: {name}\ndata: {json.dumps(data)}\n\n")
+                await self.flush()
+                event = await anext(events, None)
+        except tornado.iostream.StreamClosedError:
+            print(f"🔌 {self.request.path}: client disconnected")
+            return
+        finally:
+            await events.aclose()
+        self.finish()
+
+    async def _send_result(self, events: AsyncIterator[Event]):
+        async for name, data in events:
+            if name == "error":
+                raise ApiError(502, data["error"])
+            if name == "done":
+                self.finish(data)
+                return
+
+
+def _require(body: Dict, key: str, kind: type = str):
+    value = body.get(key)
+    if not isinstance(value, kind) or (kind is str and not value.strip()):
+        raise ApiError(400, f"`{key}` is required")
+    return value
+
+
+async def _stream_converse(messages: List[Dict[str, str]]) -> AsyncIterator[Event]:
+    """
+    Stream a completion as `delta` events, ending with `done` (with the full text) or `error`.
+    """
+    text = ""
+    async for delta in converse(messages):
+        if is_error_response(delta):
+            yield "error", {"error": delta}
+            return
+        text += delta
+        yield "delta", {"text": delta}
+    yield "done", {"text": text}
+
+
+class ChatHandler(_ApiHandler):
+    async def events(self, body: Dict) -> AsyncIterator[Event]:
+        if "messages" in body:
+            messages = _require(body, "messages", list)
+        else:
+            messages = [{"role": "user", "content": _require(body, "prompt")}]
+        if not all(isinstance(message, dict) and "role" in message and "content" in message for message in messages):
+            raise ApiError(400, "Each message needs a `role` and `content`")
+        if not any(message["role"] == "system" for message in messages):
+            messages = [{"role": "system", "content": prompts.quick_chat_system_prompt()}] + messages
+        async for event in _stream_converse(messages):
+            yield event
+
+
+class BookHandler(_ApiHandler):
+    streams_json_only = True
+
+    async def events(self, body: Dict) -> AsyncIterator[Event]:
+        from services import rag
+
+        question = _require(body, "question")
+        include_image = bool(body.get("include_image", False))
+        # ask_book makes blocking API calls, so it runs on its own event loop in a service thread
+        try:
+            result = await registry.to_thread(asyncio.run, rag.ask_book(question, return_image=include_image))
+        except Exception as e:
+            yield "error", {"error": f"{type(e).__name__}: {e}"}
+            return
+        if is_error_response(result["answer"]):
+            yield "error", {"error": result["answer"]}
+            return
+        response = {"answer": result["answer"], "page_number": result["page_number"], "context": result["context"]}
+        if include_image:
+            response["image_png_base64"] = base64.b64encode(result["image_data"]).decode("ascii")
+        yield "done", response
+
+
+class LearningHandler(_ApiHandler):
+    async def events(self, body: Dict) -> AsyncIterator[Event]:
+        topic = _require(body, "topic")
+        learner_level = body.get("learner_level", learning.LEARNER_LEVELS[0])
+        response_format = body.get("response_format", learning.RESPONSE_FORMATS[0])
+        if learner_level not in learning.LEARNER_LEVELS:
+            raise ApiError(400, f"`learner_level` must be one of {learning.LEARNER_LEVELS}")
+        if response_format not in learning.RESPONSE_FORMATS:
+            raise ApiError(400, f"`response_format` must be one of {learning.RESPONSE_FORMATS}")
+
+        cached = await registry.to_thread(learning.get_cached_answer, learner_level, response_format, topic)
+        if cached is not None:
+            yield "delta", {"text": cached}
+            yield "done", {"text": cached, "cached": True}
+            return
+        async for name, data in _stream_converse(learning.learning_messages(learner_level, response_format, topic)):
+            if name == "done":
+                await registry.to_thread(learning.save_answer, learner_level, response_format, topic, data["text"])
+                data = {**data, "cached": False}
+            yield name, data
+
+
+class RequirementsHandler(_ApiHandler):
+    async def events(self, body: Dict) -> AsyncIterator[Event]:
+        product_name = _require(body, "product_name")
+        product_description = _require(body, "product_description")
+        requirement_types = body.get("requirement_types") or REQUIREMENT_TYPES
+        unknown = [requirement_type for requirement_type in requirement_types
+                   if requirement_type not in REQUIREMENT_TYPES]
+        if unknown:
+            raise ApiError(400, f"Unknown requirement types: {unknown}; choose from {REQUIREMENT_TYPES}")
+
+        document_run = DocumentRun(product_name, product_description, requirement_types)
+        deltas = asyncio.Queue()
+        task = asyncio.create_task(document_run.run(
+            lambda requirement_type, delta: deltas.put_nowait({"requirement_type": requirement_type, "text": delta})))
+        task.add_done_callback(lambda _: deltas.put_nowait(None))
+        try:
+            while (delta := await deltas.get()) is not None:
+                yield "delta", delta
+            documents = task.result()
+        finally:
+            task.cancel()
+        yield "done", {"documents": {requirement_type: {key: document[key]
+                                                        for key in ("status", "text", "seconds", "error")}
+                                     for requirement_type, document in documents.items()},
+                       "combined": combine_documents(product_name, documents),
+                       "seconds": document_run.seconds}
+
+
+class ReviewHandler(_ApiHandler):
+    async def events(self, body: Dict) -> AsyncIterator[Event]:
+        code = _require(body, "code")
+        language = body.get("language", "python")
+        results = []
+        async for result in code_review.review_code(code, language):
+            results.append(result)
+            chunk = result["chunk"]
+            yield "chunk", {"name": chunk["name"], "start_line": chunk["start_line"], "end_line": chunk["end_line"],
+                            "findings": result["findings"]}
+        yield "done", {"findings": code_review.merge_findings(results), "chunks": len(results)}
+
+
+class HealthHandler(tornado.web.RequestHandler):
+    def get(self):
+        self.finish({"status": "ok", "ready": warmup.is_ready(), "active_requests": _ApiHandler.active})
+
+
+class StatsHandler(tornado.web.RequestHandler):
+    def get(self):
+        if API_KEY and not hmac.compare_digest(self.request.headers.get("Authorization", ""), f"Bearer {API_KEY}"):
+            raise tornado.web.HTTPError(401, reason="Missing or invalid API key")
+        self.finish({"active_requests": _ApiHandler.active, "active_clients": len(_ApiHandler.active_by_client),
+                     "warmup": warmup.status(), "resources": registry.stats()})
+
+
+def make_app() -> tornado.web.Application:
+    return tornado.web.Application([
+        (r"/api/chat", ChatHandler),
+        (r"/api/book", BookHandler),
+        (r"/api/learning", LearningHandler),
+        (r"/api/requirements", RequirementsHandler),
+        (r"/api/review", ReviewHandler),
+        (r"/api/health", HealthHandler),
+        (r"/api/stats", StatsHandler),
+    ])
+
+
+def make_server() -> tornado.httpserver.HTTPServer:
+    return tornado.httpserver.HTTPServer(make_app(), max_body_size=API_MAX_BODY_BYTES, idle_connection_timeout=60,
+                                         xheaders=API_TRUST_PROXY_HEADERS)
+
+
+async def serve(port: int, address: str) -> None:
+    server = make_server()
+    server.listen(port, address)
+    print(f"🛰️ API listening on http://{address}:{port}/api")
+    await asyncio.Event().wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the headless streaming HTTP API.")
+    parser.add_argument("--port", type=int, default=int(os.getenv("API_PORT", "8502")))
+    parser.add_argument("--address", default=os.getenv("API_ADDRESS", "0.0.0.0"))
+    args = parser.parse_args()
+
+    warmup.start()
+    asyncio.run(serve(args.port, args.address))
+
+
+if __name__ == "__main__":
+    main()
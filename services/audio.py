@@ -1,90 +1,436 @@
+import asyncio
+import hashlib
+import io
 import os
 import base64
-import tempfile
 import datetime
+import re
+import shutil
+import subprocess
+import time
+import wave
+from typing import TYPE_CHECKING, AsyncGenerator, AsyncIterator, Dict, List, Tuple
 
+import numpy as np
 from dotenv import load_dotenv
-from gtts import gTTS
-from openai import OpenAI
 
-from services import llm
+from services import answer_store, llm, llm_switcher, registry, tts_cache
+
+# gTTS and openai are imported on first use to keep the Voice Chat page's cold start fast
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
 
 # Load .env file
 load_dotenv()
 
-# Initialize the OpenAI client with the modern API pattern
-client = OpenAI(
-    api_key=os.getenv('OPENAI_API_KEY'),
-    base_url=os.getenv('OPENAI_API_BASE_URL', 'https://api.openai.com/v1')
-)
+TRANSCRIPTION_MODEL = "whisper-1"
+# Recordings longer than this are split at silences and the pieces transcribed in parallel
+MAX_SEGMENT_SECONDS = float(os.getenv("TRANSCRIPTION_SEGMENT_SECONDS", "20"))
+MIN_SEGMENT_SECONDS = 5.0
+MAX_TRANSCRIPTION_CONCURRENCY = int(os.getenv("TRANSCRIPTION_CONCURRENCY", "4"))
+VAD_FRAME_SECONDS = 0.03
+MIN_SILENCE_SECONDS = 0.3
+# Transcripts are cached in the answer store, keyed by the audio hash, keeping the most recent ones
+TRANSCRIPT_KIND = "transcript"
+TRANSCRIPT_VERSION = "1"
+TRANSCRIPT_CACHE_MAX_ENTRIES = int(os.getenv("TRANSCRIPT_CACHE_MAX_ENTRIES", "1000"))
+# Audio is normalized to this before transcription: mono, 16 kHz is what Whisper works at
+TARGET_SAMPLE_RATE = 16000
+SILENCE_PADDING_SECONDS = 0.2
+FFMPEG = shutil.which("ffmpeg")
+# Recordings kept in AUDIO_DIR: set AUDIO_RETENTION_DAYS to 0 to not keep recordings at all
+AUDIO_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "audio")
+AUDIO_RETENTION_DAYS = float(os.getenv("AUDIO_RETENTION_DAYS", "7"))
+AUDIO_RETENTION_MAX_BYTES = float(os.getenv("AUDIO_RETENTION_MAX_MB", "100")) * 1024 * 1024
+# gTTS voice settings; they are part of the speech cache key
+TTS_VOICE = {"tld": os.getenv("TTS_TLD", "com"), "slow": False}
 
-def transcribe_audio(audio_data):
+
+def decode_wav(audio_data: bytes) -> Tuple[np.ndarray, int]:
     """
-    Transcribe the audio data using OpenAI's Whisper model.
+    Decode 16-bit PCM WAV data held in memory.
 
     Args:
-        audio_data (bytes): Raw audio data in WAV format
+        audio_data (bytes): The WAV file contents.
 
     Returns:
-        str: The transcription of the audio file.
+        Tuple[np.ndarray, int]: The samples as an int16 array of shape (frames, channels), and the sample rate.
+
+    Raises:
+        ValueError: If the data is not 16-bit PCM WAV.
     """
-    temp_audio_path = None
     try:
-        # Save the audio data to a temporary file
-        try:
-            with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as temp_audio:
-                temp_audio.write(audio_data)
-                temp_audio_path = temp_audio.name
-        except Exception as e:
-            raise RuntimeError(f"Error saving audio data to a temporary file: {e}")
+        with wave.open(io.BytesIO(audio_data), "rb") as wav:
+            if wav.getsampwidth() != 2:
+                raise ValueError(f"Unsupported sample width: {wav.getsampwidth() * 8} bits")
+            frames = wav.readframes(wav.getnframes())
+            channels, sample_rate = wav.getnchannels(), wav.getframerate()
+    except (wave.Error, EOFError) as e:
+        raise ValueError(f"Not a PCM WAV file: {e}")
+    return np.frombuffer(frames, dtype="<i2").reshape(-1, channels), sample_rate
 
-        # Use OpenAI's Whisper API to transcribe the audio
-        try:
-            with open(temp_audio_path, "rb") as audio_file:
-                response = client.audio.transcriptions.create(
-                    model="whisper-1",  # Specify the Whisper model
-                    file=audio_file
-                )
-        except Exception as e:
-            raise RuntimeError(f"Error calling OpenAI Whisper API: {e}")
-
-        # Extract the transcription text
+
+def encode_wav(samples: np.ndarray, sample_rate: int) -> bytes:
+    """
+    Encode int16 samples of shape (frames, channels) as WAV data in memory.
+    """
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(samples.shape[1])
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes(samples.astype("<i2").tobytes())
+    return buffer.getvalue()
+
+
+def silent_frames(samples: np.ndarray, sample_rate: int, frame_seconds: float = VAD_FRAME_SECONDS) -> np.ndarray:
+    """
+    Energy-based voice activity detection: mark each frame of `frame_seconds` as silent
+    when its RMS energy is more than 20 dB below the loud parts of the recording.
+
+    Returns:
+        np.ndarray: A boolean array with one entry per frame, True where the frame is silent.
+    """
+    frame_length = max(1, int(sample_rate * frame_seconds))
+    mono = samples.astype(np.float32).mean(axis=1) / 32768.0
+    frame_count = len(mono) // frame_length
+    if frame_count == 0:
+        return np.zeros(0, dtype=bool)
+    frames = mono[:frame_count * frame_length].reshape(frame_count, frame_length)
+    energy = np.sqrt(np.mean(frames ** 2, axis=1))
+    threshold = max(0.1 * np.percentile(energy, 95), 1e-4)
+    return energy <= threshold
+
+
+def split_on_silence(samples: np.ndarray,
+                     sample_rate: int,
+                     max_segment_seconds: float = MAX_SEGMENT_SECONDS,
+                     min_segment_seconds: float = MIN_SEGMENT_SECONDS) -> List[Tuple[int, int]]:
+    """
+    Split a recording into segments of at most `max_segment_seconds`, cutting in the middle of
+    the last pause that fits so words are not cut in half. Without any pause the segment is
+    cut at the maximum length.
+
+    Returns:
+        List[Tuple[int, int]]: (start, end) sample offsets of the segments, in order.
+    """
+    total = len(samples)
+    max_length = int(max_segment_seconds * sample_rate)
+    if total <= max_length:
+        return [(0, total)]
+
+    frame_length = max(1, int(sample_rate * VAD_FRAME_SECONDS))
+    silent = silent_frames(samples, sample_rate)
+    min_silence_frames = max(1, int(MIN_SILENCE_SECONDS / VAD_FRAME_SECONDS))
+
+    # Middle sample offsets of runs of silent frames long enough to be pauses
+    pauses, run_start = [], None
+    for frame, is_silent in enumerate(np.append(silent, False)):
+        if is_silent and run_start is None:
+            run_start = frame
+        elif not is_silent and run_start is not None:
+            if frame - run_start >= min_silence_frames:
+                pauses.append((run_start + frame) // 2 * frame_length)
+            run_start = None
+
+    segments, start = [], 0
+    while total - start > max_length:
+        window_start, window_end = start + int(min_segment_seconds * sample_rate), start + max_length
+        candidates = [middle for middle in pauses if window_start <= middle <= window_end]
+        end = max(candidates) if candidates else window_end
+        segments.append((start, end))
+        start = end
+    segments.append((start, total))
+    return segments
+
+
+def _ffmpeg(arguments: List[str], input_data: bytes) -> bytes:
+    result = subprocess.run([FFMPEG, "-hide_banner", "-loglevel", "error", *arguments],
+                            input=input_data, capture_output=True, timeout=60)
+    if result.returncode != 0:
+        raise ValueError(f"ffmpeg failed: {result.stderr.decode(errors='replace').strip()}")
+    return result.stdout
+
+
+def resample(mono: np.ndarray, sample_rate: int, target_rate: int = TARGET_SAMPLE_RATE) -> np.ndarray:
+    """
+    Resample mono float samples by linear interpolation, after a moving average low-pass
+    filter when downsampling so high frequencies do not alias.
+    """
+    if sample_rate == target_rate or len(mono) == 0:
+        return mono
+    width = int(round(sample_rate / target_rate))
+    if width > 1:
+        mono = np.convolve(mono, np.ones(width, dtype=np.float32) / width, mode="same")
+    positions = np.arange(int(len(mono) * target_rate / sample_rate)) * (sample_rate / target_rate)
+    return np.interp(positions, np.arange(len(mono)), mono).astype(np.float32)
+
+
+def trim_silence(samples: np.ndarray, sample_rate: int, padding: float = SILENCE_PADDING_SECONDS) -> np.ndarray:
+    """
+    Remove leading and trailing silence, keeping `padding` seconds around the speech.
+    Returns an empty array if there is no speech at all.
+    """
+    silent = silent_frames(samples, sample_rate)
+    voiced = np.flatnonzero(~silent)
+    if len(voiced) == 0:
+        return samples[:0]
+    frame_length = max(1, int(sample_rate * VAD_FRAME_SECONDS))
+    start = max(0, voiced[0] * frame_length - int(padding * sample_rate))
+    end = min(len(samples), (voiced[-1] + 1) * frame_length + int(padding * sample_rate))
+    return samples[start:end]
+
+
+def preprocess_audio(audio_data: bytes) -> Tuple[np.ndarray, int]:
+    """
+    Decode a recording, downmix it to mono, resample it to 16 kHz and trim leading and
+    trailing silence. PCM WAV is decoded directly; other formats (such as the WebM or Ogg
+    that browsers record) need ffmpeg.
+
+    Args:
+        audio_data (bytes): The recording.
+
+    Returns:
+        Tuple[np.ndarray, int]: int16 samples of shape (frames, 1), and the sample rate.
+
+    Raises:
+        ValueError: If the audio cannot be decoded.
+    """
+    try:
+        samples, sample_rate = decode_wav(audio_data)
+        mono = resample(samples.astype(np.float32).mean(axis=1), sample_rate)
+    except ValueError:
+        if FFMPEG is None:
+            raise
+        # ffmpeg downmixes and resamples while decoding
+        pcm = _ffmpeg(["-i", "pipe:0", "-f", "s16le", "-ac", "1", "-ar", str(TARGET_SAMPLE_RATE), "pipe:1"],
+                      audio_data)
+        mono = np.frombuffer(pcm, dtype="<i2").astype(np.float32)
+    samples = np.clip(np.round(mono), -32768, 32767).astype(np.int16).reshape(-1, 1)
+    return trim_silence(samples, TARGET_SAMPLE_RATE), TARGET_SAMPLE_RATE
+
+
+def encode_compact(samples: np.ndarray, sample_rate: int) -> Tuple[bytes, str]:
+    """
+    Encode int16 samples compactly for upload and storage: as Opus in Ogg when ffmpeg
+    is available, otherwise as WAV.
+
+    Returns:
+        Tuple[bytes, str]: The encoded audio and its file extension.
+    """
+    if FFMPEG is not None:
         try:
-            transcription = response.text
-            if not transcription:
-                raise ValueError("No transcription text returned by the API")
-        except Exception as e:
-            raise RuntimeError(f"Error extracting transcription text: {e}")
+            return _ffmpeg(["-f", "s16le", "-ar", str(sample_rate), "-ac", str(samples.shape[1]), "-i", "pipe:0",
+                            "-c:a", "libopus", "-b:a", "24k", "-f", "ogg", "pipe:1"],
+                           samples.astype("<i2").tobytes()), "ogg"
+        except ValueError as e:
+            print(f"Error encoding audio with ffmpeg, using WAV: {e}")
+    return encode_wav(samples, sample_rate), "wav"
 
-        return transcription
-    finally:
-        # Clean up the temporary file
-        if temp_audio_path and os.path.exists(temp_audio_path):
-            try:
-                os.unlink(temp_audio_path)
-            except Exception as e:
-                print(f"Error cleaning up temporary file: {e}")
+
+def save_recording(audio_data: bytes, folder: str = AUDIO_DIR) -> str | None:
+    """
+    Store a preprocessed, compactly encoded copy of a recording and apply the retention
+    policy to the stored recordings.
+
+    Returns:
+        str | None: The path of the stored recording, or None if recordings are not kept
+                    or the audio could not be decoded.
+    """
+    if AUDIO_RETENTION_DAYS <= 0:
+        return None
+    try:
+        samples, sample_rate = preprocess_audio(audio_data)
+    except ValueError as e:
+        print(f"Error preprocessing recording, not stored: {e}")
+        return None
+    return store_recording(samples, sample_rate, folder)
+
+
+def store_recording(samples: np.ndarray, sample_rate: int, folder: str | None = None) -> str | None:
+    """
+    Store already preprocessed samples (see `preprocess_audio`) like `save_recording`.
+
+    Returns:
+        str | None: The path of the stored recording, or None if recordings are not kept.
+    """
+    if AUDIO_RETENTION_DAYS <= 0:
+        return None
+    folder = folder or AUDIO_DIR
+    encoded, extension = encode_compact(samples, sample_rate)
+    os.makedirs(folder, exist_ok=True)
+    path = os.path.join(folder, f"recording_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S_%f')}.{extension}")
+    with open(path, "wb") as audio_file:
+        audio_file.write(encoded)
+    apply_retention(folder)
+    return path
+
+
+def apply_retention(folder: str = AUDIO_DIR,
+                    max_age_days: float = AUDIO_RETENTION_DAYS,
+                    max_bytes: float = AUDIO_RETENTION_MAX_BYTES) -> int:
+    """
+    Delete stored recordings older than `max_age_days`, then the oldest ones until the
+    folder holds at most `max_bytes`.
+
+    Returns:
+        int: The number of recordings deleted.
+    """
+    if not os.path.isdir(folder):
+        return 0
+    recordings = sorted((entry.stat().st_mtime, entry.stat().st_size, entry.path)
+                        for entry in os.scandir(folder) if entry.is_file() and entry.name.startswith("recording_"))
+    cutoff = time.time() - max_age_days * 86400
+    total = sum(size for _, size, _ in recordings)
+    deleted = 0
+    for modified, size, path in recordings:
+        if modified >= cutoff and total <= max_bytes:
+            break
+        os.remove(path)
+        total -= size
+        deleted += 1
+    return deleted
+
+
+async def _transcribe_segment(client: "AsyncOpenAI", audio_data: bytes, filename: str) -> str:
+    try:
+        response = await client.audio.transcriptions.create(
+            model=TRANSCRIPTION_MODEL,
+            file=(filename, audio_data)  # Sent from memory, no temporary file needed
+        )
+    except Exception as e:
+        raise RuntimeError(f"Error calling OpenAI Whisper API: {e}")
+    return response.text.strip()
+
+
+async def transcribe(audio_data: bytes,
+                     filename: str = "recording.wav",
+                     max_concurrency: int = MAX_TRANSCRIPTION_CONCURRENCY,
+                     keep_recording: bool = False) -> str:
+    """
+    Transcribe audio held in memory with OpenAI's Whisper model. The audio is preprocessed
+    (mono, 16 kHz, silence trimmed, compactly encoded) and long recordings are split at
+    pauses, the segments transcribed concurrently and joined in order. Transcripts are
+    cached by the hash of the audio.
+
+    Args:
+        audio_data (bytes): The audio file contents.
+        filename (str): A file name whose extension tells Whisper the audio format.
+        max_concurrency (int): The maximum number of segments transcribed at once.
+        keep_recording (bool): Also store the preprocessed recording (see `store_recording`),
+                               in the background while the segments are transcribed.
+
+    Returns:
+        str: The transcription of the audio.
+    """
+    audio_hash = hashlib.sha256(audio_data).hexdigest()
+    cached = answer_store.get_answer(TRANSCRIPT_KIND, audio_hash, TRANSCRIPTION_MODEL, TRANSCRIPT_VERSION)
+    if cached is not None:
+        print("🎙️ Transcript served from cache")
+        return cached["answer"]
+
+    try:
+        samples, sample_rate = preprocess_audio(audio_data)
+    except ValueError as e:
+        # Without ffmpeg, compressed browser recordings are sent to Whisper as they are
+        print(f"🎙️ Sending audio without preprocessing: {e}")
+        segments = [(audio_data, filename)]
+    else:
+        if len(samples) == 0:
+            raise RuntimeError("No speech detected in the recording")
+        if keep_recording:
+            registry.submit(store_recording, samples, sample_rate)
+        segments = []
+        for index, (start, end) in enumerate(split_on_silence(samples, sample_rate)):
+            encoded, extension = encode_compact(samples[start:end], sample_rate)
+            segments.append((encoded, f"segment_{index}.{extension}"))
+
+    client = llm.get_async_client()
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def bounded(segment_data, segment_filename):
+        async with semaphore:
+            return await _transcribe_segment(client, segment_data, segment_filename)
+
+    texts = await asyncio.gather(*[bounded(*segment) for segment in segments])
+    transcription = " ".join(text for text in texts if text)
+    if not transcription:
+        raise RuntimeError("No transcription text returned by the API")
+    if len(segments) > 1:
+        print(f"🎙️ Transcribed {len(segments)} segments in parallel")
+    answer_store.save_answer(TRANSCRIPT_KIND, audio_hash, TRANSCRIPTION_MODEL, transcription, TRANSCRIPT_VERSION,
+                             max_unpinned=TRANSCRIPT_CACHE_MAX_ENTRIES)
+    return transcription
+
+
+def transcribe_audio(audio_data):
+    """
+    Transcribe the audio data using OpenAI's Whisper model.
+
+    Args:
+        audio_data (bytes): Raw audio data in WAV format
+
+    Returns:
+        str: The transcription of the audio file.
+    """
+    return asyncio.run(transcribe(audio_data))
 
 
 def generate_gpt_response(prompt, messages=None):
     """
-    Send transcribed text to GPT-4 for a response.
+    Send transcribed text to the configured LLM for a response.
 
     Args:
         prompt (str): The prompt or input text.
-        messages (list, optional): The context messages for the GPT-4 API.
+        messages (list, optional): The context messages for the LLM.
 
     Returns:
-        str: The GPT-4 response.
+        str: The LLM response.
     """
     try:
-        # Use the `converse_sync` function from llm.py to generate a response
-        response, updated_messages = llm.converse_sync(prompt=prompt, messages=messages, model="gpt-4")
+        # Use the configured provider and model rather than a fixed one
+        response, updated_messages = llm_switcher.converse_sync(prompt=prompt, messages=messages,
+                                                                model=llm.openai_model)
 
         # Return the response text
         return response
     except Exception as e:
-        raise RuntimeError(f"Error generating GPT-4 response: {e}")
+        raise RuntimeError(f"Error generating LLM response: {e}")
+
+
+def synthesize_speech(text: str, lang: str = "en") -> bytes:
+    """
+    Convert text to MP3 speech with gTTS, in memory.
+
+    Args:
+        text (str): The text to be spoken.
+        lang (str): Language for speech (default is "en" for English).
+
+    Returns:
+        bytes: The MP3 audio.
+    """
+    from gtts import gTTS
+
+    buffer = io.BytesIO()
+    gTTS(text=text, lang=lang, **TTS_VOICE).write_to_fp(buffer)
+    return buffer.getvalue()
+
+
+def cached_speech(text: str, lang: str = "en") -> Tuple[bytes, bool]:
+    """
+    Return speech for the text from the speech cache, synthesizing and caching it on a miss.
+
+    Returns:
+        Tuple[bytes, bool]: The MP3 audio, and whether it came from the cache.
+    """
+    key = tts_cache.cache_key(text, lang, TTS_VOICE)
+    audio = tts_cache.get(key)
+    if audio is not None:
+        return audio, True
+    start_time = time.perf_counter()
+    audio = synthesize_speech(text, lang)
+    tts_cache.put(key, audio, time.perf_counter() - start_time)
+    return audio, False
 
 
 def speak_text(text, lang="en"):
@@ -94,27 +440,184 @@ def speak_text(text, lang="en"):
     Args:
         text (str): The text to be spoken.
         lang (str): Language for speech (default is "en" for English).
-    
+
     Returns:
         str: Base64 encoded audio data that can be played in the browser
     """
     try:
-        # Convert text to speech
-        tts = gTTS(text=text, lang=lang)
-        
-        # Save to a temporary file
-        with tempfile.NamedTemporaryFile(suffix='.mp3', delete=False) as temp_audio:
-            tts.save(temp_audio.name)
-            
-            # Read the file and convert to base64
-            with open(temp_audio.name, 'rb') as audio_file:
-                audio_data = audio_file.read()
-                base64_audio = base64.b64encode(audio_data).decode('utf-8')
-            
-            # Clean up the temporary file
-            os.unlink(temp_audio.name)
-            
-            return f"data:audio/mp3;base64,{base64_audio}"
+        # Synthesized per sentence so answers that share sentences reuse cached speech
+        splitter = SentenceSplitter()
+        sentences = splitter.feed(text) + splitter.finish()
+        audio = b"".join(cached_speech(sentence, lang)[0] for sentence in sentences)
+        base64_audio = base64.b64encode(audio).decode('utf-8')
+        return f"data:audio/mp3;base64,{base64_audio}"
     except Exception as e:
         print(f"Error in speak_text: {e}")
-        return None
\ No newline at end of file
+        return None
+
+
+class SentenceSplitter:
+    """
+    Cuts streamed text into sentences as soon as each one is complete, so they can be
+    spoken while the rest of the response is still being generated. Fenced code blocks
+    are skipped and Markdown markup is removed, as neither reads well aloud.
+    """
+
+    ABBREVIATIONS = {"e.g", "i.e", "etc", "vs", "mr", "mrs", "ms", "dr", "st"}
+    # A sentence ends at ., ! or ? (plus closing quotes or brackets) followed by whitespace, or at a blank line
+    _BOUNDARY = re.compile(r'[.!?]+["\')\]]*\s+|\n\s*\n')
+    _MARKUP = re.compile(r"[*_#`>|]+|^\s*[-+]\s+", re.MULTILINE)
+
+    def __init__(self, min_chars: int = 20):
+        """
+        Args:
+            min_chars: sentences shorter than this are joined with the next one, to avoid many tiny clips
+        """
+        self.min_chars = min_chars
+        self.buffer = ""
+        self.pending = ""
+        self.in_code = False
+
+    def feed(self, delta: str) -> List[str]:
+        """
+        Add streamed text and return the sentences it completed.
+        """
+        self.buffer += delta
+        sentences = []
+        while True:
+            fence = self.buffer.find("```")
+            if self.in_code:
+                if fence < 0:
+                    # Keep a possible partial closing fence
+                    self.buffer = self.buffer[-2:]
+                    return sentences
+                self.buffer = self.buffer[fence + 3:]
+                self.in_code = False
+                continue
+            text = self.buffer if fence < 0 else self.buffer[:fence]
+            end = 0
+            for match in self._BOUNDARY.finditer(text):
+                words = text[end:match.start()].split()
+                if match.group().startswith(".") and words and words[-1].lower() in self.ABBREVIATIONS:
+                    continue
+                sentences.extend(self._emit(text[end:match.end()]))
+                end = match.end()
+            if fence < 0:
+                self.buffer = self.buffer[end:]
+                return sentences
+            # Text before a code block is spoken without waiting for the sentence to end
+            sentences.extend(self._emit(text[end:], force=True))
+            self.buffer = self.buffer[fence + 3:]
+            self.in_code = True
+
+    def finish(self) -> List[str]:
+        """
+        Return whatever text remains once the stream has ended.
+        """
+        remainder = "" if self.in_code else self.buffer
+        self.buffer = ""
+        return self._emit(remainder, force=True)
+
+    def _emit(self, text: str, force: bool = False) -> List[str]:
+        self.pending = f"{self.pending} {self._MARKUP.sub('', text).strip()}".strip()
+        if self.pending and (force or len(self.pending) >= self.min_chars):
+            sentence, self.pending = self.pending, ""
+            return [sentence]
+        return []
+
+
+async def speak_stream(deltas: AsyncIterator[str],
+                       lang: str = "en",
+                       max_concurrency: int = 3) -> AsyncGenerator[Dict, None]:
+    """
+    Speak a streamed response sentence by sentence. Each sentence is synthesized as soon as
+    it is complete, up to `max_concurrency` at a time while the stream continues, and the
+    audio segments are yielded in order.
+
+    Args:
+        deltas: the streamed response text
+        lang: language for speech
+        max_concurrency: the maximum number of sentences synthesized at once
+
+    Yields:
+        Dict: A dict with keys `index`, `text`, `audio` (MP3 bytes, or None if synthesis failed),
+              `cached` (whether the speech cache had it), `duration` (estimated seconds) and
+              `seconds` (synthesis time).
+    """
+    semaphore = asyncio.Semaphore(max_concurrency)
+    segments = asyncio.Queue()
+
+    async def synthesize(index, sentence):
+        async with semaphore:
+            start_time = time.perf_counter()
+            try:
+                audio, cached = await registry.to_thread(cached_speech, sentence, lang)
+            except Exception as e:
+                print(f"Error synthesizing sentence {index}: {e}")
+                audio, cached = None, False
+            return {"index": index, "text": sentence, "audio": audio, "cached": cached,
+                    "duration": mp3_duration(audio) if audio else 0.0, "seconds": time.perf_counter() - start_time}
+
+    async def split():
+        splitter = SentenceSplitter()
+        index = 0
+        try:
+            async for delta in deltas:
+                for sentence in splitter.feed(delta):
+                    segments.put_nowait(asyncio.create_task(synthesize(index, sentence)))
+                    index += 1
+            for sentence in splitter.finish():
+                segments.put_nowait(asyncio.create_task(synthesize(index, sentence)))
+        finally:
+            segments.put_nowait(None)
+
+    producer = asyncio.create_task(split())
+    pending = []
+    try:
+        while (task := await segments.get()) is not None:
+            pending.append(task)
+            yield await task
+        await producer  # Surface errors from the response stream
+    finally:
+        producer.cancel()
+        for task in pending:
+            task.cancel()
+        while not segments.empty():
+            task = segments.get_nowait()
+            if task is not None:
+                task.cancel()
+
+
+# Layer III bitrates (kbps) for MPEG-1 (3) and MPEG-2/2.5 (2), and sample rates by MPEG version
+_MP3_BITRATES = {
+    3: [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    2: [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+_MP3_SAMPLE_RATES = {3: [44100, 48000, 32000], 2: [22050, 24000, 16000], 0: [11025, 12000, 8000]}
+
+
+def mp3_duration(audio: bytes) -> float:
+    """
+    Estimate the playing time of MP3 (Layer III) audio by walking its frame headers.
+
+    Returns:
+        float: The duration in seconds.
+    """
+    position, seconds = 0, 0.0
+    # Skip an ID3v2 tag
+    if audio[:3] == b"ID3" and len(audio) >= 10:
+        position = 10 + ((audio[6] & 0x7F) << 21 | (audio[7] & 0x7F) << 14 | (audio[8] & 0x7F) << 7 | audio[9] & 0x7F)
+    while position + 4 <= len(audio):
+        header = int.from_bytes(audio[position:position + 4], "big")
+        version = (header >> 19) & 0x3  # 3: MPEG-1, 2: MPEG-2, 0: MPEG-2.5
+        bitrate_index, rate_index = (header >> 12) & 0xF, (header >> 10) & 0x3
+        if (header >> 21) != 0x7FF or version == 1 or (header >> 17) & 0x3 != 1 \
+                or bitrate_index in (0, 15) or rate_index == 3:
+            position += 1  # Not a Layer III frame header, resynchronize
+            continue
+        bitrate = _MP3_BITRATES[3 if version == 3 else 2][bitrate_index] * 1000
+        sample_rate = _MP3_SAMPLE_RATES[version][rate_index]
+        samples = 1152 if version == 3 else 576
+        seconds += samples / sample_rate
+        position += samples // 8 * bitrate // sample_rate + ((header >> 9) & 0x1)
+    return seconds
@@ -0,0 +1,290 @@
+import ast
+import asyncio
+import copy
+import re
+from typing import AsyncGenerator, Dict, List, Set, Tuple
+
+from services.llm_switcher import converse
+from services.prompts import chunk_review_prompt
+
+# Target size of a review chunk; a single function or class larger than this stays whole
+MAX_CHUNK_LINES = 120
+MAX_CONCURRENCY = 4
+
+_IMPORT_LINE = re.compile(r"^\s*(import|from|#include|using|require|package|use)\b|^\s*(const|let|var)\s.*\brequire\(")
+_FINDING_LINE = re.compile(r"^\W*L(?:ine)?\s*(\d+)(?:\s*-\s*L?(\d+))?\s*[:\-–]\s*(.+)$", re.IGNORECASE)
+
+
+def split_code(code: str, language: str = "python", max_lines: int = MAX_CHUNK_LINES) -> List[Dict]:
+    """
+    Split source code into review chunks.
+
+    Python sources are split along `ast` boundaries (module statements, classes,
+    functions and methods); other languages, or Python that fails to parse, are
+    split into heuristic blocks separated by blank lines at brace depth zero.
+
+    Args:
+        code: the full source text
+        language: the editor language mode, e.g. "python" or "javascript"
+        max_lines: target upper bound on lines per chunk
+        chunks: the `split_code` chunks of `code`, when the caller already split it
+
+    Returns: List of dicts with keys:
+        - name: str          # human readable label, e.g. "class Foo" or "lines 1-40"
+        - start_line: int    # 1-based first line in the original file
+        - end_line: int      # 1-based last line in the original file
+        - code: str          # the chunk source
+        - context: str       # imports and signatures the chunk refers to
+    """
+    lines = code.splitlines()
+    if not lines:
+        return []
+
+    if language == "python":
+        try:
+            tree = ast.parse(code)
+        except SyntaxError:
+            tree = None
+        if tree is not None:
+            units = _python_units(tree, max_lines)
+            chunks = _pack_units(units, lines, max_lines)
+            for chunk in chunks:
+                chunk["context"] = _python_context(tree, code, chunk)
+            return chunks
+
+    units = _heuristic_units(lines)
+    chunks = _pack_units(units, lines, max_lines)
+    imports = "\n".join(line for line in lines if _IMPORT_LINE.match(line))
+    for chunk in chunks:
+        chunk["context"] = imports
+    return chunks
+
+
+def _node_start(node: ast.AST) -> int:
+    decorators = getattr(node, "decorator_list", [])
+    return min([node.lineno] + [decorator.lineno for decorator in decorators])
+
+
+def _python_units(tree: ast.Module, max_lines: int) -> List[Tuple[int, int, str]]:
+    """
+    Return (start_line, end_line, name) units covering the module's top-level statements.
+    Classes larger than max_lines are split into their header and one unit per method.
+    """
+    units = []
+    for node in tree.body:
+        start, end = _node_start(node), node.end_lineno
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            units.append((start, end, f"def {node.name}"))
+        elif isinstance(node, ast.ClassDef) and end - start + 1 > max_lines:
+            header_end = _node_start(node.body[0]) - 1 if node.body else end
+            units.append((start, max(start, header_end), f"class {node.name}"))
+            for member in node.body:
+                if isinstance(member, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                    units.append((_node_start(member), member.end_lineno, f"{node.name}.{member.name}"))
+                else:
+                    units.append((_node_start(member), member.end_lineno, f"class {node.name}"))
+        elif isinstance(node, ast.ClassDef):
+            units.append((start, end, f"class {node.name}"))
+        else:
+            units.append((start, end, "module"))
+    return units
+
+
+def _heuristic_units(lines: List[str]) -> List[Tuple[int, int, str]]:
+    """
+    Return (start_line, end_line, name) units separated by blank lines that sit
+    outside any braces, which approximates top-level declarations in C-like languages.
+    """
+    units, depth, start = [], 0, None
+    for number, line in enumerate(lines, start=1):
+        if start is None:
+            if not line.strip():
+                continue
+            start = number
+        depth = max(0, depth + line.count("{") - line.count("}"))
+        if depth == 0 and (number == len(lines) or not lines[number].strip()):
+            units.append((start, number, f"lines {start}-{number}"))
+            start = None
+    if start is not None:
+        units.append((start, len(lines), f"lines {start}-{len(lines)}"))
+    return units
+
+
+def _pack_units(units: List[Tuple[int, int, str]], lines: List[str], max_lines: int) -> List[Dict]:
+    """
+    Merge consecutive units into chunks of at most max_lines. Chunks are contiguous
+    so the comments and blank lines between units are reviewed too.
+    """
+    groups = []
+    for start, end, name in units:
+        if groups and end - groups[-1]["start"] + 1 <= max_lines:
+            groups[-1]["end"] = end
+            if name not in groups[-1]["names"]:
+                groups[-1]["names"].append(name)
+        else:
+            groups.append({"start": start, "end": end, "names": [name]})
+
+    chunks = []
+    for index, group in enumerate(groups):
+        start_line = chunks[-1]["end_line"] + 1 if chunks else 1
+        end_line = len(lines) if index == len(groups) - 1 else group["end"]
+        names = group["names"]
+        # Unit ranges ("lines 5-8") don't cover the gaps a chunk takes in, so those chunks are named by their own range
+        named = len(names) <= 3 and not any(name.startswith("lines ") for name in names)
+        chunks.append({
+            "name": ", ".join(names) if named else f"lines {start_line}-{end_line}",
+            "start_line": start_line,
+            "end_line": end_line,
+            "code": "\n".join(lines[start_line - 1:end_line]),
+        })
+    return chunks
+
+
+def _python_context(tree: ast.Module, code: str, chunk: Dict) -> str:
+    """
+    Build the minimal context a Python chunk needs: the imports it uses and the
+    signatures of module-level functions and classes it references or sits inside.
+    Classes only list `__init__` and the methods the chunk accesses as attributes.
+    """
+    start, end = chunk["start_line"], chunk["end_line"]
+    names, attributes = _names_used(tree, start, end)
+    context = []
+    for node in tree.body:
+        inside = start <= _node_start(node) and node.end_lineno <= end
+        if inside:
+            continue
+        if isinstance(node, (ast.Import, ast.ImportFrom)):
+            bound = {(alias.asname or alias.name).split(".")[0] for alias in node.names}
+            if bound & names:
+                context.append(ast.get_source_segment(code, node) or ast.unparse(node))
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            encloses = _node_start(node) <= start and end <= node.end_lineno
+            if node.name in names or encloses:
+                context.append(_signature(node, attributes | {"__init__"}))
+    return "\n".join(context)
+
+
+def _names_used(tree: ast.Module, start: int, end: int) -> Tuple[Set[str], Set[str]]:
+    """
+    Return the plain names and attribute names referenced between start and end.
+    """
+    names, attributes = set(), set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name) and start <= node.lineno <= end:
+            names.add(node.id)
+        elif isinstance(node, ast.Attribute) and start <= node.lineno <= end:
+            attributes.add(node.attr)
+    return names, attributes
+
+
+def _signature(node: ast.AST, methods: Set[str]) -> str:
+    """
+    Render a function or class definition with its body elided to `...`.
+    Classes keep the signatures of the named methods.
+    """
+    stub = copy.copy(node)
+    stub.body = [ast.Expr(ast.Constant(...))]
+    if isinstance(node, ast.ClassDef):
+        kept = [copy.copy(member) for member in node.body
+                if isinstance(member, (ast.FunctionDef, ast.AsyncFunctionDef)) and member.name in methods]
+        for method in kept:
+            method.body = [ast.Expr(ast.Constant(...))]
+        stub.body = kept or stub.body
+    return ast.unparse(stub)
+
+
+def parse_findings(response: str, chunk: Dict) -> List[Dict]:
+    """
+    Parse `L<line>: <finding>` lines from a chunk review and map them to lines
+    in the original file. Numbers outside the chunk that fit within its length
+    are treated as chunk-relative; findings still outside the chunk after that are
+    dropped, and ranges running past its end are cut at its last line.
+
+    Returns: List of dicts with keys `line` (int or None), `end_line`, `message` and `chunk`
+    """
+    findings, dropped = [], 0
+    length = chunk["end_line"] - chunk["start_line"] + 1
+    for raw in response.splitlines():
+        match = _FINDING_LINE.match(raw.strip())
+        if not match:
+            continue
+        line = int(match.group(1))
+        end_line = int(match.group(2)) if match.group(2) else line
+        if not chunk["start_line"] <= line <= chunk["end_line"] and 1 <= line <= length:
+            offset = chunk["start_line"] - 1
+            line, end_line = line + offset, end_line + offset
+        if not chunk["start_line"] <= line <= chunk["end_line"]:
+            print(f"⚠️ Dropped a finding for line {line}, outside {chunk['name']} "
+                  f"(lines {chunk['start_line']}-{chunk['end_line']})")
+            dropped += 1
+            continue
+        findings.append({"line": line, "end_line": min(max(line, end_line), chunk["end_line"]),
+                         "message": match.group(3).strip(), "chunk": chunk["name"]})
+    if not findings and not dropped and response.strip() and not response.strip().lower().startswith("no findings"):
+        findings.append({"line": None, "end_line": None, "message": response.strip(), "chunk": chunk["name"]})
+    return findings
+
+
+async def review_chunk(chunk: Dict, language: str) -> Dict:
+    """
+    Review a single chunk with the LLM.
+
+    Returns: a dict with keys `chunk`, `response` and `findings`
+    """
+    numbered = "\n".join(f"{number:>5} | {line}" for number, line in
+                         enumerate(chunk["code"].splitlines(), start=chunk["start_line"]))
+    messages = [{"role": "user", "content": chunk_review_prompt(numbered, chunk["context"], language)}]
+    response = ""
+    async for delta in converse(messages):
+        response += delta
+    return {"chunk": chunk, "response": response, "findings": parse_findings(response, chunk)}
+
+
+async def review_code(code: str,
+                      language: str = "python",
+                      max_concurrency: int = MAX_CONCURRENCY,
+                      max_lines: int = MAX_CHUNK_LINES,
+                      chunks: List[Dict] | None = None) -> AsyncGenerator[Dict, None]:
+    """
+    Review a source file chunk by chunk with bounded parallelism, yielding each
+    chunk's result as soon as it completes (not in file order).
+
+    Args:
+        code: the full source text
+        language: the editor language mode
+        max_concurrency: maximum number of chunk reviews in flight
+        max_lines: target upper bound on lines per chunk
+        chunks: the `split_code` chunks of `code`, when the caller already split it
+
+    Returns: a generator of `review_chunk` result dicts
+    """
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def bounded(chunk):
+        async with semaphore:
+            return await review_chunk(chunk, language)
+
+    if chunks is None:
+        chunks = split_code(code, language, max_lines)
+    tasks = [asyncio.create_task(bounded(chunk)) for chunk in chunks]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+def merge_findings(results: List[Dict]) -> List[Dict]:
+    """
+    Merge chunk findings into one list ordered by line in the original file,
+    dropping exact duplicates. Findings without a line number sort last.
+    """
+    seen, merged = set(), []
+    for result in results:
+        for finding in result["findings"]:
+            key = (finding["line"], finding["message"])
+            if key not in seen:
+                seen.add(key)
+                merged.append(finding)
+    return sorted(merged, key=lambda finding: (finding["line"] is None, finding["line"] or 0))
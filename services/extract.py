@@ -1,4 +1,11 @@
+import functools
 import re
+from typing import AsyncIterable, AsyncGenerator, Dict, List
+
+
+@functools.lru_cache(maxsize=32)
+def _delimited_pattern(output_delimiter: str, label: str) -> re.Pattern:
+    return re.compile(r'{regex}'.format(regex=(f"{output_delimiter}{label}\n(.*?)\n{output_delimiter}".format(label=label, output_delimiter=output_delimiter))), re.DOTALL)
 
 
 def extract_delimited_content(response: str,
@@ -16,7 +23,7 @@ def extract_delimited_content(response: str,
     - str: The extracted content not including the triple backticks or label.
     """
 
-    diff_pattern = re.compile(r'{regex}'.format(regex=(f"{output_delimiter}{label}\n(.*?)\n{output_delimiter}".format(label=label, output_delimiter=output_delimiter))), re.DOTALL)
+    diff_pattern = _delimited_pattern(output_delimiter, label)
     match = diff_pattern.search(response)
     if match:
         return match.group(1)
@@ -24,3 +31,123 @@ def extract_delimited_content(response: str,
         return response if return_response_on_failure else None
 
 
+# A complete fence line: up to three spaces of indent, 3+ backticks or tildes, optional label
+_FENCE_LINE = re.compile(r"^ {0,3}(`{3,}|~{3,})[ \t]*([^`\s]*)[^`]*$")
+# A partial line that could still turn into a fence line once more text arrives
+_FENCE_PREFIX = re.compile(r"^ {0,3}(`{0,2}|~{0,2}|`{3,}[^`]*|~{3,}.*)$")
+
+
+class FencedBlockParser:
+    """
+    Incrementally splits a streamed markdown response into prose and fenced code blocks.
+
+    Feed it deltas as they arrive; each call returns the events the new text completes:
+        - {"type": "text", "text": str}                             # prose outside blocks
+        - {"type": "open", "index": int, "label": str}              # a block started
+        - {"type": "code", "index": int, "text": str}               # a block grew
+        - {"type": "close", "index": int, "label": str, "code": str, "terminated": bool}
+
+    Only a trailing partial line that could still become a fence is held back, so
+    the parser does amortized O(n) work over the whole stream. Fences are only
+    recognized at the start of a line, however the stream is split into deltas. Fences inside a block
+    that could close it but carry a label open a nested level that a later bare fence
+    closes, which is how models usually nest examples in markdown. Unterminated blocks
+    are closed by `finish` with `terminated` set to False.
+    """
+
+    def __init__(self):
+        self._pending = ""
+        self._block = None
+        self._count = 0
+        # False after part of a line was streamed: the rest of it can't be a fence
+        self._at_line_start = True
+
+    def feed(self, delta: str) -> List[Dict]:
+        events = []
+        text = self._pending + delta
+        start = 0
+        newline = text.find("\n")
+        while newline != -1:
+            self._line(text[start:newline + 1], events)
+            start = newline + 1
+            newline = text.find("\n", start)
+
+        self._pending = text[start:]
+        if self._pending and not (self._at_line_start and _FENCE_PREFIX.match(self._pending)):
+            # The partial line cannot be a fence, so stream it now
+            self._content(self._pending, events)
+            self._pending = ""
+            self._at_line_start = False
+        return self._joined(events)
+
+    def finish(self) -> List[Dict]:
+        events = []
+        if self._pending:
+            self._line(self._pending, events)
+            self._pending = ""
+        if self._block is not None:
+            events.append(self._close(terminated=False))
+        return self._joined(events)
+
+    def _line(self, line: str, events: List[Dict]):
+        fence = _FENCE_LINE.match(line.rstrip("\r\n")) if self._at_line_start else None
+        self._at_line_start = line.endswith("\n")
+        block = self._block
+        if block is None:
+            if fence:
+                self._block = {"index": self._count, "label": fence.group(2), "fence": fence.group(1),
+                               "depth": 0, "code": []}
+                self._count += 1
+                events.append({"type": "open", "index": self._block["index"], "label": fence.group(2)})
+            else:
+                self._content(line, events)
+            return
+
+        if fence and fence.group(1)[0] == block["fence"][0] and len(fence.group(1)) >= len(block["fence"]):
+            if fence.group(2):
+                block["depth"] += 1
+            elif block["depth"] == 0:
+                events.append(self._close(terminated=True))
+                return
+            else:
+                block["depth"] -= 1
+        self._content(line, events)
+
+    def _content(self, text: str, events: List[Dict]):
+        # Text is collected in "parts" lists and joined by _joined to keep feeds linear
+        kind = "text" if self._block is None else "code"
+        if self._block is not None:
+            self._block["code"].append(text)
+        if events and events[-1]["type"] == kind:
+            events[-1]["parts"].append(text)
+        elif kind == "text":
+            events.append({"type": "text", "parts": [text]})
+        else:
+            events.append({"type": "code", "index": self._block["index"], "parts": [text]})
+
+    @staticmethod
+    def _joined(events: List[Dict]) -> List[Dict]:
+        for event in events:
+            if "parts" in event:
+                event["text"] = "".join(event.pop("parts"))
+        return events
+
+    def _close(self, terminated: bool) -> Dict:
+        block, self._block = self._block, None
+        code = "".join(block["code"])
+        if code.endswith("\n"):
+            code = code[:-1]
+        return {"type": "close", "index": block["index"], "label": block["label"], "code": code,
+                "terminated": terminated}
+
+
+async def stream_fenced_blocks(deltas: AsyncIterable[str]) -> AsyncGenerator[Dict, None]:
+    """
+    Wrap a stream of deltas (e.g. from `converse`) into a stream of FencedBlockParser events.
+    """
+    parser = FencedBlockParser()
+    async for delta in deltas:
+        for event in parser.feed(delta):
+            yield event
+    for event in parser.finish():
+        yield event
@@ -1,15 +1,36 @@
 import os
 import traceback
 from typing import List, Dict, AsyncGenerator, Tuple
-import google.generativeai as genai
 from dotenv import load_dotenv
 
+from services import registry
+
 # Load .env file
 load_dotenv()
 
-# Configure Gemini
-genai.configure(api_key=os.getenv('GEMINI_API_KEY'))
-gemini_model = genai.GenerativeModel('gemini-1.5-flash')
+
+def _create_gemini_model():
+    # The SDK is imported and configured on first use, since it is slow to import.
+    # GEMINI_API_BASE_URL points it at another endpoint over REST (e.g. a local mock server)
+    import google.generativeai as genai
+
+    if os.getenv('GEMINI_API_BASE_URL'):
+        genai.configure(api_key=os.getenv('GEMINI_API_KEY'), transport="rest",
+                        client_options={"api_endpoint": os.getenv('GEMINI_API_BASE_URL')})
+    else:
+        genai.configure(api_key=os.getenv('GEMINI_API_KEY'))
+    return genai.GenerativeModel('gemini-1.5-flash')
+
+
+registry.register("gemini_model", _create_gemini_model)
+
+
+def get_gemini_model():
+    """
+    Return the shared Gemini model, configuring the SDK on first use.
+    """
+    return registry.get("gemini_model")
+
 
 def converse_sync(prompt: str, messages: List[Dict[str, str]],
     max_tokens: int = 1600,
@@ -36,7 +57,7 @@ def converse_sync(prompt: str, messages: List[Dict[str, str]],
                 gemini_messages.insert(0, {"role": "user", "parts": [f"System: {msg['content']}"]})
 
         # Create chat session
-        chat = gemini_model.start_chat(history=gemini_messages[:-1] if len(gemini_messages) > 1 else [])
+        chat = get_gemini_model().start_chat(history=gemini_messages[:-1] if len(gemini_messages) > 1 else [])
         
         # Get response
         response = chat.send_message(prompt)
@@ -70,7 +91,7 @@ async def converse(messages: List[Dict[str, str]]) -> AsyncGenerator[str, None]:
                 gemini_messages.insert(0, {"role": "user", "parts": [f"System: {msg['content']}"]})
 
         # Create chat session
-        chat = gemini_model.start_chat(history=gemini_messages)
+        chat = get_gemini_model().start_chat(history=gemini_messages)
         
         # Get the last user message
         last_user_message = None
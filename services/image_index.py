@@ -0,0 +1,193 @@
+import os
+import sqlite3
+from contextlib import closing
+from datetime import datetime
+from typing import Dict, List, Literal, Tuple
+
+IMAGE_INDEX_PATH = os.getenv("IMAGE_INDEX_PATH", os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "image_manifest.sqlite3"))
+
+SortOrder = Literal["newest", "oldest", "description"]
+_ORDER_BY = {
+    "newest": "created_at DESC, filename DESC",
+    "oldest": "created_at ASC, filename ASC",
+    "description": "description COLLATE NOCASE ASC, created_at DESC",
+}
+
+_initialized = set()
+
+
+def _connect(path: str | None) -> sqlite3.Connection:
+    path = path or IMAGE_INDEX_PATH
+    if path not in _initialized:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    connection = sqlite3.connect(path, timeout=30)
+    if path not in _initialized:
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.executescript("""
+            CREATE TABLE IF NOT EXISTS images (
+                filename TEXT PRIMARY KEY,
+                description TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                size_bytes INTEGER NOT NULL,
+                content_hash TEXT,
+                request_key TEXT
+            );
+            CREATE INDEX IF NOT EXISTS images_created_at ON images (created_at);
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            );""")
+        # Manifests created by earlier versions lack the newer columns
+        columns = {row[1] for row in connection.execute("PRAGMA table_info(images)")}
+        for column in ("content_hash", "request_key"):
+            if column not in columns:
+                connection.execute(f"ALTER TABLE images ADD COLUMN {column} TEXT")
+        connection.execute("CREATE INDEX IF NOT EXISTS images_request_key ON images (request_key)")
+        _initialized.add(path)
+    return connection
+
+
+def add_image(folder: str, filename: str, description: str, content_hash: str | None = None,
+              request_key: str | None = None, path: str | None = None) -> None:
+    """
+    Add (or replace) an image in the manifest in a single transaction.
+
+    Args:
+        folder: the images folder
+        filename: the image file name within the folder
+        description: the prompt the image was generated from
+        content_hash: the SHA-256 of the image bytes, which keys its thumbnails
+        request_key: the hash of the generation parameters the image was made with
+        path: the manifest database file
+    """
+    stat = os.stat(os.path.join(folder, filename))
+    with closing(_connect(path)) as connection, connection:
+        connection.execute("INSERT OR REPLACE INTO images (filename, description, created_at, size_bytes, "
+                           "content_hash, request_key) VALUES (?, ?, ?, ?, ?, ?)",
+                           (filename, description, stat.st_ctime, stat.st_size, content_hash, request_key))
+
+
+def find_by_request_key(request_key: str, path: str | None = None) -> Tuple[str, str | None] | None:
+    """
+    Return (filename, content hash) of the newest image generated with the given
+    request key, or None if there is none.
+    """
+    with closing(_connect(path)) as connection:
+        return connection.execute("SELECT filename, content_hash FROM images WHERE request_key = ? "
+                                  "ORDER BY created_at DESC LIMIT 1", (request_key,)).fetchone()
+
+
+def set_content_hash(filename: str, content_hash: str, path: str | None = None) -> None:
+    with closing(_connect(path)) as connection, connection:
+        connection.execute("UPDATE images SET content_hash = ? WHERE filename = ?", (content_hash, filename))
+
+
+def content_hashes(path: str | None = None) -> List[Tuple[str, str | None]]:
+    """
+    Return (filename, content hash) for every indexed image; the hash is None until
+    the image's thumbnails have been created.
+    """
+    with closing(_connect(path)) as connection:
+        return connection.execute("SELECT filename, content_hash FROM images ORDER BY created_at DESC").fetchall()
+
+
+def remove_image(filename: str, path: str | None = None) -> str | None:
+    """
+    Remove an image from the manifest.
+
+    Returns: the removed image's content hash, or None if it had none or was not indexed
+    """
+    with closing(_connect(path)) as connection, connection:
+        row = connection.execute("SELECT content_hash FROM images WHERE filename = ?", (filename,)).fetchone()
+        connection.execute("DELETE FROM images WHERE filename = ?", (filename,))
+    return row[0] if row else None
+
+
+def hash_in_use(content_hash: str, path: str | None = None) -> bool:
+    with closing(_connect(path)) as connection:
+        return connection.execute("SELECT 1 FROM images WHERE content_hash = ? LIMIT 1",
+                                   (content_hash,)).fetchone() is not None
+
+
+def reconcile(folder: str, force: bool = False, path: str | None = None) -> Tuple[int, int]:
+    """
+    Bring the manifest in line with the images actually in the folder: index images
+    that were added outside the app and drop entries whose file is gone. The folder
+    is only scanned when its modification time changed since the last reconciliation,
+    unless `force` is set.
+
+    Returns: (added, removed) counts
+    """
+    if not os.path.isdir(folder):
+        return 0, 0
+    folder_mtime = str(os.stat(folder).st_mtime_ns)
+    mtime_key = f"folder_mtime:{os.path.abspath(folder)}"
+    with closing(_connect(path)) as connection, connection:
+        row = connection.execute("SELECT value FROM meta WHERE key = ?", (mtime_key,)).fetchone()
+        if not force and row is not None and row[0] == folder_mtime:
+            return 0, 0
+
+        on_disk = {entry.name: entry for entry in os.scandir(folder) if entry.name.endswith(".png")}
+        indexed = {filename for (filename,) in connection.execute("SELECT filename FROM images")}
+
+        removed = indexed - on_disk.keys()
+        connection.executemany("DELETE FROM images WHERE filename = ?", [(filename,) for filename in removed])
+
+        added = on_disk.keys() - indexed
+        rows = []
+        for filename in added:
+            description_path = os.path.join(folder, os.path.splitext(filename)[0] + ".txt")
+            description = ""
+            if os.path.exists(description_path):
+                with open(description_path, "r") as desc_file:
+                    description = desc_file.read()
+            stat = on_disk[filename].stat()
+            rows.append((filename, description, stat.st_ctime, stat.st_size))
+        connection.executemany("INSERT OR REPLACE INTO images (filename, description, created_at, size_bytes) "
+                               "VALUES (?, ?, ?, ?)", rows)
+        connection.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (mtime_key, folder_mtime))
+
+    if added or removed:
+        print(f"🗂️ Reconciled image manifest: {len(added)} added, {len(removed)} removed")
+    return len(added), len(removed)
+
+
+def query_images(folder: str,
+                 page: int = 0,
+                 page_size: int = 20,
+                 sort: SortOrder = "newest",
+                 search: str = "",
+                 path: str | None = None) -> Tuple[List[Dict], int]:
+    """
+    Return one page of images from the manifest.
+
+    Args:
+        folder: the images folder, used to build full image paths
+        page: the zero-based page number
+        page_size: the number of images per page
+        sort: "newest", "oldest" or "description"
+        search: only include images whose prompt contains this text (case-insensitive)
+        path: the manifest database file
+
+    Returns: (rows, total) where rows are dicts with keys 'Image', 'Description',
+             'Date Created', 'Size' and 'Hash', and total is the number of matching images
+    """
+    where, parameters = "", []
+    if search.strip():
+        where = "WHERE description LIKE ? ESCAPE '\\'"
+        escaped = search.strip().replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        parameters.append(f"%{escaped}%")
+
+    with closing(_connect(path)) as connection:
+        total = connection.execute(f"SELECT COUNT(*) FROM images {where}", parameters).fetchone()[0]
+        rows = connection.execute(
+            f"SELECT filename, description, created_at, size_bytes, content_hash FROM images {where} "
+            f"ORDER BY {_ORDER_BY[sort]} LIMIT ? OFFSET ?",
+            parameters + [page_size, page * page_size]).fetchall()
+
+    return [{"Image": os.path.join(folder, filename),
+             "Description": description,
+             "Date Created": datetime.fromtimestamp(created_at),
+             "Size": size_bytes,
+             "Hash": content_hash} for filename, description, created_at, size_bytes, content_hash in rows], total
@@ -1,19 +1,37 @@
+import asyncio
+import base64
+import concurrent.futures
+import hashlib
+import json
 import os
+import threading
+import time
+import uuid
 from datetime import datetime
-from typing import Literal, Tuple
+from typing import TYPE_CHECKING, AsyncGenerator, Dict, List, Literal, Tuple
 from urllib.parse import urlparse
 
-import httpx
-import pandas as pd
 from dotenv import load_dotenv
-from openai import OpenAI
+
+from services import image_index, llm, registry, thumbnails
+
+# pandas, httpx and openai are imported on first use to keep the Images page's cold start fast
+if TYPE_CHECKING:
+    import pandas as pd
+    from openai import AsyncOpenAI
 # Load .env file
 load_dotenv()
 
-__IMAGES_BASE_FOLDER = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data/images')
+__IMAGES_BASE_FOLDER = os.getenv('IMAGES_DIR', os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data/images'))
+
+# Generations currently in progress by request key, shared by all sessions so identical
+# concurrent requests make a single API call
+_in_flight: Dict[str, concurrent.futures.Future] = {}
+_in_flight_lock = threading.Lock()
 
 
-def get_all_images() -> pd.DataFrame:
+def get_all_images() -> "pd.DataFrame":
     """
     Retrieves a DataFrame containing information about all images stored in a folder.
 
@@ -22,27 +40,46 @@ def get_all_images() -> pd.DataFrame:
                       where 'Image' is the file path, 'Description' is the associated
                       description, and 'Date Created' is the creation timestamp.
     """
-    # AI Generation Prompt:
-    # Write a Python function that reads all `.png` image files from a given folder, retrieves
-    # their associated descriptions from a `.txt` file with the same name, and returns a pandas
-    # DataFrame containing the image file paths, descriptions, and creation timestamps.
-
-    images_data = []
-    for file in os.listdir(__IMAGES_BASE_FOLDER):
-        if file.endswith('.png'):
-            image_path = os.path.join(__IMAGES_BASE_FOLDER, file)
-            description_path = os.path.splitext(image_path)[0] + '.txt'
-            description = ''
-            if os.path.exists(description_path):
-                with open(description_path, 'r') as desc_file:
-                    description = desc_file.read()
-            creation_time = datetime.fromtimestamp(os.path.getctime(image_path))
-            images_data.append({
-                'Image': image_path,
-                'Description': description,
-                'Date Created': creation_time
-            })
-    return pd.DataFrame(images_data)
+    import pandas as pd
+
+    rows, total = get_images_page(page=0, page_size=-1)
+    return pd.DataFrame(rows, columns=['Image', 'Description', 'Date Created'])
+
+
+def get_images_page(page: int = 0,
+                    page_size: int = 20,
+                    sort: image_index.SortOrder = "newest",
+                    search: str = "") -> Tuple[List[Dict], int]:
+    """
+    Retrieves one page of images from the manifest index, reconciling the index
+    with the images folder first if the folder changed.
+
+    Args:
+        page (int): The zero-based page number.
+        page_size (int): The number of images per page (-1 for all).
+        sort (str): "newest", "oldest" or "description".
+        search (str): Only include images whose prompt contains this text.
+
+    Returns:
+        Tuple[List[Dict], int]: The page of images, as dicts with keys 'Image', 'Description',
+                                'Date Created', 'Size', 'Hash', 'Thumbnail', 'Preview' and
+                                'Thumbnail Failed', and the total number of matches. 'Thumbnail' and
+                                'Preview' are None until the image's thumbnails exist, and
+                                'Thumbnail Failed' tells they could not be created.
+    """
+    image_index.reconcile(__IMAGES_BASE_FOLDER)
+    rows, total = image_index.query_images(__IMAGES_BASE_FOLDER, page, page_size, sort, search)
+    backfill_needed = False
+    for row in rows:
+        for key, size in (("Thumbnail", "thumb"), ("Preview", "medium")):
+            path = thumbnails.thumbnail_path(row["Hash"], size) if row["Hash"] else None
+            row[key] = path if path and os.path.exists(path) else None
+        row["Thumbnail Failed"] = row["Thumbnail"] is None and thumbnails.has_failed(os.path.basename(row["Image"]))
+        backfill_needed = backfill_needed or (row["Preview"] is None and not row["Thumbnail Failed"])
+    if backfill_needed:
+        # Images from before thumbnails existed, or added outside the app
+        thumbnails.start_backfill(__IMAGES_BASE_FOLDER)
+    return rows, total
 
 
 def delete_image(image_path: str):
@@ -55,19 +92,27 @@ def delete_image(image_path: str):
     # AI Generation Prompt:
     # Write a Python function that deletes a given image file and its corresponding `.txt`
     # description file, if the description file exists.
+    content_hash = image_index.remove_image(os.path.basename(image_path))
+    if content_hash and not image_index.hash_in_use(content_hash):
+        thumbnails.remove_thumbnails(content_hash)
     if os.path.exists(image_path):
         os.remove(image_path)
     description_path = os.path.splitext(image_path)[0] + '.txt'
     if os.path.exists(description_path):
         os.remove(description_path)
 
+ImageSize = Literal["256x256", "512x512", "1024x1024", "1792x1024", "1024x1792"]
+
+
 async def generate_image(
     prompt: str,
     model: str = "dall-e-3",
     style: Literal["vivid", "natural"] = "vivid",
     quality: Literal["standard", "hd"] = "hd",
     timeout: int = 100,
-    size: Literal["256x256", "512x512", "1024x1024", "1792x1024", "1024x1792"] = "1024x1024"
+    size: ImageSize = "1024x1024",
+    reuse_existing: bool = False,
+    variant: int = 0
 ) -> Tuple[str, str]:
     """
     Generates an image based on a given text prompt using the OpenAI client
@@ -80,52 +125,234 @@ async def generate_image(
         quality (Literal): The quality setting, either "standard" or "hd".
         timeout (int): The maximum time (in seconds) to wait for the image to be generated.
         size (Literal): The size of the image, e.g., "1024x1024", "1792x1024", etc.
+        reuse_existing (bool): Return a previously generated image for identical parameters
+                               instead of calling the API again.
+        variant (int): A seed to tell apart otherwise identical requests that should give different images.
 
     Returns:
         Tuple[str, str]: A tuple containing the prompt and the file path of the saved image.
     """
-    # Create an OpenAI client
-    client = OpenAI(
-        api_key=os.getenv('OPENAI_API_KEY'),
-        base_url=os.getenv('OPENAI_API_BASE_URL'))
+    result = await _generate_deduplicated(llm.get_async_client(), prompt, 0, variant, model, style, quality, timeout,
+                                          size, reuse_existing)
+    return prompt, result["image_path"]
+
+
+async def generate_images(
+    prompts: List[str],
+    variants: int = 1,
+    model: str = "dall-e-3",
+    style: Literal["vivid", "natural"] = "vivid",
+    quality: Literal["standard", "hd"] = "hd",
+    timeout: int = 100,
+    size: ImageSize = "1024x1024",
+    max_concurrency: int = 4,
+    reuse_existing: bool = False
+) -> AsyncGenerator[Dict, None]:
+    """
+    Generates `variants` images for each prompt concurrently and yields each
+    result as soon as it has been saved (not in request order).
+
+    Args:
+        prompts (List[str]): The prompts to generate images for.
+        variants (int): The number of images to generate per prompt.
+        model, style, quality, timeout, size: As for `generate_image`.
+        max_concurrency (int): The maximum number of image requests in flight.
+        reuse_existing (bool): Reuse previously generated images for identical requests; the
+                               variants of a prompt are told apart by their variant number.
+
+    Yields:
+        Dict: A dict with keys `index` (position in request order), `prompt`, `image_path`,
+              `preview_path` (a downscaled WebP preview), `api_seconds`, `write_seconds`, `seconds`,
+              `cache` ("miss", "hit" for a reused image or "coalesced" when an identical request
+              in progress was shared) and `error` (None on success).
+    """
+    client = llm.get_async_client()
+    semaphore = asyncio.Semaphore(max_concurrency)
+    requests = [(prompt, variant) for prompt in prompts for variant in range(variants)]
+
+    async def bounded(index, prompt, variant):
+        async with semaphore:
+            try:
+                return await _generate_deduplicated(client, prompt, index, variant, model, style, quality, timeout,
+                                                    size, reuse_existing)
+            except Exception as e:
+                return {"index": index, "prompt": prompt, "image_path": None, "preview_path": None,
+                        "api_seconds": None, "write_seconds": None, "seconds": None, "cache": "miss",
+                        "error": str(e)}
+
+    tasks = [asyncio.create_task(bounded(index, prompt, variant))
+             for index, (prompt, variant) in enumerate(requests)]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+def image_request_key(prompt: str, model: str, style: str, quality: str, size: str, variant: int = 0) -> str:
+    """
+    Returns the hash identifying an image request: its generation parameters and variant seed.
+    Whitespace differences in the prompt do not change the key.
+    """
+    parameters = [" ".join(prompt.split()), model, style, quality, size, variant]
+    return hashlib.sha256(json.dumps(parameters).encode("utf-8")).hexdigest()
 
-    # Generate the image using the OpenAI client
+
+def _find_existing(request_key: str) -> Tuple[str, str] | None:
+    """
+    Returns the path and preview path of an existing image for the request key, if any.
+    """
+    row = image_index.find_by_request_key(request_key)
+    if row is None:
+        return None
+    filename, content_hash = row
+    image_path = os.path.join(__IMAGES_BASE_FOLDER, filename)
+    if not os.path.exists(image_path):
+        return None
+    if not content_hash or not os.path.exists(thumbnails.thumbnail_path(content_hash, "medium")):
+        with open(image_path, "rb") as image_file:
+            content_hash = _create_thumbnails(filename, image_file.read())
+        image_index.set_content_hash(filename, content_hash)
+    return image_path, _preview_path(image_path, content_hash)
+
+
+async def _generate_deduplicated(client: "AsyncOpenAI", prompt: str, index: int, variant: int, model: str,
+                                 style: str, quality: str, timeout: int, size: str, reuse_existing: bool) -> Dict:
+    """
+    Generates one image unless an identical request can be answered without a new API call:
+    by an existing image when `reuse_existing` is set, or by sharing the result of an
+    identical request that is already in progress.
+    """
+    start_time = time.perf_counter()
+    request_key = image_request_key(prompt, model, style, quality, size, variant)
+    if reuse_existing:
+        existing = await registry.to_thread(_find_existing, request_key)
+        if existing is not None:
+            print(f"♻️ Image {index} reused from {os.path.basename(existing[0])}")
+            seconds = time.perf_counter() - start_time
+            return {"index": index, "prompt": prompt, "image_path": existing[0], "preview_path": existing[1],
+                    "api_seconds": 0.0, "write_seconds": 0.0, "seconds": seconds, "cache": "hit", "error": None}
+
+    with _in_flight_lock:
+        shared = _in_flight.get(request_key)
+        if shared is None:
+            future = _in_flight[request_key] = concurrent.futures.Future()
+    if shared is not None:
+        # Shielded so a cancelled waiter does not cancel the generation it shares
+        result = await asyncio.shield(asyncio.wrap_future(shared))
+        print(f"♻️ Image {index} shared an identical request in progress")
+        return {**result, "index": index, "api_seconds": 0.0, "write_seconds": 0.0,
+                "seconds": time.perf_counter() - start_time, "cache": "coalesced"}
+
+    try:
+        result = await _generate_and_save(client, prompt, index, model, style, quality, timeout, size, request_key)
+        future.set_result(result)
+        return result
+    except BaseException as e:
+        future.set_exception(e if isinstance(e, Exception) else RuntimeError("Image generation was cancelled"))
+        raise
+    finally:
+        with _in_flight_lock:
+            del _in_flight[request_key]
+
+
+async def _generate_and_save(client: "AsyncOpenAI", prompt: str, index: int, model: str, style: str,
+                             quality: str, timeout: int, size: str, request_key: str | None = None) -> Dict:
+    """
+    Generates one image, asking for base64 data so no second download is needed,
+    and decodes and writes it off the event loop.
+    """
+    start_time = time.perf_counter()
     try:
-        response = client.images.generate(
+        response = await client.images.generate(
             prompt=prompt,
             model=model,
             style=style,
             quality=quality,
-            size=size
+            size=size,
+            response_format="b64_json",
+            timeout=timeout
         )
     except Exception as e:
         raise RuntimeError(f"Failed to generate image: {e}")
+    api_seconds = time.perf_counter() - start_time
+
+    image = response.data[0]
+    if image.b64_json:
+        image_path, content_hash = await registry.to_thread(_decode_and_save_image, image.b64_json, prompt,
+                                                            request_key)
+    elif image.url:
+        # Some OpenAI-compatible endpoints ignore response_format and only return a URL
+        import httpx
+
+        async with httpx.AsyncClient() as http_client:
+            image_response = await http_client.get(image.url, timeout=timeout)
+            if image_response.status_code != 200:
+                raise RuntimeError(f"Failed to download image: {image_response.status_code}")
+        image_path, content_hash = await registry.to_thread(_save_image, image_response.content, prompt,
+                                                            request_key)
+    else:
+        raise ValueError("No image data returned by the API")
 
-    # Extract the image URL from the response
-    image_url = response.data[0].url
-    if not image_url:
-        raise ValueError("No image URL returned by the API")
+    seconds = time.perf_counter() - start_time
+    print(f"🏞️ Image {index} generated in {api_seconds:.1f}s, saved in {seconds - api_seconds:.2f}s")
+    return {"index": index, "prompt": prompt, "image_path": image_path,
+            "preview_path": _preview_path(image_path, content_hash), "api_seconds": api_seconds,
+            "write_seconds": seconds - api_seconds, "seconds": seconds, "cache": "miss", "error": None}
 
-    # Download the image
-    async with httpx.AsyncClient() as client:
-        image_response = await client.get(image_url, timeout=timeout)
-        if image_response.status_code != 200:
-            raise RuntimeError(f"Failed to download image: {image_response.status_code}")
 
-    # Save the image locally
-    filename = f"{datetime.now().strftime('%Y%m%d%H%M%S')}.png"
+def _decode_and_save_image(b64_data: str, prompt: str, request_key: str | None = None) -> Tuple[str, str]:
+    return _save_image(base64.b64decode(b64_data), prompt, request_key)
+
+
+def _save_image(image_bytes: bytes, prompt: str, request_key: str | None = None) -> Tuple[str, str]:
+    """
+    Saves an image with its prompt in a .txt file alongside and creates its thumbnails.
+    Returns the image path and content hash.
+    """
+    filename = f"{datetime.now().strftime('%Y%m%d%H%M%S%f')}_{uuid.uuid4().hex[:6]}.png"
     image_path = os.path.join(__IMAGES_BASE_FOLDER, filename)
     os.makedirs(__IMAGES_BASE_FOLDER, exist_ok=True)
     with open(image_path, "wb") as image_file:
-        image_file.write(image_response.content)
+        image_file.write(image_bytes)
 
     # Save the prompt in a .txt file alongside the image
     description_path = os.path.splitext(image_path)[0] + ".txt"
     with open(description_path, "w") as desc_file:
         desc_file.write(prompt)
 
-    return prompt, image_path
+    # Keep the image even without thumbnails: it was paid for, and the gallery can show it full size
+    content_hash = _create_thumbnails(filename, image_bytes)
+    # Index the image; if that fails, don't leave unindexed files behind
+    try:
+        image_index.add_image(__IMAGES_BASE_FOLDER, filename, prompt, content_hash, request_key)
+    except Exception:
+        os.remove(image_path)
+        os.remove(description_path)
+        raise
+    return image_path, content_hash
+
 
+def _create_thumbnails(filename: str, image_bytes: bytes) -> str:
+    """
+    Creates an image's thumbnails and returns its content hash. A failure is logged and
+    recorded (see `thumbnails.record_failure`) rather than raised.
+    """
+    try:
+        return thumbnails.create_thumbnails(image_bytes)
+    except Exception as e:
+        print(f"❌ Could not create thumbnails for {filename}: {e}")
+        thumbnails.record_failure(filename)
+        return thumbnails.content_hash(image_bytes)
+
+
+def _preview_path(image_path: str, content_hash: str) -> str:
+    """
+    Returns the medium preview of an image, or the image itself if it has no thumbnails.
+    """
+    path = thumbnails.thumbnail_path(content_hash, "medium")
+    return path if os.path.exists(path) else image_path
 
 
 def _extract_filename_from_url(url: str) -> str:
@@ -0,0 +1,148 @@
+"""
+Versioned, memory-mapped book index directories, shared by every worker process on a node.
+
+An index directory holds one subdirectory per published version and a `current` symlink
+to the one in use:
+
+    data/book_index/
+        current -> v20260101-120000-123456-1234
+        v20260101-120000-123456-1234/
+            vectors.npy       normalized float32 embeddings, one row per chunk
+            norms.npy         the embeddings' norms before normalizing
+            page_numbers.npy  the page number of each chunk
+            offsets.npy       where each chunk's text starts and ends in contexts.bin
+            contexts.bin      the chunks' UTF-8 text, one after the other
+            meta.json         embedding model, dimensions and reduction (see `rag.read_index_metadata`)
+            projection.npz    the PCA projection, for indexes reduced with "pca"
+
+Versions are opened with `np.load(mmap_mode="r")`, so every process maps the same files
+and the OS page cache holds a single copy. `publish` writes a new version next to the
+others and swaps the symlink atomically; processes pick it up on their next `current_version`
+check, and those still using an old version keep their mapping until they let it go.
+"""
+import json
+import os
+import shutil
+import time
+from datetime import datetime
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+CURRENT_LINK = "current"
+# Published versions kept besides the current one, for processes still using them and for rollbacks
+KEEP_VERSIONS = int(os.getenv("RAG_INDEX_KEEP_VERSIONS", "2"))
+
+
+class MappedChunks(Sequence):
+    """
+    The chunks of a version as a read-only sequence of dicts like `rag.load_embeddings_from_csv`
+    rows (without the embedding), decoded from the mapped files when they are accessed.
+    """
+
+    def __init__(self, version_dir: str, document_name: str):
+        self.document_name = document_name
+        self.page_numbers = np.load(os.path.join(version_dir, "page_numbers.npy"), mmap_mode="r")
+        self.offsets = np.load(os.path.join(version_dir, "offsets.npy"), mmap_mode="r")
+        contexts_path = os.path.join(version_dir, "contexts.bin")
+        self.contexts = (np.memmap(contexts_path, dtype=np.uint8, mode="r") if os.path.getsize(contexts_path)
+                         else np.zeros(0, dtype=np.uint8))
+
+    def __len__(self) -> int:
+        return len(self.page_numbers)
+
+    def __getitem__(self, position):
+        if isinstance(position, slice):
+            return [self[i] for i in range(*position.indices(len(self)))]
+        start, end = int(self.offsets[position]), int(self.offsets[position + 1])
+        return {"document_name": self.document_name, "page_number": int(self.page_numbers[position]),
+                "context": self.contexts[start:end].tobytes().decode("utf-8")}
+
+
+def current_version(index_dir: str) -> str:
+    """
+    Return the directory of the version in use, resolving the `current` symlink.
+    """
+    link = os.path.join(index_dir, CURRENT_LINK)
+    if not os.path.islink(link):
+        raise FileNotFoundError(f"{index_dir} has no published index version")
+    return os.path.realpath(link)
+
+
+def read_metadata(version_dir: str) -> Dict:
+    with open(os.path.join(version_dir, "meta.json"), encoding="utf-8") as metadata_file:
+        return json.load(metadata_file)
+
+
+def open_version(version_dir: str) -> Dict:
+    """
+    Map a version's files.
+
+    Returns: a dict with the `vectors` (read-only memmap), the `embeddings` chunks (see
+             MappedChunks), the `metadata` and the PCA `projection` (or None)
+    """
+    metadata = read_metadata(version_dir)
+    projection = None
+    if os.path.exists(os.path.join(version_dir, "projection.npz")):
+        with np.load(os.path.join(version_dir, "projection.npz")) as arrays:
+            projection = (arrays["mean"], arrays["components"])
+    return {"vectors": np.load(os.path.join(version_dir, "vectors.npy"), mmap_mode="r"),
+            "embeddings": MappedChunks(version_dir, metadata.get("document_name", "")),
+            "metadata": metadata, "projection": projection}
+
+
+def publish(index_dir: str, embeddings: List[Dict], metadata: Dict,
+            projection: Tuple[np.ndarray, np.ndarray] | None = None) -> str:
+    """
+    Write a new version of an index and make it current.
+
+    Args:
+        index_dir: the index directory, created if needed
+        embeddings: rows with `document_name`, `page_number`, `embedding` and `context`, as
+                    returned by `rag.load_embeddings_from_csv`
+        metadata: how the embeddings were made, see `rag.read_index_metadata`
+        projection: the PCA (mean, components) for indexes reduced with "pca"
+
+    Returns: the new version's directory
+    """
+    os.makedirs(index_dir, exist_ok=True)
+    # Microseconds so versions published within a second don't collide; names sort by age
+    name = f"v{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}-{os.getpid()}"
+    staging_dir = os.path.join(index_dir, f".{name}.tmp")
+    os.makedirs(staging_dir)
+
+    vectors = np.array([emb["embedding"] for emb in embeddings], dtype=np.float32).reshape(len(embeddings), -1)
+    norms = np.linalg.norm(vectors, axis=1)
+    np.save(os.path.join(staging_dir, "vectors.npy"), vectors / np.where(norms == 0, 1, norms)[:, None])
+    np.save(os.path.join(staging_dir, "norms.npy"), norms)
+    np.save(os.path.join(staging_dir, "page_numbers.npy"),
+            np.array([emb["page_number"] for emb in embeddings], dtype=np.int32))
+    texts = [emb["context"].encode("utf-8") for emb in embeddings]
+    np.save(os.path.join(staging_dir, "offsets.npy"), np.cumsum([0] + [len(text) for text in texts], dtype=np.int64))
+    with open(os.path.join(staging_dir, "contexts.bin"), "wb") as contexts_file:
+        for text in texts:
+            contexts_file.write(text)
+    if projection is not None:
+        np.savez(os.path.join(staging_dir, "projection.npz"), mean=projection[0], components=projection[1])
+    with open(os.path.join(staging_dir, "meta.json"), "w", encoding="utf-8") as metadata_file:
+        json.dump({**metadata, "document_name": embeddings[0]["document_name"] if embeddings else "",
+                   "chunks": len(embeddings), "created_at": time.time()}, metadata_file, indent=2)
+
+    version_dir = os.path.join(index_dir, name)
+    os.rename(staging_dir, version_dir)
+    # A new symlink renamed over the old one: readers see either version, never neither
+    staging_link = os.path.join(index_dir, f".{CURRENT_LINK}.{os.getpid()}.tmp")
+    os.symlink(name, staging_link)
+    os.replace(staging_link, os.path.join(index_dir, CURRENT_LINK))
+    print(f"📚 Published {len(embeddings)} chunks of {vectors.shape[1]} dimensions as {version_dir}")
+    _remove_old_versions(index_dir, name)
+    return version_dir
+
+
+def _remove_old_versions(index_dir: str, current: str) -> None:
+    # Processes still mapping a removed version keep reading it: the files go once they are unmapped
+    versions = sorted(name for name in os.listdir(index_dir)
+                      if name.startswith("v") and name != current and os.path.isdir(os.path.join(index_dir, name)))
+    for name in versions[:max(0, len(versions) - KEEP_VERSIONS)]:
+        shutil.rmtree(os.path.join(index_dir, name), ignore_errors=True)
+        print(f"🧹 Removed old index version {name}")
@@ -0,0 +1,148 @@
+import json
+import os
+import re
+from typing import TYPE_CHECKING, List, Tuple
+
+from services import registry
+from services.llm_switcher import converse
+from services.prompts import classify_user_prompt
+
+# scikit-learn takes seconds to import, so it is imported when the model is first trained
+if TYPE_CHECKING:
+    from sklearn.pipeline import Pipeline
+
+INTENT_LABELS = ("review", "modify", "debug", "misc")
+INTENT_EXAMPLES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "intent_examples.jsonl")
+
+# Below this probability the local model defers to the LLM classifier
+CONFIDENCE_THRESHOLD = float(os.getenv("INTENT_CONFIDENCE_THRESHOLD", "0.55"))
+
+# Keyword/regex rules that are unambiguous enough to skip the model entirely.
+# A request matching rules for more than one label is left to the model.
+_RULES = [
+    ("debug", re.compile(r"traceback \(most recent call last\)|\b\w+(error|exception)\b\s*:|"
+                         r"\b(debug|troubleshoot|crash(es|ed|ing)?|stack ?trace|segfault|hangs?)\b", re.IGNORECASE)),
+    ("review", re.compile(r"\b(review|critique|feedback|code smells?|audit|pep ?8)\b", re.IGNORECASE)),
+    ("modify", re.compile(r"^\s*(please\s+)?(add|rename|convert|refactor|rewrite|replace|remove|change|update|"
+                          r"make|extract|implement|port|turn|optimi[sz]e)\b", re.IGNORECASE)),
+]
+RULE_CONFIDENCE = 0.95
+
+
+def load_examples(path: str = INTENT_EXAMPLES_PATH) -> List[Tuple[str, str]]:
+    """
+    Load the bundled labeled intent examples.
+
+    Args:
+        path: a JSONL file with one `{"text": ..., "label": ...}` object per line
+
+    Returns: List of (text, label) tuples
+    """
+    examples = []
+    with open(path, "r", encoding="utf-8") as file:
+        for line in file:
+            if line.strip():
+                row = json.loads(line)
+                examples.append((row["text"], row["label"]))
+    return examples
+
+
+def train_model(examples: List[Tuple[str, str]]) -> "Pipeline":
+    """
+    Fit a TF-IDF + logistic regression pipeline on labeled examples.
+
+    Args:
+        examples: List of (text, label) tuples
+
+    Returns: a fitted scikit-learn pipeline exposing `predict_proba`
+    """
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.pipeline import make_pipeline
+
+    model = make_pipeline(
+        TfidfVectorizer(ngram_range=(1, 2), sublinear_tf=True, lowercase=True),
+        LogisticRegression(C=10.0, max_iter=1000),
+    )
+    model.fit([text for text, _ in examples], [label for _, label in examples])
+    return model
+
+
+def get_model() -> "Pipeline":
+    """
+    Return the intent model, training it from the bundled examples on first use.
+    """
+    return registry.get("intent_model")
+
+
+registry.register("intent_model", lambda: train_model(load_examples()))
+
+
+def classify_by_rules(user_input: str) -> str | None:
+    """
+    Return the single label whose rules match the request, or None if no rule
+    (or more than one label) matches.
+    """
+    matched = {label for label, pattern in _RULES if pattern.search(user_input)}
+    return matched.pop() if len(matched) == 1 else None
+
+
+def classify_locally(user_input: str, model: "Pipeline | None" = None) -> Tuple[str, float, str]:
+    """
+    Classify a code request without calling the LLM.
+
+    Args:
+        user_input: the user's request text
+        model: an optional fitted pipeline (defaults to the bundled model)
+
+    Returns: (label, confidence, source) where source is "rules" or "model"
+    """
+    label = classify_by_rules(user_input)
+    if label:
+        return label, RULE_CONFIDENCE, "rules"
+
+    model = model or get_model()
+    probabilities = model.predict_proba([user_input])[0]
+    best = probabilities.argmax()
+    return str(model.classes_[best]), float(probabilities[best]), "model"
+
+
+def normalize_label(response: str) -> str:
+    """
+    Map a free-text LLM classification to one of INTENT_LABELS, defaulting to "misc".
+    """
+    response = response.strip().lower()
+    for label in INTENT_LABELS:
+        if re.search(rf"\b{label}\b", response):
+            return label
+    return "misc"
+
+
+async def classify_with_llm(user_input: str) -> str:
+    """
+    Classify a code request with a full LLM round trip using `classify_user_prompt`.
+    """
+    messages = [{"role": "user", "content": classify_user_prompt(user_input)}]
+    response = ""
+    async for chunk in converse(messages):
+        response += chunk
+    return normalize_label(response)
+
+
+async def classify_intent(user_input: str, threshold: float = CONFIDENCE_THRESHOLD) -> Tuple[str, float, str]:
+    """
+    Classify a code request locally, falling back to the LLM only when the
+    local confidence is below the threshold.
+
+    Args:
+        user_input: the user's request text
+        threshold: minimum local confidence needed to skip the LLM
+
+    Returns: (label, confidence, source) where source is "rules", "model" or "llm"
+    """
+    label, confidence, source = classify_locally(user_input)
+    if confidence >= threshold:
+        return label, confidence, source
+
+    print(f"🔀 Low intent confidence ({confidence:.2f} for '{label}'), asking the LLM")
+    return await classify_with_llm(user_input), confidence, "llm"
@@ -0,0 +1,171 @@
+"""
+Learning Topics answers and the job that precomputes them.
+
+Usage:
+    python -m services.learning topics.txt [--concurrency 4] [--max-age-hours 168] [--every-minutes 0]
+
+Every topic in the file (one per line) is generated for all LEARNER_LEVELS and
+RESPONSE_FORMATS and stored in the answer store, where the Learning Topics page
+serves it instantly. Answers are refreshed when they are older than
+`--max-age-hours` (default: LEARNING_MAX_AGE_HOURS, which the page applies too) or were
+generated with a different prompt template version. With `--every-minutes` the job keeps
+running and refreshes on that schedule.
+
+Precomputed answers are kept for good; answers to the topics users type on the page are
+stored too, up to the LEARNING_MAX_USER_ANSWERS most recent ones.
+"""
+import argparse
+import asyncio
+import hashlib
+import os
+import time
+from typing import AsyncGenerator, Dict, List
+
+from services import answer_store
+from services.llm import create_conversation_starter
+from services.llm_switcher import converse, is_error_response
+from services.prompts import learning_prompt, system_learning_prompt
+
+LEARNER_LEVELS = ["5 year old", "high school student", "college student", "adult", "retiree"]
+RESPONSE_FORMATS = ["set of bullet point notes", "article", "online course syllabus"]
+ANSWER_KIND = "learning"
+# Stored answers older than this are generated again, by the page and by the precompute job
+LEARNING_MAX_AGE_HOURS = float(os.getenv("LEARNING_MAX_AGE_HOURS", "168"))
+LEARNING_MAX_AGE_SECONDS = LEARNING_MAX_AGE_HOURS * 3600 if LEARNING_MAX_AGE_HOURS else None
+# Answers to topics typed on the page that are kept, besides the precomputed ones
+LEARNING_MAX_USER_ANSWERS = int(os.getenv("LEARNING_MAX_USER_ANSWERS", "1000"))
+
+
+def prompt_version() -> str:
+    """
+    A fingerprint of the learning prompt templates; stored answers generated with
+    other templates are treated as stale.
+    """
+    template = system_learning_prompt() + learning_prompt("{learner_level}", "{answer_type}", "{topic}")
+    return hashlib.sha256(template.encode("utf-8")).hexdigest()[:12]
+
+
+def learning_messages(learner_level: str, response_format: str, topic: str) -> List[Dict[str, str]]:
+    messages = create_conversation_starter(system_learning_prompt())
+    messages.append({"role": "user", "content": learning_prompt(learner_level, response_format, topic)})
+    return messages
+
+
+def get_cached_answer(learner_level: str, response_format: str, topic: str,
+                      max_age_seconds: float | None = LEARNING_MAX_AGE_SECONDS) -> str | None:
+    """
+    Return the stored answer for a topic if it is current (from the current prompt templates
+    and at most `max_age_seconds` old), otherwise None.
+    """
+    stored = answer_store.get_answer(ANSWER_KIND, topic, f"{learner_level}|{response_format}",
+                                     prompt_version(), max_age_seconds)
+    return stored["answer"] if stored else None
+
+
+def save_answer(learner_level: str, response_format: str, topic: str, answer: str, precomputed: bool = False) -> None:
+    """
+    Store an answer. Precomputed answers are pinned; the others are bounded by LEARNING_MAX_USER_ANSWERS.
+    """
+    answer_store.save_answer(ANSWER_KIND, topic, f"{learner_level}|{response_format}", answer, prompt_version(),
+                             pinned=precomputed, max_unpinned=LEARNING_MAX_USER_ANSWERS)
+
+
+async def stream_answer(learner_level: str, response_format: str, topic: str) -> AsyncGenerator[str, None]:
+    """
+    Stream a new answer from the LLM, and store it once it is complete, unless the topic is
+    blank or any delta was an error report.
+    """
+    answer, failed = "", False
+    async for delta in converse(learning_messages(learner_level, response_format, topic)):
+        failed = failed or is_error_response(delta)
+        answer += delta
+        yield delta
+    if topic.strip() and answer and not failed:
+        save_answer(learner_level, response_format, topic, answer)
+
+
+async def replay(answer: str, chunk_words: int = 8, delay: float = 0.01) -> AsyncGenerator[str, None]:
+    """
+    Replay a stored answer as a stream of deltas so it renders like a live response.
+    """
+    words = answer.split(" ")
+    for i in range(0, len(words), chunk_words):
+        yield " ".join(words[i:i + chunk_words]) + (" " if i + chunk_words < len(words) else "")
+        await asyncio.sleep(delay)
+
+
+async def generate_answer(learner_level: str, response_format: str, topic: str) -> str:
+    """
+    Generate an answer with the LLM and store it as precomputed.
+
+    Raises:
+        RuntimeError: if the provider reports an error
+    """
+    answer = ""
+    async for delta in converse(learning_messages(learner_level, response_format, topic)):
+        if is_error_response(delta):
+            raise RuntimeError(delta)
+        answer += delta
+    save_answer(learner_level, response_format, topic, answer, precomputed=True)
+    return answer
+
+
+async def precompute(topics: List[str], concurrency: int = 4, max_age_seconds: float | None = None) -> Dict:
+    """
+    Generate and store answers for every topic, level and format combination that
+    is missing, stale or from an older prompt version.
+
+    Returns: a dict with `generated`, `fresh`, `failed` counts and `seconds`
+    """
+    combinations = [(level, answer_format, topic) for topic in topics
+                    for level in LEARNER_LEVELS for answer_format in RESPONSE_FORMATS]
+    todo = [combination for combination in combinations if get_cached_answer(*combination, max_age_seconds) is None]
+    print(f"🎓 {len(todo)} of {len(combinations)} answers to generate")
+
+    semaphore = asyncio.Semaphore(concurrency)
+    progress = {"generated": 0, "failed": 0}
+    start_time = time.perf_counter()
+
+    async def generate(learner_level, response_format, topic):
+        async with semaphore:
+            try:
+                await generate_answer(learner_level, response_format, topic)
+                progress["generated"] += 1
+            except Exception as e:
+                progress["failed"] += 1
+                print(f"❌ {topic} / {learner_level} / {response_format}: {e}")
+                return
+        done = progress["generated"] + progress["failed"]
+        elapsed = time.perf_counter() - start_time
+        print(f"🎓 [{done}/{len(todo)}] {topic} / {learner_level} / {response_format} "
+              f"(ETA {elapsed / done * (len(todo) - done):.0f}s)")
+
+    await asyncio.gather(*[generate(*combination) for combination in todo])
+    return {"generated": progress["generated"], "fresh": len(combinations) - len(todo),
+            "failed": progress["failed"], "seconds": time.perf_counter() - start_time}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompute Learning Topics answers.")
+    parser.add_argument("topics", help="a text file with one topic per line")
+    parser.add_argument("--concurrency", type=int, default=4, help="number of concurrent generations")
+    parser.add_argument("--max-age-hours", type=float, default=LEARNING_MAX_AGE_HOURS,
+                        help="regenerate answers older than this (0: never)")
+    parser.add_argument("--every-minutes", type=float, default=0, help="keep refreshing on this schedule")
+    args = parser.parse_args()
+
+    with open(args.topics, "r", encoding="utf-8") as file:
+        topics = [line.strip() for line in file if line.strip() and not line.startswith("#")]
+    max_age_seconds = args.max_age_hours * 3600 if args.max_age_hours else None
+
+    while True:
+        result = asyncio.run(precompute(topics, args.concurrency, max_age_seconds))
+        print(f"Generated {result['generated']} answers ({result['fresh']} fresh, {result['failed']} failed) "
+              f"in {result['seconds']:.1f}s")
+        if not args.every_minutes:
+            break
+        time.sleep(args.every_minutes * 60)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,13 @@
+import asyncio
 import os
+import threading
 import traceback
-from typing import List, Dict, AsyncGenerator, Tuple
-
-import openai
-from openai import AsyncOpenAI
+import weakref
+from typing import TYPE_CHECKING, List, Dict, AsyncGenerator, Tuple
 
 from dotenv import load_dotenv
-from openai import OpenAIError, OpenAI
+
+from services import registry
 
 # Load .env file
 load_dotenv()
@@ -14,12 +15,89 @@ load_dotenv()
 
 openai_model = os.getenv('OPENAI_API_MODEL')
 
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI, OpenAI
+
+
+def _create_client() -> "OpenAI":
+    # openai is imported on first use: it is slow to import and pages don't need it to render
+    from openai import OpenAI
+
+    return OpenAI(
+        api_key=os.getenv('OPENAI_API_KEY'),
+        base_url=os.getenv('OPENAI_API_BASE_URL'))
+
+
+# One synchronous client for the process: it is thread-safe and keeps a pool of connections
+registry.register("openai_client", _create_client, close=lambda client: client.close())
+
+
+def get_client() -> "OpenAI":
+    """
+    Return the shared synchronous OpenAI client, creating it on first use.
+    """
+    return registry.get("openai_client")
+
+
+class _AsyncClients:
+    """
+    One AsyncOpenAI client per event loop. A client's pooled connections belong to the loop
+    that opened them, so the API server's loop keeps a single client for its lifetime, while
+    each Streamlit rerun (a new loop) shares one between its calls.
+    """
+
+    def __init__(self):
+        self._clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncOpenAI]" = \
+            weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    def for_running_loop(self) -> "AsyncOpenAI":
+        from openai import AsyncOpenAI
+
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            client = self._clients.get(loop)
+            if client is None:
+                client = AsyncOpenAI(api_key=os.getenv('OPENAI_API_KEY'),
+                                     base_url=os.getenv('OPENAI_API_BASE_URL'))
+                self._clients[loop] = client
+        return client
+
+    def aclose(self) -> None:
+        """
+        Close every client on its own loop: right away when the loop is idle, scheduled on it when
+        it is running, and on a new loop once the old one is closed.
+        """
+        with self._lock:
+            clients = list(self._clients.items())
+            self._clients.clear()
+        for loop, client in clients:
+            try:
+                if loop.is_running():
+                    asyncio.run_coroutine_threadsafe(client.close(), loop)
+                elif loop.is_closed():
+                    asyncio.run(client.close())
+                else:
+                    loop.run_until_complete(client.close())
+            except Exception as e:
+                print(f"⚠️ Closing an async OpenAI client failed: {e}")
+
+
+registry.register("openai_async_clients", _AsyncClients, close=lambda clients: clients.aclose())
+
+
+def get_async_client() -> "AsyncOpenAI":
+    """
+    Return the shared AsyncOpenAI client for the running event loop, creating it on first use.
+    Call it from a coroutine.
+    """
+    return registry.get("openai_async_clients").for_running_loop()
+
+
 def converse_sync(prompt: str, messages: List[Dict[str, str]],
     max_tokens: int = 1600,
     model=None) -> Tuple[str, List[Dict[str, str]]]:
-    client = OpenAI(
-        api_key=os.getenv('OPENAI_API_KEY'),
-        base_url=os.getenv('OPENAI_API_BASE_URL'))
+    client = get_client()
 
     # Add the user's message to the list of messages
     if messages is None:
@@ -48,9 +126,10 @@ async def converse(messages: List[Dict[str, str]]) -> AsyncGenerator[str, None]:
 
     :return: a generator of delta string responses
     """
-    aclient = AsyncOpenAI(api_key=os.getenv('OPENAI_API_KEY'),
-                          base_url=os.getenv('OPENAI_API_BASE_URL'))
+    from openai import OpenAIError
+
     try:
+        aclient = get_async_client()
         for message in messages:
             if message["role"] not in {"system", "assistant", "user", "function", "tool", "developer", "evidence"}:
                 raise ValueError(f"Invalid role: {message['role']}")
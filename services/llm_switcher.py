@@ -16,4 +16,16 @@ if USE_GEMINI:
         from services.llm import converse_sync, converse, create_conversation_starter
 else:
     from services.llm import converse_sync, converse, create_conversation_starter
-    print("�� Using OpenAI API") 
\ No newline at end of file
+    print("�� Using OpenAI API")
+
+
+# Prefixes the providers' converse generators use to report a failure in-band
+ERROR_PREFIXES = ("EXCEPTION", "oaiEXCEPTION", "GEMINI_EXCEPTION", "GEMINI_REST_EXCEPTION", "GEMINI_REST_ERROR",
+                  "⏰ RATE LIMIT")
+
+
+def is_error_response(chunk: str) -> bool:
+    """
+    Return True if a chunk yielded by `converse` is an in-band error report rather than content.
+    """
+    return chunk.startswith(ERROR_PREFIXES)
@@ -0,0 +1,165 @@
+import re
+from difflib import SequenceMatcher
+from typing import Dict, List
+
+_HUNK_HEADER = re.compile(r"^@@\s*-?(\d+)?(?:,(\d+))?\s*\+?(\d+)?(?:,(\d+))?\s*@@")
+
+# How many context lines may be dropped from each end of a hunk before giving up
+MAX_FUZZ = 2
+
+
+class PatchError(ValueError):
+    """Raised when a diff cannot be parsed or applied to the original text."""
+
+
+def parse_unified_diff(diff: str) -> List[Dict]:
+    """
+    Parse a unified diff into hunks, tolerating the usual LLM mistakes: missing
+    file headers, `@@ @@` headers without line numbers, wrong line counts and
+    context lines that lost their leading space.
+
+    Args:
+        diff: the unified diff text
+
+    Returns: List of dicts with keys:
+        - old_start: int | None  # 1-based line the hunk claims to start at
+        - old_count: int | None  # number of original lines the header claims the hunk spans
+        - before: List[str]      # context and removed lines, in order
+        - after: List[str]       # context and added lines, in order
+    """
+    hunks, current = [], None
+    for line in diff.splitlines():
+        if current is None and line.startswith(("--- ", "+++ ", "diff ", "index ")):
+            continue
+        header = _HUNK_HEADER.match(line)
+        if header:
+            current = {"old_start": int(header.group(1)) if header.group(1) else None,
+                       "old_count": int(header.group(2)) if header.group(2) else None, "before": [], "after": []}
+            hunks.append(current)
+            continue
+        if current is None:
+            if line.startswith(("-", "+", " ")):
+                current = {"old_start": None, "old_count": None, "before": [], "after": []}
+                hunks.append(current)
+            else:
+                continue
+        if line.startswith("\\"):
+            continue  # "\ No newline at end of file"
+        if line.startswith("-"):
+            current["before"].append(line[1:])
+        elif line.startswith("+"):
+            current["after"].append(line[1:])
+        else:
+            text = line[1:] if line.startswith(" ") else line
+            current["before"].append(text)
+            current["after"].append(text)
+
+    hunks = [hunk for hunk in hunks if hunk["before"] != hunk["after"]]
+    if not hunks:
+        raise PatchError("No hunks found in diff")
+    return hunks
+
+
+def _matches(lines: List[str], position: int, before: List[str], loose: bool) -> bool:
+    if position < 0 or position + len(before) > len(lines):
+        return False
+    if loose:
+        return all(a.strip() == b.strip() for a, b in zip(lines[position:position + len(before)], before))
+    return lines[position:position + len(before)] == before
+
+
+def _find_hunk(lines: List[str], before: List[str], expected: int, start: int) -> int | None:
+    """
+    Find where `before` occurs at or after `start`, preferring the occurrence
+    closest to the expected position and exact over whitespace-insensitive matches.
+    """
+    for loose in (False, True):
+        candidates = [position for position in range(start, len(lines) - len(before) + 1)
+                      if _matches(lines, position, before, loose)]
+        if candidates:
+            return min(candidates, key=lambda position: abs(position - expected))
+    return None
+
+
+def apply_patch(original: str, diff: str, max_fuzz: int = MAX_FUZZ) -> str:
+    """
+    Apply a unified diff to the original text with fuzzy hunk matching.
+
+    Each hunk is located by content rather than trusting its line numbers: exact
+    matches near the expected position win, then whitespace-insensitive matches,
+    then matches with up to `max_fuzz` context lines dropped from either end.
+
+    Args:
+        original: the text to patch
+        diff: a unified diff against the original
+        max_fuzz: maximum context lines to drop from each end of a hunk
+
+    Returns: the patched text
+
+    Raises:
+        PatchError: if the diff has no hunks or a hunk cannot be located
+    """
+    lines = original.splitlines()
+    trailing_newline = original.endswith("\n")
+    offset, search_from = 0, 0
+
+    for number, hunk in enumerate(parse_unified_diff(diff), start=1):
+        before, after = hunk["before"], hunk["after"]
+        expected = (hunk["old_start"] - 1 + offset) if hunk["old_start"] else search_from
+
+        if not before:
+            if hunk["old_start"] is not None and hunk["old_count"] == 0:
+                # An empty old range ("-3,0") means after line 3, not before it
+                expected = hunk["old_start"] + offset
+            position = min(max(expected, 0), len(lines))
+            lines[position:position] = after
+            offset += len(after)
+            search_from = position + len(after)
+            continue
+
+        position = None
+        for fuzz in range(max_fuzz + 1):
+            head, tail = _context_trim(before, after, fuzz)
+            trimmed_before = before[head:len(before) - tail]
+            trimmed_after = after[head:len(after) - tail]
+            if not trimmed_before:
+                break
+            position = _find_hunk(lines, trimmed_before, expected + head, search_from)
+            if position is not None:
+                break
+        if position is None:
+            raise PatchError(f"Hunk {number} does not apply")
+
+        lines[position:position + len(trimmed_before)] = _keep_context(lines[position:position + len(trimmed_before)],
+                                                                      trimmed_before, trimmed_after)
+        offset += len(trimmed_after) - len(trimmed_before)
+        search_from = position + len(trimmed_after)
+
+    return "\n".join(lines) + ("\n" if trailing_newline else "")
+
+
+def _keep_context(matched: List[str], before: List[str], after: List[str]) -> List[str]:
+    """
+    Return the hunk's new lines with its context lines taken from the original text, so a
+    whitespace-insensitive match doesn't reindent the lines around the change.
+    """
+    replacement = list(after)
+    for tag, i1, i2, j1, j2 in SequenceMatcher(None, before, after, autojunk=False).get_opcodes():
+        if tag == "equal":
+            replacement[j1:j2] = matched[i1:i2]
+    return replacement
+
+
+def _context_trim(before: List[str], after: List[str], fuzz: int):
+    """
+    Return how many lines can be dropped from the head and tail of a hunk: at most
+    `fuzz` on each end, and only lines that are shared context in both sides.
+    """
+    head = 0
+    while head < fuzz and head < min(len(before), len(after)) and before[head] == after[head]:
+        head += 1
+    tail = 0
+    while (tail < fuzz and tail < min(len(before), len(after)) - head
+           and before[len(before) - 1 - tail] == after[len(after) - 1 - tail]):
+        tail += 1
+    return head, tail
@@ -55,6 +55,8 @@ Ensure that embedded formulae are quoted for good display.
 # Requirements prompts
 ############################################################################################################
 
+REQUIREMENT_TYPES = ["Business Problem Statement", "Vision Statement", "Ecosystem map", "RACI Matrix"]
+
 def system_requirements_prompt(product_name, product_description):
     """
     Generate a system requirements prompt based on the product name and description
@@ -88,7 +90,7 @@ def requirements_prompt(product_name, requirement_type):
         A prompt to use to generate a requirements document
         for the requirement type and product name.
     """
-    if requirement_type not in ["Business Problem Statement", "Vision Statement", "Ecosystem map", "RACI Matrix"]:
+    if requirement_type not in REQUIREMENT_TYPES:
         raise ValueError(f"Invalid requirement type.")
     if requirement_type == "Business Problem Statement":
         return business_problem_prompt(product_name)
@@ -212,6 +214,33 @@ def review_prompt(existing_code: str) -> str:
     """
     return review
 
+def chunk_review_prompt(numbered_code: str, context: str, language: str) -> str:
+    # A review prompt for one chunk of a larger file. Lines are prefixed with their
+    # line number in the original file so findings can be mapped back.
+    return f"""
+    You are reviewing one part of a larger {language} file.
+    Other parts of the file are reviewed separately, so only comment on the code below.
+
+    Context from elsewhere in the file (imports and signatures, do not review):
+    ```
+    {context or "(none)"}
+    ```
+
+    Code to review, each line prefixed with its line number:
+    ```
+    {numbered_code}
+    ```
+
+    1. Ensure proper naming conventions are followed.
+    2. Check for any unused imports or variables.
+    3. Verify that the code is properly documented.
+    4. Check for bugs and edge cases.
+    5. Check for any potential performance improvements.
+
+    Report each finding on its own line as `L<line number>: <finding>`,
+    using the line numbers shown above. If there are no findings, answer `No findings`.
+    """
+
 def modify_code_prompt(user_prompt: str, existing_code: str) -> str:
     # Implementing a code modification prompt that includes the existing code snippet
     # and the user's requested modification
@@ -223,6 +252,23 @@ def modify_code_prompt(user_prompt: str, existing_code: str) -> str:
     """
     return modified_code
 
+def modify_code_diff_prompt(user_prompt: str, existing_code: str) -> str:
+    # A code modification prompt that asks for a unified diff instead of the whole
+    # file, so the response only contains the lines that change
+    return f"""
+    Original Code:
+    ```
+    {existing_code}
+    ```
+
+    # User requested modification: {user_prompt}
+
+    Do not repeat the whole file. Respond with a unified diff against the original code
+    inside a single ```diff code block, using `@@ -start,count +start,count @@` hunk headers
+    and three lines of unchanged context around each change.
+    After the diff, briefly explain the change.
+    """
+
 def debug_prompt(debug_error_string: str, existing_code: str) -> str:
     # Implementing a debug prompt that includes the existing code snippet
     # and suggestions for debugging based on the provided error string
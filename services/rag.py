@@ -1,20 +1,235 @@
 import csv
+import json
 import os
-from typing import List, Tuple
-import tiktoken as tkn
-from PyPDF2 import PdfReader
-from openai import OpenAI
-from sklearn.neighbors import NearestNeighbors
-from sklearn.preprocessing import normalize
+from typing import TYPE_CHECKING, Dict, List, Tuple
 import numpy as np
 import services.llm
-from pdf2image import convert_from_path
-from PIL import Image
+from services import index_store, registry
 import io
 
+# scikit-learn, tiktoken, PyPDF2, pdf2image and openai are imported where they are used:
+# they take seconds to import and most page loads never ask the book
+if TYPE_CHECKING:
+    from openai import OpenAI
+
 # Global configuration
 EMBEDDING_MODEL = "text-embedding-3-small"  # OpenAI's best embeddings as of Feb 2024
-CSV_FILE_PATH = "data/ThePragmaticProgrammer.embeddings.csv"
+CSV_FILE_PATH = os.getenv("RAG_INDEX_PATH", "data/ThePragmaticProgrammer.embeddings.csv")
+PDF_FILE_PATH = "data/ThePragmaticProgrammer.pdf"
+# Bounds of the query embedding and rendered page caches shared by all sessions
+QUERY_CACHE_SIZE = int(os.getenv("RAG_QUERY_CACHE_SIZE", "512"))
+PAGE_IMAGE_CACHE_SIZE = int(os.getenv("RAG_PAGE_IMAGE_CACHE_SIZE", "32"))
+# Dimensions of the embeddings of a newly built index (default: the model's full size), and
+# how to reduce them: "api" asks the API for shorter embeddings, "pca" fits a projection
+EMBEDDING_DIMENSIONS = int(os.getenv("RAG_EMBEDDING_DIMENSIONS", "0")) or None
+EMBEDDING_REDUCTION = os.getenv("RAG_EMBEDDING_REDUCTION", "api")
+REDUCTIONS = ("api", "pca")
+# Indexes written before their metadata was recorded have full size EMBEDDING_MODEL embeddings
+FULL_SIZE_METADATA = {"embedding_model": EMBEDDING_MODEL, "dimensions": None, "reduction": None}
+
+
+def metadata_path(path: str) -> str:
+    return path + ".meta.json"
+
+
+def projection_path(path: str) -> str:
+    return path + ".pca.npz"
+
+
+def read_index_metadata(path: str) -> Dict:
+    """
+    Return how an index's embeddings were made: the `embedding_model`, their `dimensions`
+    (None for the model's full size) and their `reduction` ("api", "pca" or None).
+
+    Args:
+        path: an embeddings CSV, or an index directory (see `publish_index`)
+    """
+    if os.path.isdir(path):
+        return index_store.read_metadata(index_store.current_version(path))
+    if os.path.exists(metadata_path(path)):
+        with open(metadata_path(path), encoding="utf-8") as metadata_file:
+            return json.load(metadata_file)
+    return dict(FULL_SIZE_METADATA)
+
+
+def write_index_metadata(path: str, dimensions: int | None, reduction: str | None,
+                         projection: Tuple[np.ndarray, np.ndarray] | None = None) -> None:
+    """
+    Record how an index's embeddings were made, next to it, with the PCA projection (mean
+    and components) that queries need to be reduced the same way.
+    """
+    if projection is not None:
+        np.savez(projection_path(path), mean=projection[0], components=projection[1])
+    with open(metadata_path(path), "w", encoding="utf-8") as metadata_file:
+        json.dump({"embedding_model": EMBEDDING_MODEL, "dimensions": dimensions, "reduction": reduction},
+                  metadata_file, indent=2)
+
+
+def fit_projection(vectors: np.ndarray, dimensions: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Fit a PCA projection of full size embeddings to `dimensions` dimensions.
+
+    Returns: the (mean, components) to pass to `project`
+    """
+    from sklearn.decomposition import PCA
+
+    if dimensions > min(vectors.shape):
+        raise ValueError(f"PCA needs at least {dimensions} embeddings of at least {dimensions} dimensions, "
+                         f"got {vectors.shape[0]} of {vectors.shape[1]}")
+    pca = PCA(n_components=dimensions, random_state=0).fit(vectors)
+    return pca.mean_, pca.components_
+
+
+def project(vectors: np.ndarray, projection: Tuple[np.ndarray, np.ndarray]) -> np.ndarray:
+    mean, components = projection
+    return (np.asarray(vectors) - mean) @ components.T
+
+
+def truncate(vectors: np.ndarray, dimensions: int) -> np.ndarray:
+    """
+    Shorten text-embedding-3 embeddings the way the API's `dimensions` parameter does: keep
+    the first `dimensions` values and normalize again.
+    """
+    vectors = np.asarray(vectors)[:, :dimensions]
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+def reduce_index(source_path: str, target_path: str, dimensions: int, reduction: str = "api") -> None:
+    """
+    Write a copy of a full size index with its embeddings reduced to `dimensions`, without
+    calling the API: "api" truncates them as the API would, "pca" fits a projection on them.
+
+    Args:
+        source_path: an embeddings CSV of full size embeddings
+        target_path: where to write the reduced embeddings CSV and its metadata
+        dimensions: the reduced size
+        reduction: "api" or "pca"
+    """
+    if reduction not in REDUCTIONS:
+        raise ValueError(f"Unknown reduction {reduction!r}, choose from {REDUCTIONS}")
+    if read_index_metadata(source_path)["reduction"] is not None:
+        raise ValueError(f"{source_path} is already reduced; reduce a full size index")
+    embeddings = load_embeddings_from_csv(source_path)
+    vectors = np.array([emb["embedding"] for emb in embeddings])
+    projection = None
+    if reduction == "api":
+        reduced = truncate(vectors, dimensions)
+    else:
+        projection = fit_projection(vectors, dimensions)
+        reduced = project(vectors, projection)
+    # The metadata goes first: load_index rebuilds when the CSV changes
+    write_index_metadata(target_path, dimensions, reduction, projection)
+    save_embeddings_to_csv(target_path, embeddings[0]["document_name"] if embeddings else "",
+                           [emb["page_number"] for emb in embeddings], reduced.tolist(),
+                           [emb["context"] for emb in embeddings])
+    print(f"📚 Reduced {len(embeddings)} embeddings from {vectors.shape[1]} to {dimensions} dimensions "
+          f"({reduction}) into {target_path}")
+
+
+def publish_index(source_path: str, index_dir: str) -> str:
+    """
+    Publish an embeddings CSV (with its metadata and projection) as a new version of a
+    memory-mapped index directory, see `services.index_store`. Set RAG_INDEX_PATH to the
+    directory to have every worker process share one copy of the index.
+
+    Returns: the new version's directory
+    """
+    metadata = read_index_metadata(source_path)
+    projection = None
+    if metadata["reduction"] == "pca":
+        with np.load(projection_path(source_path)) as arrays:
+            projection = (arrays["mean"], arrays["components"])
+    return index_store.publish(index_dir, load_embeddings_from_csv(source_path), metadata, projection)
+
+
+def _index_version(path: str):
+    # Index directories change when their current version does, CSV files when they are written
+    return index_store.current_version(path) if os.path.isdir(path) else os.path.getmtime(path)
+
+
+def _build_index(path: str) -> Dict:
+    version = _index_version(path)
+    if os.path.isdir(path):
+        index = index_store.open_version(version)
+        print(f"📚 Mapped {len(index['embeddings'])} book chunks of {index['vectors'].shape[1]} dimensions "
+              f"from {version}")
+        return {"path": path, "version": version, **index}
+    from sklearn.preprocessing import normalize
+
+    metadata = read_index_metadata(path)
+    projection = None
+    if metadata["reduction"] == "pca":
+        with np.load(projection_path(path)) as arrays:
+            projection = (arrays["mean"], arrays["components"])
+    embeddings = load_embeddings_from_csv(path)
+    normalized_embeddings = normalize(np.array([emb["embedding"] for emb in embeddings]))
+    print(f"📚 Indexed {len(embeddings)} book chunks of {normalized_embeddings.shape[1]} dimensions from {path}")
+    return {"path": path, "version": version, "embeddings": embeddings, "vectors": normalized_embeddings,
+            "metadata": metadata, "projection": projection}
+
+
+def _index_size(index: Dict) -> int:
+    # A mapped index lives in the page cache, shared with the other processes
+    if isinstance(index["vectors"], np.memmap):
+        return 0
+    # The normalized vectors plus the chunk texts
+    return index["vectors"].nbytes + sum(len(emb["context"]) for emb in index["embeddings"])
+
+
+def load_index(path: str = CSV_FILE_PATH) -> Dict:
+    """
+    Load an index once per process (and again if it changes): an embeddings CSV is read into
+    memory, while an index directory's current version is memory-mapped (see `publish_index`).
+
+    Args:
+        path: the embeddings CSV written by `save_embeddings_to_csv`, or an index directory
+
+    Returns: a dict with the `embeddings` rows (see `load_embeddings_from_csv`), their
+             normalized `vectors` (see `search_many`), and the index `metadata` and PCA
+             `projection` queries are embedded with (see `embed_queries`)
+    """
+    name = f"book_index:{path}"
+    if not registry.is_registered(name):
+        registry.register(name, lambda: _build_index(path), size=_index_size)
+    index = registry.get(name)
+    if index["version"] != _index_version(path):
+        registry.invalidate(name)
+        index = registry.get(name)
+    return index
+
+
+def _create_tokenizer():
+    import tiktoken as tkn
+
+    return tkn.encoding_for_model("gpt-3.5-turbo")
+
+
+registry.register("tokenizer", _create_tokenizer)
+registry.register("query_embeddings", lambda: registry.LruCache(QUERY_CACHE_SIZE),
+                  size=lambda cache: sum(np.asarray(vectors).nbytes for vectors in cache.values()))
+registry.register("book_page_images", lambda: registry.LruCache(PAGE_IMAGE_CACHE_SIZE),
+                  size=lambda cache: sum(len(image) for image in cache.values()))
+
+
+def preload_tokenizer() -> None:
+    """
+    Load the tokenizer used to chunk the book (tiktoken downloads and caches it on first use).
+    """
+    registry.get("tokenizer")
+
+
+def page_image(page_number: int) -> bytes:
+    """
+    Return a page of the book as PNG bytes; recently used pages are kept in memory.
+    """
+    cache = registry.get("book_page_images")
+    image = cache.get(page_number)
+    if image is None:
+        image = __extract_page_as_image(PDF_FILE_PATH, page_number)
+        cache.put(page_number, image)
+    return image
+
 
 async def ask_book(query: str, return_image: bool = False):
     """
@@ -29,73 +244,42 @@ async def ask_book(query: str, return_image: bool = False):
         "image_data": bytes      # Optional PNG of page if return_image=True
     }
     """
-    # Keep the OpenAI client configuration
-    client = OpenAI(
-        base_url=os.getenv("OPENAI_API_BASE_URL"),
-        api_key=os.getenv("OPENAI_API_KEY"),
-    )
+    # Keep the OpenAI client configuration (shared, so its connections are reused)
+    client = services.llm.get_client()
 
     # Source PDF path
-    pdf_path = "data/ThePragmaticProgrammer.pdf"
+    pdf_path = PDF_FILE_PATH
 
     # Implement embedding management
     # 1. Check if embeddings exist in CSV_FILE_PATH
-    if os.path.exists(CSV_FILE_PATH):
-        embeddings = load_embeddings_from_csv(CSV_FILE_PATH)
-        documents = [emb["context"] for emb in embeddings]
-
     # 2. If not:
     #    - Extract text from PDF using __extract_text_from_pdf()
     #    - Chunk the text (see chunking strategy note below)
     #    - Calculate embeddings using OpenAI API
     #    - Save to CSV for future use
-    else:
-        pages_text = __extract_text_from_pdf(pdf_path)
-        chunks = await __chunk_prompt(pages_text)
-        documents = [chunk[1] for chunk in chunks]
-        embeddings = await __calculate_embeddings(client, documents)
-        save_embeddings_to_csv(CSV_FILE_PATH, "ThePragmaticProgrammer", [chunk[0] for chunk in chunks], embeddings, documents)
+    await ensure_embeddings(client, pdf_path)
     # 3. Load embeddings from CSV
-    print("Loaded embeddings from CSV")
-    print(embeddings)
 
     # Implement semantic search 
-    # 1. Set up nearest neighbors search with sklearn
-    embedding_vectors = np.array([emb["embedding"] for emb in embeddings])
-    normalized_embeddings = normalize(embedding_vectors)
-    nearest_neighbors = NearestNeighbors(algorithm='ball_tree').fit(normalized_embeddings)
-    # nearest_neighbors.fit(normalized_embeddings)
-    # Print the distance and index of the k nearest neighbor
-
-    # 2. Get embedding for user's query (with caching)
-    # Simple cache to avoid repeated embedding calls for the same query
-    query_cache_key = f"query_embedding_{hash(query)}"
-    if hasattr(ask_book, 'query_cache') and query_cache_key in ask_book.query_cache:
-        query_embedding = ask_book.query_cache[query_cache_key]
-        print("📦 Using cached query embedding")
-    else:
-        query_embedding = await __calculate_embeddings(client, [query])
-        if not hasattr(ask_book, 'query_cache'):
-            ask_book.query_cache = {}
-        ask_book.query_cache[query_cache_key] = query_embedding
-        print("📦 Cached new query embedding")
-    
-    normalized_query_embedding = normalize(query_embedding)
+    # 1. Load the index (once, see load_index; a published index directory is memory-mapped)
+    index = load_index(CSV_FILE_PATH)
+    embeddings = index["embeddings"]
+    print(f"Loaded {len(embeddings)} embeddings")
+
+    # 2. Get embedding for user's query, in the same space as the index (with caching, see embed_queries)
+    query_embedding = await embed_queries(client, [query], index=index)
 
     # 3. Find most relevant context using cosine similarity
-    dist, ind = nearest_neighbors.kneighbors(normalized_query_embedding, n_neighbors=1)
-    print("Distance: ", dist)
+    best, similarity = search_many(index, query_embedding)
+    print("Similarity: ", similarity)
 
-    most_relevant_index = ind[0][0]
+    most_relevant_index = best[0]
     most_relevant_context = embeddings[most_relevant_index]["context"]
     most_relevant_page = embeddings[most_relevant_index]["page_number"]
 
     # Implement answer generation 
     # 1. Format prompt with context and query
-    prompt = f"""Answer the following question using the provided context:
-    Question: {query}
-    Context: {most_relevant_context}
-    """
+    prompt = answer_prompt(query, most_relevant_context)
     # 2. Get response from LLM (use services.llm module for this)
     response, _ = services.llm.converse_sync(prompt, [], model=os.getenv("OPENAI_API_MODEL"))
 
@@ -109,16 +293,109 @@ async def ask_book(query: str, return_image: bool = False):
     # Optional - Handle page image extraction 
     # 1. Convert PDF page to image
     if return_image:
-        result["image_data"] = __extract_page_as_image(pdf_path, most_relevant_page)
+        result["image_data"] = page_image(most_relevant_page)
     
     # 2. Return as PNG bytes
     return result
 
+async def ensure_embeddings(client: "OpenAI", pdf_path: str = PDF_FILE_PATH) -> None:
+    """
+    Chunk the book and calculate its embeddings into CSV_FILE_PATH, unless that file exists.
+    The embeddings are reduced to EMBEDDING_DIMENSIONS when that is set, as configured by
+    EMBEDDING_REDUCTION.
+
+    Raises:
+        ValueError: if EMBEDDING_REDUCTION isn't one of REDUCTIONS, before anything is calculated
+    """
+    if not os.path.exists(CSV_FILE_PATH):
+        if EMBEDDING_DIMENSIONS and EMBEDDING_REDUCTION not in REDUCTIONS:
+            raise ValueError(f"Unknown reduction {EMBEDDING_REDUCTION!r}, choose from {REDUCTIONS}")
+        pages_text = __extract_text_from_pdf(pdf_path)
+        chunks = await __chunk_prompt(pages_text)
+        documents = [chunk[1] for chunk in chunks]
+        reduction, projection = (EMBEDDING_REDUCTION if EMBEDDING_DIMENSIONS else None), None
+        if reduction == "api":
+            embeddings = await __calculate_embeddings(client, documents, dimensions=EMBEDDING_DIMENSIONS)
+        else:
+            embeddings = await __calculate_embeddings(client, documents)
+        if reduction == "pca":
+            projection = fit_projection(np.array(embeddings), EMBEDDING_DIMENSIONS)
+            embeddings = project(embeddings, projection).tolist()
+        write_index_metadata(CSV_FILE_PATH, EMBEDDING_DIMENSIONS, reduction, projection)
+        save_embeddings_to_csv(CSV_FILE_PATH, "ThePragmaticProgrammer", [chunk[0] for chunk in chunks], embeddings, documents)
+
+
+def answer_prompt(query: str, context: str) -> str:
+    return f"""Answer the following question using the provided context:
+    Question: {query}
+    Context: {context}
+    """
+
+
+async def embed_queries(client: "OpenAI", queries: List[str], batch_size: int = 100,
+                        index: Dict | None = None) -> np.ndarray:
+    """
+    Embed many queries, with `batch_size` queries per API request. Queries in the shared
+    query embedding cache are not sent again.
+
+    Args:
+        client: OpenAI client instance
+        queries: the queries to embed
+        batch_size: queries per API request
+        index: the index to search (see `load_index`): the queries are embedded with its
+               model and reduced like its embeddings (default: full size EMBEDDING_MODEL embeddings)
+
+    Returns: a (len(queries), dimensions) array of embeddings, in the order of `queries`
+    """
+    metadata = index["metadata"] if index is not None else FULL_SIZE_METADATA
+    if not queries:
+        return np.zeros((0, index["vectors"].shape[1] if index is not None else 0))
+    model = metadata["embedding_model"]
+    dimensions = metadata["dimensions"] if metadata["reduction"] == "api" else None
+    query_cache = registry.get("query_embeddings")
+    vectors = [query_cache.get((model, dimensions, query)) for query in queries]
+    missing = sorted({query for query, vector in zip(queries, vectors) if vector is None})
+    if missing:
+        embeddings = await __calculate_embeddings(client, missing, batch_size=batch_size, model=model,
+                                                  dimensions=dimensions)
+        embeddings = dict(zip(missing, embeddings))
+        for query, embedding in embeddings.items():
+            query_cache.put((model, dimensions, query), [embedding])
+        vectors = [vector if vector is not None else [embeddings[query]] for query, vector in zip(queries, vectors)]
+    print(f"📦 Embedded {len(queries)} queries, {len(queries) - len(missing)} from the cache")
+    query_embeddings = np.array([vector[0] for vector in vectors], dtype=float)
+    if metadata["reduction"] == "pca":
+        query_embeddings = project(query_embeddings, index["projection"])
+    return query_embeddings
+
+
+def search_many(index: Dict, query_embeddings: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Find the most relevant chunk for every query at once, with one matrix product of the
+    normalized queries and the index's normalized vectors (cosine similarity).
+
+    Args:
+        index: the book index from `load_index`
+        query_embeddings: one embedding per row, e.g. from `embed_queries`
+
+    Returns: (the index of the best chunk in `index["embeddings"]`, its cosine similarity) per query
+    """
+    vectors = index["vectors"]
+    norms = np.linalg.norm(query_embeddings, axis=1, keepdims=True)
+    # In the index's dtype, so a mapped float32 index isn't copied to float64 for the product
+    queries = (query_embeddings / np.where(norms == 0, 1, norms)).astype(vectors.dtype)
+    similarities = queries @ vectors.T
+    best = similarities.argmax(axis=1)
+    return best, similarities[np.arange(len(best)), best]
+
+
 def __extract_text_from_pdf(pdf_path: str) -> List[Tuple[int, str]]:
     """
     Extract text content from each page of the PDF.
     Returns: List of (page_number, page_text) tuples
     """
+    from PyPDF2 import PdfReader
+
     text_from_pdf = []
     with open(pdf_path, "rb") as file:
         reader = PdfReader(file)
@@ -132,6 +409,8 @@ def __extract_page_as_image(pdf_path: str, page_number: int) -> bytes:
     Convert a specific PDF page to a PNG image.
     Returns: Raw PNG image data as bytes
     """
+    from pdf2image import convert_from_path
+
     page_as_image = convert_from_path(pdf_path, first_page=page_number + 1, last_page=page_number + 1)[0]
     image_bytes = io.BytesIO()
     page_as_image.save(image_bytes, format='PNG')
@@ -154,7 +433,7 @@ async def __chunk_prompt(pages_text: List[Tuple[int, str]], chunk_size: int = 15
     
     Returns: List of (page_number, chunk_text) tuples
     """
-    encoding = tkn.encoding_for_model("gpt-3.5-turbo")
+    encoding = registry.get("tokenizer")
     chunks = []
     for page_number, text in pages_text:
         tokens = encoding.encode(text)
@@ -163,7 +442,8 @@ async def __chunk_prompt(pages_text: List[Tuple[int, str]], chunk_size: int = 15
             chunks.append((page_number, encoding.decode(chunk)))
     return chunks
 
-async def __calculate_embeddings(client: OpenAI, documents: List[str], batch_size: int = 20) -> List[List[float]]:
+async def __calculate_embeddings(client: "OpenAI", documents: List[str], batch_size: int = 20,
+                                 model: str = EMBEDDING_MODEL, dimensions: int | None = None) -> List[List[float]]:
     """
     Get embeddings for text chunks using OpenAI's API.
     
@@ -173,12 +453,16 @@ async def __calculate_embeddings(client: OpenAI, documents: List[str], batch_siz
         client: OpenAI client instance
         documents: List of text chunks to embed
         batch_size: Number of chunks to process at once
+        model: the embedding model
+        dimensions: shorter embeddings to ask the API for (default: the model's full size)
     
     Returns: List of embedding vectors (each vector is List[float])
     """
+    options = {"dimensions": dimensions} if dimensions else {}
     embeddings = []
     for i in range(0, len(documents), batch_size):
-        response = client.embeddings.create(model=EMBEDDING_MODEL, input=documents[i : i + batch_size], encoding_format="float")
+        response = client.embeddings.create(model=model, input=documents[i : i + batch_size], encoding_format="float",
+                                            **options)
         for i, be in enumerate(response.data):
             assert i == be.index  # double check embeddings are in same order as input
         batch_embeddings = [e.embedding for e in response.data]
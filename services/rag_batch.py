@@ -0,0 +1,183 @@
+"""
+Answer many questions about the book in one run, e.g. for FAQ generation or evaluation.
+
+Usage:
+    python -m services.rag_batch questions.txt --output data/book_answers.jsonl \
+        [--concurrency 8] [--rpm 500] [--retries 3] [--embedding-batch-size 100]
+
+The input is a text file with one question per line, or a CSV or JSONL file with a
+`question` field. All questions are embedded in batched requests and matched against the
+book with a single matrix product (see `rag.search_many`); the answers are then generated
+by a bounded pool of async workers and appended to the JSONL output as they complete,
+each with its page number, context, similarity and timings.
+"""
+import argparse
+import asyncio
+import csv
+import json
+import os
+import time
+from typing import Dict, List
+
+import services.llm
+from services import rag, registry
+from services.requirements_batch import RateLimiter
+
+
+def read_questions(path: str) -> List[str]:
+    """
+    Read questions from a text file (one per line), or a CSV or JSONL file with a `question` field.
+    """
+    with open(path, "r", encoding="utf-8", newline="") as file:
+        if path.endswith(".jsonl"):
+            rows = [json.loads(line) for line in file if line.strip()]
+        elif path.endswith(".csv"):
+            rows = list(csv.DictReader(file))
+        else:
+            rows = [{"question": line} for line in file]
+    questions = []
+    for row in rows:
+        question = (row.get("question") or "").strip()
+        if question:
+            questions.append(question)
+    return questions
+
+
+async def _generate_answer(prompt: str, limiter: RateLimiter | None, retries: int) -> str:
+    for attempt in range(retries + 1):
+        if limiter is not None:
+            await limiter.acquire()
+        try:
+            # The same generation as `rag.ask_book`, on the shared client's connection pool
+            answer, _ = await registry.to_thread(services.llm.converse_sync, prompt, [],
+                                                 model=os.getenv("OPENAI_API_MODEL"))
+            return answer
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+        if attempt < retries:
+            backoff = 2 ** attempt * (15 if "429" in error or "rate limit" in error.lower() else 1)
+            print(f"⏳ Retrying in {backoff}s after: {error[:120]}")
+            await asyncio.sleep(backoff)
+    raise RuntimeError(error)
+
+
+async def ask_book_many(questions: List[str],
+                        output_path: str | None = None,
+                        concurrency: int = 8,
+                        requests_per_minute: float | None = None,
+                        retries: int = 3,
+                        embedding_batch_size: int = 100) -> Dict:
+    """
+    Answer many questions about the book: embed them in batches, retrieve the context of all
+    of them with one matrix product, and generate the answers with a bounded worker pool.
+
+    Args:
+        questions: the questions to answer
+        output_path: optional JSONL file each result is appended to as soon as it is ready
+        concurrency: number of concurrent answer generations
+        requests_per_minute: optional provider rate limit for the generations
+        retries: retries per answer after a provider error
+        embedding_batch_size: questions per embeddings request
+
+    Returns: a summary with the timings of each stage and the `results`, in the order of
+             `questions`, with `question`, `answer` (or `error`), `page_number`, `context`,
+             `similarity` and `generation_seconds`
+    """
+    start_time = time.perf_counter()
+    if not questions:
+        return _summary([], time.perf_counter() - start_time, 0.0, 0.0, concurrency, requests_per_minute)
+    client = services.llm.get_client()
+    await rag.ensure_embeddings(client)
+    index = rag.load_index(rag.CSV_FILE_PATH)
+
+    embedding_start = time.perf_counter()
+    query_embeddings = await rag.embed_queries(client, questions, batch_size=embedding_batch_size, index=index)
+    search_start = time.perf_counter()
+    best, similarities = rag.search_many(index, query_embeddings)
+    search_seconds = time.perf_counter() - search_start
+    embedding_seconds = search_start - embedding_start
+    print(f"🔎 Embedded {len(questions)} questions in {embedding_seconds:.2f}s "
+          f"and searched {len(index['embeddings'])} chunks in {search_seconds * 1000:.1f}ms")
+
+    results: List[Dict | None] = [None] * len(questions)
+    queue = asyncio.Queue()
+    for position in range(len(questions)):
+        queue.put_nowait(position)
+    limiter = RateLimiter(requests_per_minute, burst=concurrency) if requests_per_minute else None
+    output = open(output_path, "a", encoding="utf-8") if output_path else None
+    done = 0
+
+    async def worker():
+        nonlocal done
+        while True:
+            try:
+                position = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            chunk = index["embeddings"][best[position]]
+            result = {"position": position, "question": questions[position], "page_number": chunk["page_number"],
+                      "context": chunk["context"], "similarity": float(similarities[position])}
+            generation_start = time.perf_counter()
+            try:
+                result["answer"] = await _generate_answer(rag.answer_prompt(questions[position], chunk["context"]),
+                                                          limiter, retries)
+            except Exception as e:
+                result["error"] = str(e)
+                print(f"❌ {questions[position][:60]}: {e}")
+            result["generation_seconds"] = time.perf_counter() - generation_start
+            results[position] = result
+            done += 1
+            if output is not None:
+                output.write(json.dumps(result) + "\n")
+                output.flush()
+            print(f"✅ [{done}/{len(questions)}] page {result['page_number']} in {result['generation_seconds']:.1f}s")
+
+    try:
+        await asyncio.gather(*[worker() for _ in range(max(1, min(concurrency, len(questions))))])
+    finally:
+        if output is not None:
+            output.close()
+    wall_seconds = time.perf_counter() - start_time
+
+    return _summary(results, wall_seconds, embedding_seconds, search_seconds, concurrency, requests_per_minute)
+
+
+def _summary(results: List[Dict], wall_seconds: float, embedding_seconds: float, search_seconds: float,
+             concurrency: int, requests_per_minute: float | None) -> Dict:
+    generation_seconds = sorted(result["generation_seconds"] for result in results)
+    return {
+        "questions": len(results),
+        "answered": sum("answer" in result for result in results),
+        "failed": sum("error" in result for result in results),
+        "wall_seconds": wall_seconds,
+        "questions_per_minute": len(results) / wall_seconds * 60 if wall_seconds > 0 else 0.0,
+        "embedding_seconds": embedding_seconds,
+        "search_seconds": search_seconds,
+        "mean_generation_seconds": sum(generation_seconds) / len(generation_seconds) if generation_seconds else 0.0,
+        "max_generation_seconds": generation_seconds[-1] if generation_seconds else 0.0,
+        "concurrency": concurrency,
+        "requests_per_minute": requests_per_minute,
+        "results": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Answer many questions about the book.")
+    parser.add_argument("input", help="text file with one question per line, or CSV or JSONL with a question field")
+    parser.add_argument("-o", "--output", default="data/book_answers.jsonl", help="JSONL file results are appended to")
+    parser.add_argument("--concurrency", type=int, default=8, help="number of concurrent answer generations")
+    parser.add_argument("--rpm", type=float, default=None, help="provider requests per minute limit")
+    parser.add_argument("--retries", type=int, default=3, help="retries per answer after a provider error")
+    parser.add_argument("--embedding-batch-size", type=int, default=100, help="questions per embeddings request")
+    args = parser.parse_args()
+
+    questions = read_questions(args.input)
+    summary = asyncio.run(ask_book_many(questions, args.output, args.concurrency, args.rpm, args.retries,
+                                        args.embedding_batch_size))
+    print(f"Answered {summary['answered']} of {summary['questions']} questions ({summary['failed']} failed) "
+          f"in {summary['wall_seconds']:.1f}s, {summary['questions_per_minute']:.1f} questions/minute "
+          f"(embedding {summary['embedding_seconds']:.2f}s, search {summary['search_seconds'] * 1000:.1f}ms)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""
+Reduce the book index's embeddings to fewer dimensions, for a smaller and faster index, and
+publish indexes as memory-mapped directories shared by every worker process.
+
+Usage:
+    python -m services.rag_index --dimensions 512 --output data/ThePragmaticProgrammer.512.embeddings.csv \
+        [--reduction api|pca] [--source data/ThePragmaticProgrammer.embeddings.csv] [--publish data/book_index]
+    python -m services.rag_index --publish data/book_index [--source data/ThePragmaticProgrammer.embeddings.csv]
+
+"api" keeps the first dimensions of the text-embedding-3 embeddings and normalizes them,
+as the API's `dimensions` parameter does; "pca" fits a projection on the book's embeddings.
+The configuration is recorded next to the new index, so the app embeds queries the same
+way once RAG_INDEX_PATH points at it. Compare the recall of each size first with
+`python -m benchmarks.embedding_dimensions`.
+
+--publish writes the (reduced) index as a new version of an index directory and switches
+its `current` symlink to it (see `services.index_store`); running processes with
+RAG_INDEX_PATH set to the directory map the new version on their next book question.
+"""
+import argparse
+
+from services import rag
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reduce the book index's embeddings and publish indexes.")
+    parser.add_argument("--dimensions", type=int, help="dimensions of the reduced embeddings")
+    parser.add_argument("--reduction", choices=rag.REDUCTIONS, default="api", help="how to reduce them")
+    parser.add_argument("--source", default=rag.CSV_FILE_PATH, help="embeddings CSV to reduce or publish")
+    parser.add_argument("-o", "--output", help="where to write the reduced embeddings CSV")
+    parser.add_argument("--publish", metavar="INDEX_DIR", help="publish the index as a new version of this directory")
+    args = parser.parse_args()
+    if args.dimensions is None and args.publish is None:
+        parser.error("give --dimensions and --output to reduce the index, and/or --publish to publish it")
+    if args.dimensions is not None and args.output is None:
+        parser.error("--dimensions needs --output")
+
+    source = args.source
+    if args.dimensions is not None:
+        rag.reduce_index(source, args.output, args.dimensions, args.reduction)
+        source = args.output
+    if args.publish is not None:
+        rag.publish_index(source, args.publish)
+        print(f"Set RAG_INDEX_PATH={args.publish} to use it")
+    else:
+        print(f"Set RAG_INDEX_PATH={args.output} to use it")
+
+
+if __name__ == "__main__":
+    main()
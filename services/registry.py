@@ -0,0 +1,290 @@
+"""
+Process-wide registry of heavy shared resources: API clients, the book index, tokenizers,
+caches and executors.
+
+Streamlit reruns a page script on every interaction and runs each session on its own
+thread, so the services don't build these themselves: they register a factory once,
+when they are imported,
+
+    registry.register("openai_client", _create_client, close=lambda client: client.close())
+
+and call `registry.get("openai_client")` where they need it. The first call builds the
+resource; every later call, from any session, gets the same object.
+
+Code that must not have a resource closed under it (e.g. an executor it is submitting
+work to) leases it with `with registry.lease(name) as resource:`. `shutdown` closes
+every resource when the process exits, waiting for the last lease of the leased ones.
+"""
+import asyncio
+import atexit
+import functools
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Hashable, Iterator
+
+# Threads for the services' blocking work (file IO, database calls, speech synthesis)
+SERVICE_THREADS = int(os.getenv("SERVICE_THREADS", "32"))
+
+
+@dataclass
+class _Resource:
+    factory: Callable[[], Any]
+    close: Callable[[Any], None] | None = None
+    size: Callable[[Any], int] | None = None
+    value: Any = None
+    built: bool = False
+    created_at: float | None = None
+    build_seconds: float = 0.0
+    builds: int = 0
+    hits: int = 0
+    refs: int = 0
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+
+_resources: Dict[str, _Resource] = {}
+_lock = threading.Lock()
+_shutting_down = False
+
+
+class LruCache:
+    """
+    A thread-safe mapping that keeps the `max_entries` most recently used entries and counts
+    its hits and misses. Register one as a resource to share it between sessions.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+            return default
+
+    def put(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def values(self) -> list:
+        with self._lock:
+            return list(self._entries.values())
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {"entries": len(self._entries), "max_entries": self.max_entries, "hits": self.hits,
+                "misses": self.misses, "hit_rate": self.hits / lookups if lookups else 0.0}
+
+
+def register(name: str, factory: Callable[[], Any], close: Callable[[Any], None] | None = None,
+             size: Callable[[Any], int] | None = None) -> None:
+    """
+    Declare a resource. Registering a name again (e.g. when Streamlit reloads a changed
+    module) replaces its factory but keeps an already built resource.
+
+    Args:
+        name: the resource's name, unique in the process
+        factory: builds the resource on first use
+        close: releases the resource at shutdown, e.g. closes its connections
+        size: estimates the resource's memory in bytes, for `stats`
+    """
+    with _lock:
+        resource = _resources.get(name)
+        if resource is None:
+            _resources[name] = _Resource(factory, close, size)
+        else:
+            resource.factory, resource.close, resource.size = factory, close, size
+
+
+def is_registered(name: str) -> bool:
+    return name in _resources
+
+
+def _resource(name: str) -> _Resource:
+    try:
+        return _resources[name]
+    except KeyError:
+        raise KeyError(f"No resource named {name!r} is registered") from None
+
+
+def get(name: str) -> Any:
+    """
+    Return a resource, building it on first use. Concurrent first calls build it once.
+
+    Raises:
+        KeyError: if no resource of that name is registered
+        RuntimeError: if the registry is shutting down
+    """
+    resource = _resource(name)
+    with resource.lock:
+        if resource.built:
+            resource.hits += 1
+            return resource.value
+        if _shutting_down:
+            raise RuntimeError(f"Can't build {name!r}: the registry is shutting down")
+        start = time.perf_counter()
+        resource.value = resource.factory()
+        resource.build_seconds = time.perf_counter() - start
+        resource.built = True
+        resource.created_at = time.time()
+        resource.builds += 1
+        print(f"🧰 Built shared {name} in {resource.build_seconds:.2f}s")
+        return resource.value
+
+
+def invalidate(name: str) -> None:
+    """
+    Drop a built resource so the next `get` builds it again, e.g. when its source file
+    changed. Sessions still using the old object keep it; it is closed right away if it
+    isn't leased, and otherwise left to the garbage collector.
+    """
+    resource = _resource(name)
+    with resource.lock:
+        if not resource.built:
+            return
+        value, resource.value, resource.built = resource.value, None, False
+        leased = resource.refs > 0
+    if resource.close is not None and not leased:
+        resource.close(value)
+
+
+def acquire(name: str) -> Any:
+    """
+    Return a resource like `get`, and keep it open until a matching `release`.
+    """
+    value = get(name)
+    resource = _resource(name)
+    with resource.lock:
+        resource.refs += 1
+    return value
+
+
+def release(name: str) -> None:
+    """
+    Give back a resource from `acquire`; if the registry is shutting down and this was the
+    last lease, the resource is closed now.
+    """
+    resource = _resource(name)
+    with resource.lock:
+        resource.refs -= 1
+        close_now = _shutting_down and resource.refs == 0 and resource.built
+    if close_now:
+        _close(name, resource)
+
+
+@contextmanager
+def lease(name: str) -> Iterator[Any]:
+    """
+    Use a resource for the duration of a `with` block, see `acquire`.
+    """
+    value = acquire(name)
+    try:
+        yield value
+    finally:
+        release(name)
+
+
+def _close(name: str, resource: _Resource) -> None:
+    with resource.lock:
+        if not resource.built:
+            return
+        value, resource.value, resource.built = resource.value, None, False
+    if resource.close is not None:
+        try:
+            resource.close(value)
+        except Exception as e:
+            print(f"⚠️ Closing {name} failed: {e}")
+
+
+def shutdown() -> None:
+    """
+    Close every resource that isn't leased, and the rest when their last lease is released.
+    Runs when the process exits.
+    """
+    global _shutting_down
+    _shutting_down = True
+    with _lock:
+        resources = list(_resources.items())
+    for name, resource in resources:
+        if resource.refs == 0:
+            _close(name, resource)
+
+
+def stats() -> Dict[str, Dict]:
+    """
+    Return per-resource statistics: whether it is built, its `age_seconds`, `build_seconds`,
+    `builds`, `hits` (gets served without building), `refs` (current leases) and estimated
+    `memory_bytes`, plus `cache` statistics for resources that keep their own (e.g. LruCache).
+    """
+    result = {}
+    with _lock:
+        resources = list(_resources.items())
+    for name, resource in resources:
+        with resource.lock:
+            value, built = resource.value, resource.built
+            entry = {"built": built, "age_seconds": time.time() - resource.created_at if built else None,
+                     "build_seconds": resource.build_seconds, "builds": resource.builds, "hits": resource.hits,
+                     "refs": resource.refs, "memory_bytes": None}
+        if built and resource.size is not None:
+            try:
+                entry["memory_bytes"] = resource.size(value)
+            except Exception:
+                pass
+        if built and callable(getattr(value, "stats", None)):
+            entry["cache"] = value.stats()
+        result[name] = entry
+    return result
+
+
+async def to_thread(func: Callable, *args, **kwargs) -> Any:
+    """
+    Run a blocking function on the shared service thread pool. Unlike `asyncio.to_thread`,
+    the threads outlive the event loop, which Streamlit creates anew on every rerun.
+    """
+    with lease("thread_pool") as executor:
+        return await asyncio.get_running_loop().run_in_executor(executor, functools.partial(func, *args, **kwargs))
+
+
+def submit(func: Callable, *args, **kwargs) -> Future:
+    """
+    Run a blocking function on the shared service thread pool in the background, e.g. work
+    that must not delay a response. The pool stays leased until the function has run, and
+    errors are logged since nobody waits for the result.
+    """
+    executor = acquire("thread_pool")
+    try:
+        future = executor.submit(func, *args, **kwargs)
+    except BaseException:
+        release("thread_pool")
+        raise
+    future.add_done_callback(_finish_background_task)
+    return future
+
+
+def _finish_background_task(future: Future) -> None:
+    release("thread_pool")
+    if not future.cancelled() and future.exception() is not None:
+        print(f"⚠️ Background task failed: {future.exception()}")
+
+
+register("thread_pool",
+         lambda: ThreadPoolExecutor(max_workers=SERVICE_THREADS, thread_name_prefix="services"),
+         close=lambda executor: executor.shutdown(wait=False, cancel_futures=True))
+atexit.register(shutdown)
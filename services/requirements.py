@@ -0,0 +1,137 @@
+import asyncio
+import threading
+import time
+from typing import Callable, Dict, List
+
+from services.llm_switcher import converse, is_error_response
+from services.prompts import REQUIREMENT_TYPES, requirements_prompt, system_requirements_prompt
+
+
+def requirements_messages(product_name: str, product_description: str, requirement_type: str,
+                          system_prompt: str | None = None) -> List[Dict[str, str]]:
+    """
+    Build the conversation for one requirement document.
+
+    Args:
+        product_name: the name of the product
+        product_description: a description of the product
+        requirement_type: one of REQUIREMENT_TYPES
+        system_prompt: a prebuilt `system_requirements_prompt` to share across documents
+
+    Returns: a conversation history with a system and a user message
+    """
+    if system_prompt is None:
+        system_prompt = system_requirements_prompt(product_name, product_description)
+    return [{"role": "system", "content": system_prompt},
+            {"role": "user", "content": requirements_prompt(product_name, requirement_type)}]
+
+
+class DocumentRun:
+    """
+    Generates several requirement documents for one product concurrently.
+
+    Each document streams into `documents[requirement_type]`, a dict with keys:
+        - status: str          # "pending", "running", "done", "failed" or "cancelled"
+        - text: str            # the document generated so far
+        - seconds: float       # generation wall time once finished
+        - error: str | None    # the provider error for failed documents
+
+    Documents can be cancelled individually with `cancel`, from any thread, without
+    affecting the others. Use `await run()` inside an event loop, or `start()` to run
+    in a background thread and poll `documents` (as the Requirements page does).
+    """
+
+    def __init__(self, product_name: str, product_description: str, requirement_types: List[str] = None):
+        self.product_name = product_name
+        self.requirement_types = list(requirement_types or REQUIREMENT_TYPES)
+        # All documents share one system prompt
+        self.system_prompt = system_requirements_prompt(product_name, product_description)
+        self.documents = {requirement_type: {"status": "pending", "text": "", "seconds": None, "error": None}
+                          for requirement_type in self.requirement_types}
+        self.seconds = None
+        self._loop = None
+        self._tasks = {}
+        self._cancelled = set()
+        # Guards _tasks and _cancelled: cancel is called from session threads while run starts the tasks
+        self._lock = threading.Lock()
+        self._started = False
+        self._finished = threading.Event()
+
+    async def run(self, on_delta: Callable[[str, str], None] | None = None) -> Dict[str, Dict]:
+        """
+        Generate all documents concurrently and return `documents` once every one has
+        finished, failed or been cancelled.
+
+        Args:
+            on_delta: optional callback called with (requirement_type, delta) as text arrives
+        """
+        start_time = time.perf_counter()
+        self._started = True
+        with self._lock:
+            self._loop = asyncio.get_running_loop()
+            self._tasks = {requirement_type: asyncio.create_task(self._generate(requirement_type, on_delta))
+                           for requirement_type in self.requirement_types}
+            for requirement_type in self._cancelled & self._tasks.keys():
+                self._tasks[requirement_type].cancel()
+        await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+        for document in self.documents.values():
+            if document["status"] == "pending":
+                # Cancelled before it got to start
+                document["status"] = "cancelled"
+        self.seconds = time.perf_counter() - start_time
+        self._finished.set()
+        return self.documents
+
+    def start(self) -> None:
+        """
+        Run the generation in a background thread with its own event loop.
+        """
+        self._started = True
+        threading.Thread(target=asyncio.run, args=(self.run(),), daemon=True).start()
+
+    @property
+    def is_running(self) -> bool:
+        return self._started and not self._finished.is_set()
+
+    def cancel(self, requirement_type: str) -> None:
+        """
+        Cancel one document. Safe to call from another thread.
+        """
+        with self._lock:
+            self._cancelled.add(requirement_type)
+            task = self._tasks.get(requirement_type)
+            if task is not None and not task.done():
+                self._loop.call_soon_threadsafe(task.cancel)
+
+    async def _generate(self, requirement_type: str, on_delta: Callable[[str, str], None] | None):
+        document = self.documents[requirement_type]
+        document["status"] = "running"
+        messages = requirements_messages(self.product_name, "", requirement_type, self.system_prompt)
+        start_time = time.perf_counter()
+        try:
+            async for delta in converse(messages):
+                if is_error_response(delta):
+                    document["status"], document["error"] = "failed", delta
+                    return
+                document["text"] += delta
+                if on_delta is not None:
+                    on_delta(requirement_type, delta)
+            document["status"] = "done"
+        except asyncio.CancelledError:
+            document["status"] = "cancelled"
+            raise
+        finally:
+            document["seconds"] = time.perf_counter() - start_time
+            print(f"📓 {requirement_type} {document['status']} after {document['seconds']:.1f}s")
+
+
+def combine_documents(product_name: str, documents: Dict[str, Dict]) -> str:
+    """
+    Combine generated documents into a single markdown export, skipping empty ones.
+    """
+    sections = [f"# {product_name} Requirements"]
+    for requirement_type, document in documents.items():
+        if document["text"].strip():
+            note = " (incomplete)" if document["status"] != "done" else ""
+            sections.append(f"## {requirement_type}{note}\n\n{document['text'].strip()}")
+    return "\n\n".join(sections) + "\n"
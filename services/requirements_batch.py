@@ -0,0 +1,236 @@
+"""
+Headless batch generation of requirement documents.
+
+Usage:
+    python -m services.requirements_batch products.csv --output data/requirements \
+        [--types "Vision Statement" "RACI Matrix"] [--concurrency 4] [--rpm 60] [--retries 3]
+
+The input is a CSV or JSONL file with `product_name` and `product_description`
+fields. Every (product, document type) pair is generated by a bounded pool of
+async workers, written to `<output>/<product>_<hash>/<document type>.md` and recorded in
+`<output>/checkpoint.jsonl`, so rerunning the same command resumes where it stopped.
+A timing summary is written to `<output>/summary.json`.
+"""
+import argparse
+import asyncio
+import csv
+import hashlib
+import json
+import os
+import re
+import time
+from typing import Dict, List
+
+from services.llm_switcher import converse, is_error_response
+from services.prompts import REQUIREMENT_TYPES, system_requirements_prompt
+from services.requirements import requirements_messages
+
+CHECKPOINT_FILE = "checkpoint.jsonl"
+SUMMARY_FILE = "summary.json"
+
+
+class RateLimiter:
+    """
+    An async token bucket allowing `requests_per_minute` requests, with bursts of
+    up to `burst` requests.
+    """
+
+    def __init__(self, requests_per_minute: float, burst: int = 1):
+        self.interval = 60.0 / requests_per_minute
+        self.capacity = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) / self.interval)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) * self.interval)
+
+
+def read_products(path: str) -> List[Dict[str, str]]:
+    """
+    Read products from a CSV or JSONL file with `product_name` and `product_description` fields.
+    """
+    with open(path, "r", encoding="utf-8", newline="") as file:
+        if path.endswith(".jsonl"):
+            rows = [json.loads(line) for line in file if line.strip()]
+        else:
+            rows = list(csv.DictReader(file))
+    products = []
+    for row in rows:
+        if not row.get("product_name"):
+            raise ValueError(f"Missing product_name in {row}")
+        products.append({"product_name": row["product_name"].strip(),
+                         "product_description": (row.get("product_description") or "").strip()})
+    return products
+
+
+def slugify(text: str) -> str:
+    return re.sub(r"[^A-Za-z0-9]+", "_", text).strip("_").lower() or "untitled"
+
+
+def product_slug(product_name: str) -> str:
+    """
+    Return a product's directory name: its slug and a short hash of the exact name, so names
+    with the same slug (e.g. "C++ Tools" and "C Tools") don't share a directory.
+    """
+    return f"{slugify(product_name)}_{hashlib.sha256(product_name.encode('utf-8')).hexdigest()[:8]}"
+
+
+def load_checkpoint(output_dir: str) -> Dict[tuple, Dict]:
+    """
+    Return the completed items recorded in the checkpoint, keyed by (product_name, requirement_type).
+    Items whose output file has since been removed are regenerated.
+    """
+    completed = {}
+    path = os.path.join(output_dir, CHECKPOINT_FILE)
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as file:
+            for line in file:
+                if line.strip():
+                    item = json.loads(line)
+                    if os.path.exists(item["path"]):
+                        completed[(item["product_name"], item["requirement_type"])] = item
+    return completed
+
+
+async def _generate_document(messages: List[Dict[str, str]], limiter: RateLimiter | None, retries: int) -> str:
+    for attempt in range(retries + 1):
+        if limiter is not None:
+            await limiter.acquire()
+        text, error = "", None
+        async for delta in converse(messages):
+            if is_error_response(delta):
+                error = delta
+                break
+            text += delta
+        if error is None:
+            return text
+        if attempt < retries:
+            backoff = 2 ** attempt * (15 if "RATE LIMIT" in error or "429" in error else 1)
+            print(f"⏳ Retrying in {backoff}s after: {error[:120]}")
+            await asyncio.sleep(backoff)
+    raise RuntimeError(error)
+
+
+async def generate_batch(products: List[Dict[str, str]],
+                         output_dir: str,
+                         requirement_types: List[str] = None,
+                         concurrency: int = 4,
+                         requests_per_minute: float | None = None,
+                         retries: int = 3) -> Dict:
+    """
+    Generate requirement documents for many products with a bounded worker pool.
+
+    Args:
+        products: dicts with `product_name` and `product_description`
+        output_dir: where documents, the checkpoint and the summary are written
+        requirement_types: the document types to generate (default: all of REQUIREMENT_TYPES)
+        concurrency: number of concurrent workers
+        requests_per_minute: optional provider rate limit shared by all workers
+        retries: retries per document after a provider error
+
+    Returns: the timing summary that is also written to `summary.json`
+    """
+    requirement_types = requirement_types or REQUIREMENT_TYPES
+    os.makedirs(output_dir, exist_ok=True)
+    completed = load_checkpoint(output_dir)
+    limiter = RateLimiter(requests_per_minute, burst=concurrency) if requests_per_minute else None
+
+    queue = asyncio.Queue()
+    skipped = 0
+    for product in products:
+        system_prompt = system_requirements_prompt(product["product_name"], product["product_description"])
+        for requirement_type in requirement_types:
+            if (product["product_name"], requirement_type) in completed:
+                skipped += 1
+            else:
+                queue.put_nowait((product, requirement_type, system_prompt))
+    total = queue.qsize()
+    print(f"📓 {total} documents to generate, {skipped} already done")
+
+    results, failures = [], []
+    checkpoint = open(os.path.join(output_dir, CHECKPOINT_FILE), "a", encoding="utf-8")
+
+    async def worker():
+        while True:
+            try:
+                product, requirement_type, system_prompt = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            name = product["product_name"]
+            messages = requirements_messages(name, product["product_description"], requirement_type, system_prompt)
+            start_time = time.perf_counter()
+            try:
+                text = await _generate_document(messages, limiter, retries)
+            except Exception as e:
+                failures.append({"product_name": name, "requirement_type": requirement_type, "error": str(e)})
+                print(f"❌ {name} / {requirement_type}: {e}")
+                continue
+
+            path = os.path.join(output_dir, product_slug(name), f"{slugify(requirement_type)}.md")
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path + ".tmp", "w", encoding="utf-8") as file:
+                file.write(text)
+            os.replace(path + ".tmp", path)
+
+            item = {"product_name": name, "requirement_type": requirement_type, "path": path,
+                    "seconds": time.perf_counter() - start_time, "characters": len(text)}
+            checkpoint.write(json.dumps(item) + "\n")
+            checkpoint.flush()
+            results.append(item)
+            print(f"✅ [{len(results) + len(failures)}/{total}] {name} / {requirement_type} "
+                  f"in {item['seconds']:.1f}s")
+
+    start_time = time.perf_counter()
+    try:
+        await asyncio.gather(*[worker() for _ in range(max(1, concurrency))])
+    finally:
+        checkpoint.close()
+    wall_seconds = time.perf_counter() - start_time
+
+    seconds = sorted(item["seconds"] for item in results)
+    summary = {
+        "generated": len(results),
+        "skipped": skipped,
+        "failed": len(failures),
+        "wall_seconds": wall_seconds,
+        "documents_per_minute": len(results) / wall_seconds * 60 if wall_seconds > 0 else 0.0,
+        "mean_document_seconds": sum(seconds) / len(seconds) if seconds else 0.0,
+        "max_document_seconds": seconds[-1] if seconds else 0.0,
+        "concurrency": concurrency,
+        "requests_per_minute": requests_per_minute,
+        "documents": results,
+        "failures": failures,
+    }
+    with open(os.path.join(output_dir, SUMMARY_FILE), "w", encoding="utf-8") as file:
+        json.dump(summary, file, indent=2)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate requirement documents for many products.")
+    parser.add_argument("input", help="CSV or JSONL file with product_name and product_description")
+    parser.add_argument("-o", "--output", default="data/requirements", help="output directory")
+    parser.add_argument("--types", nargs="+", default=REQUIREMENT_TYPES, choices=REQUIREMENT_TYPES,
+                        help="document types to generate")
+    parser.add_argument("--concurrency", type=int, default=4, help="number of concurrent workers")
+    parser.add_argument("--rpm", type=float, default=None, help="provider requests per minute limit")
+    parser.add_argument("--retries", type=int, default=3, help="retries per document after a provider error")
+    args = parser.parse_args()
+
+    summary = asyncio.run(generate_batch(read_products(args.input), args.output, args.types,
+                                         args.concurrency, args.rpm, args.retries))
+    print(f"Generated {summary['generated']} documents ({summary['skipped']} skipped, {summary['failed']} failed) "
+          f"in {summary['wall_seconds']:.1f}s, {summary['documents_per_minute']:.1f} documents/minute")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+"""
+Downscaled WebP thumbnails and previews for generated images.
+
+Usage:
+    python -m services.thumbnails [--folder data/images] [--workers 4]
+
+Thumbnails are stored in a content-addressed cache directory, keyed by the SHA-256
+of the image bytes, so identical images share thumbnails and a cache entry never
+needs invalidating. Images generated by the app get thumbnails when they are saved;
+running this module (or `start_backfill`) creates any that are missing.
+"""
+import argparse
+import hashlib
+import io
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Tuple
+
+from PIL import Image
+
+from services import image_index
+
+THUMBNAIL_DIR = os.getenv("THUMBNAIL_DIR", os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "thumbnails"))
+
+# Longest side in pixels for each rendition
+THUMBNAIL_SIZES = {"thumb": 128, "medium": 512}
+WEBP_QUALITY = 80
+
+# A backfill is started at most this often per folder, so page views don't keep starting
+# ones while images that can't be thumbnailed remain
+BACKFILL_INTERVAL_SECONDS = float(os.getenv("THUMBNAIL_BACKFILL_INTERVAL_SECONDS", "600"))
+
+_backfill_lock = threading.Lock()
+_backfill_thread = None
+_backfill_started: Dict[str, float] = {}
+# Images that could not be read, so a page view does not retry them on every rerun
+_failed = set()
+
+
+def content_hash(image_bytes: bytes) -> str:
+    return hashlib.sha256(image_bytes).hexdigest()
+
+
+def thumbnail_path(image_hash: str, size: str = "thumb") -> str:
+    """
+    Return where the rendition of an image with the given content hash is cached.
+    """
+    return os.path.join(THUMBNAIL_DIR, image_hash[:2], f"{image_hash}_{size}.webp")
+
+
+def create_thumbnails(image_bytes: bytes, image_hash: str | None = None) -> str:
+    """
+    Create every rendition in THUMBNAIL_SIZES for an image, skipping ones already cached.
+
+    Args:
+        image_bytes: the encoded full size image
+        image_hash: the content hash of image_bytes, if already known
+
+    Returns: the content hash of the image
+    """
+    image_hash = image_hash or content_hash(image_bytes)
+    missing = {size: pixels for size, pixels in THUMBNAIL_SIZES.items()
+               if not os.path.exists(thumbnail_path(image_hash, size))}
+    if not missing:
+        return image_hash
+
+    with Image.open(io.BytesIO(image_bytes)) as image:
+        image.load()
+        # Largest rendition first so smaller ones are downscaled from it, not the original
+        for size, pixels in sorted(missing.items(), key=lambda item: -item[1]):
+            image.thumbnail((pixels, pixels), Image.Resampling.LANCZOS)
+            path = thumbnail_path(image_hash, size)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write to a temporary name first so readers never see a partial file
+            temporary_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            image.save(temporary_path, format="WEBP", quality=WEBP_QUALITY)
+            os.replace(temporary_path, path)
+    return image_hash
+
+
+def record_failure(filename: str) -> None:
+    """
+    Remember that an image's thumbnails could not be created, so they aren't retried in this process.
+    """
+    _failed.add(filename)
+
+
+def has_failed(filename: str) -> bool:
+    return filename in _failed
+
+
+def remove_thumbnails(image_hash: str) -> None:
+    for size in THUMBNAIL_SIZES:
+        path = thumbnail_path(image_hash, size)
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def _thumbnail_file(image_path: str) -> Tuple[str, str | None]:
+    """
+    Process pool job: create thumbnails for one image file.
+    Returns (file name, content hash), with a None hash if the image could not be read.
+    """
+    try:
+        with open(image_path, "rb") as image_file:
+            return os.path.basename(image_path), create_thumbnails(image_file.read())
+    except Exception as e:
+        print(f"❌ Could not create thumbnails for {image_path}: {e}")
+        return os.path.basename(image_path), None
+
+
+def backfill(folder: str, workers: int | None = None) -> int:
+    """
+    Create thumbnails for indexed images that have no content hash yet, or whose
+    thumbnails are missing from the cache, using a process pool.
+
+    Returns: the number of images processed
+    """
+    image_index.reconcile(folder)
+    todo = [filename for filename, image_hash in image_index.content_hashes()
+            if filename not in _failed and (image_hash is None or not all(
+                os.path.exists(thumbnail_path(image_hash, size)) for size in THUMBNAIL_SIZES))]
+    if not todo:
+        return 0
+
+    print(f"🖼️ Creating thumbnails for {len(todo)} images")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+        paths = [os.path.join(folder, filename) for filename in todo]
+        for filename, image_hash in executor.map(_thumbnail_file, paths, chunksize=8):
+            if image_hash is None:
+                record_failure(filename)
+            else:
+                image_index.set_content_hash(filename, image_hash)
+    return len(todo)
+
+
+def _run_backfill(folder: str) -> None:
+    try:
+        backfill(folder)
+    except Exception as e:
+        print(f"❌ Thumbnail backfill failed: {e}")
+
+
+def start_backfill(folder: str) -> bool:
+    """
+    Start a background backfill unless one is already running in this process, or one was
+    started for the folder less than BACKFILL_INTERVAL_SECONDS ago.
+
+    Returns: True if a new backfill was started
+    """
+    global _backfill_thread
+    with _backfill_lock:
+        if _backfill_thread is not None and _backfill_thread.is_alive():
+            return False
+        started = _backfill_started.get(folder)
+        if started is not None and time.monotonic() - started < BACKFILL_INTERVAL_SECONDS:
+            return False
+        _backfill_started[folder] = time.monotonic()
+        _backfill_thread = threading.Thread(target=_run_backfill, args=(folder,), daemon=True)
+        _backfill_thread.start()
+        return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Create missing thumbnails for generated images.")
+    parser.add_argument("--folder", default=os.path.join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "images"), help="the images folder")
+    parser.add_argument("--workers", type=int, default=None, help="number of worker processes")
+    args = parser.parse_args()
+    print(f"Processed {backfill(args.folder, args.workers)} images")
+
+
+if __name__ == "__main__":
+    main()
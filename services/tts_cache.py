@@ -0,0 +1,163 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import closing
+from typing import Dict
+
+_DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+TTS_CACHE_DIR = os.getenv("TTS_CACHE_DIR", os.path.join(_DATA_DIR, "tts_cache"))
+TTS_CACHE_PATH = os.getenv("TTS_CACHE_PATH", os.path.join(_DATA_DIR, "tts_cache.sqlite3"))
+# Size bounds for the audio kept on disk and the hot tier kept in memory
+TTS_CACHE_MAX_BYTES = int(os.getenv("TTS_CACHE_MAX_MB", "200")) * 1024 * 1024
+TTS_MEMORY_CACHE_MAX_BYTES = int(os.getenv("TTS_MEMORY_CACHE_MAX_MB", "16")) * 1024 * 1024
+
+_initialized = set()
+_memory: "OrderedDict[str, bytes]" = OrderedDict()
+_memory_bytes = 0
+_lock = threading.Lock()
+_stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "seconds_saved": 0.0}
+
+
+def cache_key(text: str, lang: str, voice: Dict) -> str:
+    """
+    Return the key of a synthesized text: a hash of the text (with whitespace normalized),
+    the language and any other voice settings that change the audio.
+    """
+    parameters = [" ".join(text.split()), lang, sorted(voice.items())]
+    return hashlib.sha256(json.dumps(parameters).encode("utf-8")).hexdigest()
+
+
+def _connect(path: str | None) -> sqlite3.Connection:
+    path = path or TTS_CACHE_PATH
+    if path not in _initialized:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    connection = sqlite3.connect(path, timeout=30)
+    if path not in _initialized:
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.executescript("""
+            CREATE TABLE IF NOT EXISTS entries (
+                key TEXT PRIMARY KEY,
+                size_bytes INTEGER NOT NULL,
+                synthesis_seconds REAL NOT NULL,
+                created_at REAL NOT NULL,
+                last_used REAL NOT NULL,
+                hits INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used);""")
+        _initialized.add(path)
+    return connection
+
+
+def _audio_path(key: str) -> str:
+    return os.path.join(TTS_CACHE_DIR, key[:2], f"{key}.mp3")
+
+
+def _remember(key: str, audio: bytes) -> None:
+    """
+    Put audio in the in-memory tier, evicting the least recently used entries beyond its size bound.
+    """
+    global _memory_bytes
+    with _lock:
+        if key in _memory:
+            _memory.move_to_end(key)
+            return
+        _memory[key] = audio
+        _memory_bytes += len(audio)
+        while _memory_bytes > TTS_MEMORY_CACHE_MAX_BYTES and _memory:
+            _memory_bytes -= len(_memory.popitem(last=False)[1])
+
+
+def get(key: str, path: str | None = None) -> bytes | None:
+    """
+    Look up synthesized audio, first in memory and then on disk.
+
+    Returns: the MP3 audio, or None on a miss
+    """
+    with _lock:
+        audio = _memory.get(key)
+        if audio is not None:
+            _memory.move_to_end(key)
+    if audio is None:
+        try:
+            with open(_audio_path(key), "rb") as audio_file:
+                audio = audio_file.read()
+        except FileNotFoundError:
+            with _lock:
+                _stats["misses"] += 1
+            return None
+        _remember(key, audio)
+        tier = "disk_hits"
+    else:
+        tier = "memory_hits"
+
+    with closing(_connect(path)) as connection, connection:
+        connection.execute("UPDATE entries SET last_used = ?, hits = hits + 1 WHERE key = ?", (time.time(), key))
+        row = connection.execute("SELECT synthesis_seconds FROM entries WHERE key = ?", (key,)).fetchone()
+    with _lock:
+        _stats[tier] += 1
+        _stats["seconds_saved"] += row[0] if row else 0.0
+    return audio
+
+
+def put(key: str, audio: bytes, synthesis_seconds: float, path: str | None = None) -> None:
+    """
+    Store synthesized audio in both tiers, then evict the least recently used audio on disk
+    if the cache grew beyond TTS_CACHE_MAX_BYTES.
+
+    Args:
+        key: the key from `cache_key`
+        audio: the MP3 audio
+        synthesis_seconds: how long synthesizing it took, used to report the time saved by hits
+        path: the SQLite index of the cache
+    """
+    audio_path = _audio_path(key)
+    os.makedirs(os.path.dirname(audio_path), exist_ok=True)
+    temporary_path = f"{audio_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temporary_path, "wb") as audio_file:
+        audio_file.write(audio)
+    os.replace(temporary_path, audio_path)
+    _remember(key, audio)
+
+    now = time.time()
+    with closing(_connect(path)) as connection, connection:
+        connection.execute("INSERT OR REPLACE INTO entries (key, size_bytes, synthesis_seconds, created_at, last_used) "
+                           "VALUES (?, ?, ?, ?, ?)", (key, len(audio), synthesis_seconds, now, now))
+        total = connection.execute("SELECT COALESCE(SUM(size_bytes), 0) FROM entries").fetchone()[0]
+        if total <= TTS_CACHE_MAX_BYTES:
+            return
+        # Evict down to 90% of the bound so eviction doesn't run on every insert
+        evicted, freed = [], 0
+        for old_key, size_bytes in connection.execute("SELECT key, size_bytes FROM entries ORDER BY last_used"):
+            if total - freed <= TTS_CACHE_MAX_BYTES * 0.9:
+                break
+            evicted.append(old_key)
+            freed += size_bytes
+        connection.executemany("DELETE FROM entries WHERE key = ?", [(old_key,) for old_key in evicted])
+    for old_key in evicted:
+        try:
+            os.remove(_audio_path(old_key))
+        except FileNotFoundError:
+            pass
+    print(f"🔊 Evicted {len(evicted)} cached speech clips ({freed / 1024 / 1024:.1f} MB)")
+
+
+def stats(path: str | None = None) -> Dict:
+    """
+    Return cache statistics: hits per tier, misses, hit rate and synthesis seconds saved in
+    this process, plus the size of the cache and the seconds saved over its lifetime.
+    """
+    with _lock:
+        result = dict(_stats)
+        result["memory_bytes"] = _memory_bytes
+    lookups = result["memory_hits"] + result["disk_hits"] + result["misses"]
+    result["hit_rate"] = (result["memory_hits"] + result["disk_hits"]) / lookups if lookups else 0.0
+    with closing(_connect(path)) as connection:
+        entries, disk_bytes, lifetime_seconds_saved = connection.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size_bytes), 0), COALESCE(SUM(hits * synthesis_seconds), 0) "
+            "FROM entries").fetchone()
+    result.update({"entries": entries, "disk_bytes": disk_bytes, "lifetime_seconds_saved": lifetime_seconds_saved})
+    return result
@@ -0,0 +1,126 @@
+import asyncio
+import threading
+import time
+from typing import AsyncGenerator, Dict
+
+from services.audio import speak_stream, transcribe
+from services.llm_switcher import converse, is_error_response
+
+
+class VoicePipeline:
+    """
+    One voice round trip: transcription → streaming generation → speech synthesis. The
+    generation and speech stages overlap: they are connected by a queue of deltas, so the
+    first sentence is synthesized while the rest of the answer is still being generated.
+    The answer comes from the configured provider and model (see `services.llm_switcher`).
+
+    `timings` records, in seconds:
+        transcription: transcribing the recording
+        first_token: from the question to the first generated token
+        generation: generating the whole answer
+        first_audio: from the start to the first playable audio segment (end-to-end latency)
+        synthesis: total time spent synthesizing speech, across concurrent sentences
+        total: from the start until the last audio segment is ready
+    """
+
+    def __init__(self, lang: str = "en", max_tts_concurrency: int = 3, keep_recordings: bool = False):
+        self.lang = lang
+        self.max_tts_concurrency = max_tts_concurrency
+        # Store recordings (see `services.audio.store_recording`) from the samples transcribed
+        self.keep_recordings = keep_recordings
+        self.timings: Dict[str, float] = {}
+        self.cancelled = False
+        self._loop = None
+        self._task = None
+        self._lock = threading.Lock()
+
+    def cancel(self) -> None:
+        """
+        Stop the pipeline; safe to call from any thread, e.g. when a new recording arrives.
+        """
+        with self._lock:
+            self.cancelled = True
+            if self._task is not None and not self._task.done():
+                self._loop.call_soon_threadsafe(self._task.cancel)
+
+    async def run(self, audio_data: bytes | None = None, question: str | None = None) -> AsyncGenerator[Dict, None]:
+        """
+        Answer a recorded or typed question, yielding events as each stage makes progress:
+
+            {"type": "question", "text": ...} once the question is known
+            {"type": "delta", "text": ...} for each piece of the streamed answer
+            {"type": "audio", ...} for each audio segment, in order (see `speak_stream`)
+            {"type": "done", "timings": ...} when everything is ready
+            {"type": "cancelled"} instead, if `cancel` was called
+
+        Args:
+            audio_data: the recording to transcribe
+            question: the question, if it was typed rather than recorded
+
+        Raises:
+            RuntimeError: if transcription or generation fails
+        """
+        events = asyncio.Queue()
+        deltas = asyncio.Queue()
+        start_time = time.perf_counter()
+
+        async def transcription_stage() -> str:
+            if question is not None:
+                return question
+            stage_start = time.perf_counter()
+            text = await transcribe(audio_data, keep_recording=self.keep_recordings)
+            self.timings["transcription"] = time.perf_counter() - stage_start
+            return text
+
+        async def generation_stage(text: str):
+            stage_start = time.perf_counter()
+            try:
+                async for delta in converse([{"role": "user", "content": text}]):
+                    if is_error_response(delta):
+                        raise RuntimeError(delta)
+                    self.timings.setdefault("first_token", time.perf_counter() - stage_start)
+                    events.put_nowait({"type": "delta", "text": delta})
+                    deltas.put_nowait(delta)
+            finally:
+                deltas.put_nowait(None)
+            self.timings["generation"] = time.perf_counter() - stage_start
+
+        async def queued_deltas():
+            while (delta := await deltas.get()) is not None:
+                yield delta
+
+        async def speech_stage():
+            async for segment in speak_stream(queued_deltas(), self.lang, self.max_tts_concurrency):
+                self.timings.setdefault("first_audio", time.perf_counter() - start_time)
+                self.timings["synthesis"] = self.timings.get("synthesis", 0.0) + segment["seconds"]
+                events.put_nowait({"type": "audio", **segment})
+
+        async def pipeline():
+            text = await transcription_stage()
+            events.put_nowait({"type": "question", "text": text})
+            speech = asyncio.create_task(speech_stage())
+            try:
+                await generation_stage(text)
+                await speech
+            finally:
+                speech.cancel()
+
+        with self._lock:
+            self._loop = asyncio.get_running_loop()
+            self._task = asyncio.create_task(pipeline())
+            if self.cancelled:
+                self._task.cancel()
+        self._task.add_done_callback(lambda _: events.put_nowait(None))
+        try:
+            while (event := await events.get()) is not None:
+                yield event
+            if self._task.cancelled():
+                yield {"type": "cancelled"}
+                return
+            self._task.result()  # Raise any stage's error
+            self.timings["total"] = time.perf_counter() - start_time
+            print("🎤 Voice round trip: " + ", ".join(f"{stage} {seconds:.2f}s"
+                                                     for stage, seconds in self.timings.items()))
+            yield {"type": "done", "timings": dict(self.timings)}
+        finally:
+            self._task.cancel()
@@ -0,0 +1,176 @@
+"""
+Warm up the services in the background when the server starts, so the first users don't
+pay for loading the book index, the tokenizer, the API clients and the intent model.
+
+Usage:
+    python -m services.warmup
+
+runs the warm-up in the foreground and prints how long each step took. In the app it is
+started by `serve.py` (and `args_parser.parse_args`) on a background thread; `is_ready`
+tells when it is done, and WARMUP_READY_FILE is written then for the orchestrator's
+readiness probe.
+"""
+import argparse
+import json
+import os
+import tempfile
+import threading
+import time
+from typing import Callable, Dict, List, Tuple
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Written when the warm-up is done, and removed when it starts
+WARMUP_READY_FILE = os.getenv("WARMUP_READY_FILE", os.path.join(tempfile.gettempdir(), "duckyai.ready"))
+# Book pages (as numbered in the index) to render ahead of time, e.g. "12,45,101"
+WARMUP_BOOK_PAGES = [int(page) for page in os.getenv("WARMUP_BOOK_PAGES", "").split(",") if page.strip()]
+
+_lock = threading.Lock()
+_started = False
+_ready = threading.Event()
+_status: Dict = {"started_at": None, "finished_at": None, "steps": {}}
+# Guards _status: the warm-up thread updates it while sessions and the API read it
+_status_lock = threading.Lock()
+
+
+def _warm_book_index() -> str | None:
+    from services import rag
+
+    if not os.path.exists(rag.CSV_FILE_PATH):
+        return "skipped: no embeddings file yet"
+    rag.load_index(rag.CSV_FILE_PATH)
+    return None
+
+
+def _warm_tokenizer() -> str | None:
+    from services import rag
+
+    rag.preload_tokenizer()
+    return None
+
+
+def _warm_clients() -> str | None:
+    from services import llm, llm_switcher
+
+    llm.get_client()
+    if llm_switcher.USE_GEMINI:
+        from services import gemini_llm
+        gemini_llm.get_gemini_model()
+    return None
+
+
+def _warm_intent_model() -> str | None:
+    from services import intent
+
+    intent.get_model()
+    return None
+
+
+def _warm_book_pages() -> str | None:
+    from services import rag
+
+    if not WARMUP_BOOK_PAGES:
+        return "skipped: WARMUP_BOOK_PAGES is not set"
+    for page_number in WARMUP_BOOK_PAGES:
+        rag.page_image(page_number)
+    return f"{len(WARMUP_BOOK_PAGES)} pages"
+
+
+STEPS: List[Tuple[str, Callable[[], str | None]]] = [
+    ("book_index", _warm_book_index),
+    ("tokenizer", _warm_tokenizer),
+    ("clients", _warm_clients),
+    ("intent_model", _warm_intent_model),
+    ("book_pages", _warm_book_pages),
+]
+
+
+def warm_up() -> Dict:
+    """
+    Run every warm-up step in turn. A failing step is logged and recorded, and doesn't stop
+    the others: the app still works without it, only the first request is slower.
+
+    Returns: the status, see `status`
+    """
+    with _status_lock:
+        _status["started_at"] = time.time()
+    for name, step in STEPS:
+        start = time.perf_counter()
+        try:
+            note = step()
+            error = None
+        except Exception as e:
+            note, error = None, f"{type(e).__name__}: {e}"
+        seconds = time.perf_counter() - start
+        with _status_lock:
+            _status["steps"][name] = {"seconds": seconds, "note": note, "error": error}
+        if error:
+            print(f"⚠️ Warm-up {name} failed after {seconds:.2f}s: {error}")
+        else:
+            print(f"🔥 Warm-up {name}: {seconds:.2f}s" + (f" ({note})" if note else ""))
+    with _status_lock:
+        _status["finished_at"] = time.time()
+    return status()
+
+
+def _run() -> None:
+    try:
+        warm_up()
+    finally:
+        _ready.set()
+        try:
+            with open(WARMUP_READY_FILE, "w") as ready_file:
+                json.dump(status(), ready_file)
+        except OSError as e:
+            print(f"⚠️ Could not write {WARMUP_READY_FILE}: {e}")
+        print(f"✅ Warm-up done in {_status['finished_at'] - _status['started_at']:.2f}s")
+
+
+def start() -> bool:
+    """
+    Start the warm-up on a background thread, once per process.
+
+    Returns: True if this call started it
+    """
+    global _started
+    with _lock:
+        if _started:
+            return False
+        _started = True
+    try:
+        os.remove(WARMUP_READY_FILE)
+    except FileNotFoundError:
+        pass
+    threading.Thread(target=_run, name="warmup", daemon=True).start()
+    return True
+
+
+def is_ready() -> bool:
+    """
+    Return True once the warm-up has finished (whether or not every step succeeded).
+    """
+    return _ready.is_set()
+
+
+def status() -> Dict:
+    """
+    Return the warm-up status: `ready`, `started_at` and `finished_at` timestamps, and the
+    `seconds`, `note` and `error` of each step that has run.
+    """
+    with _status_lock:
+        return {"ready": _ready.is_set(), "started_at": _status["started_at"], "finished_at": _status["finished_at"],
+                "steps": {name: dict(step) for name, step in _status["steps"].items()}}
+
+
+def main():
+    argparse.ArgumentParser(description="Warm up the services in the foreground and time each step.").parse_args()
+    result = warm_up()
+    total = result["finished_at"] - result["started_at"]
+    failed = [name for name, step in result["steps"].items() if step["error"]]
+    print(f"Warm-up took {total:.2f}s" + (f", failed: {', '.join(failed)}" if failed else ""))
+
+
+if __name__ == "__main__":
+    main()
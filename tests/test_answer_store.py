@@ -0,0 +1,84 @@
+import asyncio
+import sqlite3
+import time
+
+import pytest
+
+from services import answer_store, learning
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    path = str(tmp_path / "answers.sqlite3")
+    monkeypatch.setattr(answer_store, "ANSWER_STORE_PATH", path)
+    return path
+
+
+def test_normalized_keys_share_an_answer(store):
+    answer_store.save_answer("learning", "What is  DRY?", "adult|article", "Don't repeat yourself", "v1")
+    stored = answer_store.get_answer("learning", "what is dry", "adult|article", "v1")
+    assert stored["answer"] == "Don't repeat yourself"
+    assert stored["question"] == "What is  DRY?"
+    assert answer_store.get_answer("learning", "what is dry", "adult|notes", "v1") is None
+
+
+def test_other_versions_and_old_answers_are_missing(store):
+    answer_store.save_answer("learning", "topic", "variant", "answer", "v1")
+    assert answer_store.get_answer("learning", "topic", "variant", "v2") is None
+    assert answer_store.get_answer("learning", "topic", "variant", "v1", max_age_seconds=60) is not None
+    with sqlite3.connect(store) as connection:
+        connection.execute("UPDATE answers SET created_at = ?", (time.time() - 120,))
+    assert answer_store.get_answer("learning", "topic", "variant", "v1", max_age_seconds=60) is None
+
+
+def test_unpinned_answers_are_bounded_and_pinned_ones_kept(store):
+    answer_store.save_answer("learning", "popular", "v", "precomputed", "1", pinned=True)
+    for i in range(5):
+        answer_store.save_answer("learning", f"typed {i}", "v", "answer", "1", max_unpinned=3)
+    assert answer_store.get_answer("learning", "popular", "v", "1") is not None
+    kept = [i for i in range(5) if answer_store.get_answer("learning", f"typed {i}", "v", "1")]
+    assert kept == [2, 3, 4]
+    # Saving a pinned answer again without pinning keeps it pinned
+    answer_store.save_answer("learning", "popular", "v", "refreshed", "1", max_unpinned=0)
+    assert answer_store.get_answer("learning", "popular", "v", "1")["answer"] == "refreshed"
+
+
+def test_stores_without_the_pinned_column_are_migrated(tmp_path):
+    path = str(tmp_path / "old.sqlite3")
+    with sqlite3.connect(path) as connection:
+        connection.execute("CREATE TABLE answers (kind TEXT NOT NULL, key TEXT NOT NULL, variant TEXT NOT NULL, "
+                           "question TEXT NOT NULL, answer TEXT NOT NULL, version TEXT NOT NULL, "
+                           "created_at REAL NOT NULL, PRIMARY KEY (kind, key, variant))")
+    answer_store.save_answer("learning", "topic", "v", "answer", "1", max_unpinned=10, path=path)
+    assert answer_store.get_answer("learning", "topic", "v", "1", path=path)["answer"] == "answer"
+
+
+def _fake_converse(deltas):
+    async def converse(messages):
+        for delta in deltas:
+            yield delta
+    return converse
+
+
+async def _collect(stream):
+    return [delta async for delta in stream]
+
+
+@pytest.mark.parametrize("deltas, saved", [
+    (["Some ", "notes"], True),
+    (["Some ", "⏰ RATE LIMIT: Please wait"], False),
+    (["Some ", "EXCEPTION boom", " more"], False),
+    (["oaiEXCEPTION boom"], False),
+])
+def test_stream_answer_only_stores_complete_answers(store, monkeypatch, deltas, saved):
+    monkeypatch.setattr(learning, "converse", _fake_converse(deltas))
+    streamed = asyncio.run(_collect(learning.stream_answer("adult", "article", "testing")))
+    assert streamed == deltas
+    cached = learning.get_cached_answer("adult", "article", "testing")
+    assert cached == ("".join(deltas) if saved else None)
+
+
+def test_stream_answer_skips_blank_topics(store, monkeypatch):
+    monkeypatch.setattr(learning, "converse", _fake_converse(["answer"]))
+    asyncio.run(_collect(learning.stream_answer("adult", "article", "  ")))
+    assert learning.get_cached_answer("adult", "article", "  ") is None
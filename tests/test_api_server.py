@@ -0,0 +1,67 @@
+import asyncio
+import json
+
+import pytest
+import tornado.httpclient
+import tornado.testing
+
+from services import api_server
+
+
+async def _requests(monkeypatch, headers_list):
+    """
+    Start the API, hold every chat request open, and return the status of a chat request
+    sent with each of `headers_list` while the earlier ones are still in progress.
+    """
+    release = asyncio.Event()
+
+    async def converse(messages):
+        await release.wait()
+        yield "answer"
+    monkeypatch.setattr(api_server, "converse", converse)
+    sock, port = tornado.testing.bind_unused_port()
+    server = api_server.make_server()
+    server.add_sockets([sock])
+    client = tornado.httpclient.AsyncHTTPClient(force_instance=True, max_clients=len(headers_list))
+    body = json.dumps({"prompt": "hi", "stream": False})
+    pending = []
+    statuses = []
+    try:
+        for headers in headers_list:
+            pending.append(asyncio.ensure_future(client.fetch(f"http://127.0.0.1:{port}/api/chat", method="POST",
+                                                              body=body, headers=headers, raise_error=False)))
+            await asyncio.sleep(0.05)
+        release.set()
+        statuses = [response.code for response in await asyncio.gather(*pending)]
+    finally:
+        client.close()
+        server.stop()
+    return statuses
+
+
+@pytest.fixture
+def limits(monkeypatch):
+    monkeypatch.setattr(api_server, "API_MAX_REQUESTS_PER_CLIENT", 2)
+    monkeypatch.setattr(api_server, "API_KEY", None)
+    monkeypatch.setattr(api_server.prompts, "quick_chat_system_prompt", lambda: "system")
+
+
+def test_per_client_limit_uses_the_forwarded_address(monkeypatch, limits):
+    monkeypatch.setattr(api_server, "API_TRUST_PROXY_HEADERS", True)
+    first, second = {"X-Forwarded-For": "10.0.0.1"}, {"X-Forwarded-For": "10.0.0.2"}
+    statuses = asyncio.run(_requests(monkeypatch, [first, first, first, second, second]))
+    assert statuses == [200, 200, 429, 200, 200]
+    assert api_server._ApiHandler.active == 0 and not api_server._ApiHandler.active_by_client
+
+
+def test_forwarded_address_is_ignored_unless_trusted(monkeypatch, limits):
+    monkeypatch.setattr(api_server, "API_TRUST_PROXY_HEADERS", False)
+    statuses = asyncio.run(_requests(monkeypatch, [{"X-Forwarded-For": f"10.0.0.{i}"} for i in range(3)]))
+    assert statuses == [200, 200, 429]
+
+
+def test_per_client_limit_can_use_a_client_header(monkeypatch, limits):
+    monkeypatch.setattr(api_server, "API_CLIENT_HEADER", "X-Client-Id")
+    statuses = asyncio.run(_requests(monkeypatch, [{"X-Client-Id": "a"}, {"X-Client-Id": "a"}, {"X-Client-Id": "a"},
+                                                   {"X-Client-Id": "b"}]))
+    assert statuses == [200, 200, 429, 200]
@@ -0,0 +1,109 @@
+import asyncio
+import os
+import time
+
+import numpy as np
+import pytest
+
+from services import answer_store, audio
+
+
+def _tone_with_silence(seconds=1.0, rate=audio.TARGET_SAMPLE_RATE):
+    t = np.arange(int(seconds * rate)) / rate
+    tone = (8000 * np.sin(2 * np.pi * 440 * t)).astype(np.int16)
+    silence = np.zeros(int(0.5 * rate), dtype=np.int16)
+    return np.concatenate([silence, tone, silence]).reshape(-1, 1)
+
+
+@pytest.fixture
+def recordings(tmp_path, monkeypatch):
+    monkeypatch.setattr(answer_store, "ANSWER_STORE_PATH", str(tmp_path / "answers.sqlite3"))
+    monkeypatch.setattr(audio, "AUDIO_DIR", str(tmp_path / "audio"))
+    monkeypatch.setattr(audio, "FFMPEG", None)
+    return tmp_path / "audio"
+
+
+def test_preprocess_trims_silence():
+    samples, rate = audio.preprocess_audio(audio.encode_wav(_tone_with_silence(), audio.TARGET_SAMPLE_RATE))
+    assert rate == audio.TARGET_SAMPLE_RATE
+    assert samples.shape[1] == 1
+    assert len(samples) < 1.6 * rate
+
+
+def test_transcribe_preprocesses_once_and_keeps_the_recording(recordings, monkeypatch):
+    calls = []
+    preprocess = audio.preprocess_audio
+    monkeypatch.setattr(audio, "preprocess_audio", lambda data: calls.append(1) or preprocess(data))
+    monkeypatch.setattr(audio.llm, "get_async_client", lambda: None)
+
+    async def transcribe_segment(client, data, filename):
+        return "hello"
+    monkeypatch.setattr(audio, "_transcribe_segment", transcribe_segment)
+
+    wav = audio.encode_wav(_tone_with_silence(), audio.TARGET_SAMPLE_RATE)
+    assert asyncio.run(audio.transcribe(wav, keep_recording=True)) == "hello"
+    assert calls == [1]
+    for _ in range(100):
+        if recordings.exists() and os.listdir(recordings):
+            break
+        time.sleep(0.05)
+    assert [name.endswith(".wav") for name in os.listdir(recordings)] == [True]
+
+
+def test_transcript_cache_keeps_the_most_recent_entries(recordings, monkeypatch):
+    monkeypatch.setattr(audio, "TRANSCRIPT_CACHE_MAX_ENTRIES", 1)
+    monkeypatch.setattr(audio.llm, "get_async_client", lambda: None)
+    texts = iter(["first", "second", "first again"])
+
+    async def transcribe_segment(client, data, filename):
+        return next(texts)
+    monkeypatch.setattr(audio, "_transcribe_segment", transcribe_segment)
+
+    first, second = (audio.encode_wav(_tone_with_silence(seconds), audio.TARGET_SAMPLE_RATE) for seconds in (1.0, 1.2))
+    assert asyncio.run(audio.transcribe(first)) == "first"
+    assert asyncio.run(audio.transcribe(second)) == "second"
+    assert asyncio.run(audio.transcribe(second)) == "second"
+    assert asyncio.run(audio.transcribe(first)) == "first again"
+
+
+RESPONSE = ("Sure! Here is the idea, e.g. a cache. It **helps** a lot.\n\n"
+            "```python\nx = 1. y = 2.\n```\nThat's all, folks. Done")
+
+
+def _sentences(deltas):
+    splitter = audio.SentenceSplitter()
+    return [sentence for delta in deltas for sentence in splitter.feed(delta)] + splitter.finish()
+
+
+def test_sentences_skip_code_and_markup_and_keep_abbreviations():
+    assert _sentences([RESPONSE]) == ["Sure! Here is the idea, e.g. a cache.", "It helps a lot.",
+                                      "That's all, folks. Done"]
+
+
+def test_same_sentences_for_any_delta_split():
+    expected = _sentences([RESPONSE])
+    assert _sentences(list(RESPONSE)) == expected
+    for cut in range(1, len(RESPONSE)):
+        assert _sentences([RESPONSE[:cut], RESPONSE[cut:]]) == expected, cut
+
+
+def test_sentences_are_emitted_as_soon_as_they_end():
+    splitter = audio.SentenceSplitter(min_chars=5)
+    assert splitter.feed("First sentence. Sec") == ["First sentence."]
+    assert splitter.feed("ond one") == []
+    assert splitter.finish() == ["Second one"]
+
+
+def test_long_recordings_are_split_in_pauses():
+    rate = audio.TARGET_SAMPLE_RATE
+    t = np.arange(4 * rate) / rate
+    speech = (8000 * np.sin(2 * np.pi * 440 * t)).astype(np.int16)
+    pause = np.zeros(rate // 2, dtype=np.int16)
+    samples = np.concatenate([speech, pause, speech, pause, speech]).reshape(-1, 1)
+    segments = audio.split_on_silence(samples, rate, max_segment_seconds=6, min_segment_seconds=2)
+    assert segments[0][0] == 0 and segments[-1][1] == len(samples)
+    assert all(end == next_start for (_, end), (next_start, _) in zip(segments, segments[1:]))
+    # Every cut is inside a pause, never in the middle of speech
+    for _, end in segments[:-1]:
+        assert not samples[end - 100:end + 100].any()
+    assert max(end - start for start, end in segments) <= 6 * rate
@@ -0,0 +1,60 @@
+import asyncio
+
+import helpers.util
+from services import code_review
+from services.code_review import _pack_units, merge_findings, parse_findings, split_code
+
+CHUNK = {"name": "def f", "start_line": 41, "end_line": 60}
+
+
+def test_findings_are_mapped_to_file_lines():
+    findings = parse_findings("L45: off by one\nLine 3-4: chunk-relative range\n- L50 - L52: range", CHUNK)
+    assert [(f["line"], f["end_line"]) for f in findings] == [(45, 45), (43, 44), (50, 52)]
+    assert {f["chunk"] for f in findings} == {"def f"}
+
+
+def test_findings_outside_the_chunk_are_dropped_and_ranges_clamped():
+    findings = parse_findings("L75: past the end\nL30: before the start\nL58-70: runs past the end", CHUNK)
+    assert [(f["line"], f["end_line"]) for f in findings] == [(58, 60)]
+    # A response whose findings were all dropped isn't kept as an unlocated finding
+    assert parse_findings("L75: past the end", CHUNK) == []
+
+
+def test_unnumbered_responses_are_kept_unless_there_are_no_findings():
+    assert parse_findings("No findings.", CHUNK) == []
+    assert parse_findings("Looks risky overall", CHUNK) == [
+        {"line": None, "end_line": None, "message": "Looks risky overall", "chunk": "def f"}]
+
+
+def test_chunk_names_match_their_ranges():
+    units = [(5, 8, "lines 5-8"), (10, 20, "lines 10-20"), (22, 25, "lines 22-25")]
+    chunks = _pack_units(units, ["x"] * 30, 10)
+    assert [(c["name"], c["start_line"], c["end_line"]) for c in chunks] == [
+        ("lines 1-8", 1, 8), ("lines 9-20", 9, 20), ("lines 21-30", 21, 30)]
+
+
+def test_python_chunks_cover_the_file_and_are_named_after_their_definitions():
+    code = "import os\n\n\ndef f():\n    return os.sep\n\n\nclass C:\n    pass\n"
+    chunks = split_code(code, max_lines=3)
+    assert [c["name"] for c in chunks] == ["module", "def f", "class C"]
+    assert [(c["start_line"], c["end_line"]) for c in chunks] == [(1, 1), (2, 5), (6, 9)]
+    assert "import os" in chunks[1]["context"]
+
+
+def test_merge_findings_orders_by_line_and_drops_duplicates():
+    first = {"findings": [{"line": 9, "message": "a"}, {"line": None, "message": "general"}]}
+    second = {"findings": [{"line": 2, "message": "b"}, {"line": 9, "message": "a"}]}
+    assert [f["line"] for f in merge_findings([first, second])] == [2, 9, None]
+
+
+def test_review_helper_splits_the_file_once(monkeypatch):
+    calls = []
+    monkeypatch.setattr(code_review, "split_code", lambda *args: calls.append(1) or split_code(*args))
+
+    async def converse(messages):
+        yield "L2: unused variable"
+    monkeypatch.setattr(code_review, "converse", converse)
+
+    review = asyncio.run(helpers.util.review_code("def f():\n    x = 1\n    return 2\n", "python"))
+    assert calls == [1]
+    assert "Line 2" in review
@@ -0,0 +1,85 @@
+import itertools
+
+import pytest
+
+from services.extract import FencedBlockParser, extract_delimited_content
+
+RESPONSE = ("Here is the fix:\n"
+            "```python\n"
+            "x = 1  # ```\n"
+            "print('Use the ```python fence')\n"
+            "```\n"
+            "Use the ```python\n"
+            "fence inline.\n"
+            "~~~\n"
+            "tilde\n"
+            "~~~\n")
+
+
+def _parse(deltas):
+    parser = FencedBlockParser()
+    events = [event for delta in deltas for event in parser.feed(delta)] + parser.finish()
+    text = "".join(event["text"] for event in events if event["type"] == "text")
+    closes = [(event["label"], event["code"], event["terminated"]) for event in events if event["type"] == "close"]
+    return text, closes
+
+
+def _splits(text, size):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+EXPECTED = _parse([RESPONSE])
+
+
+def test_whole_response():
+    text, closes = EXPECTED
+    assert closes == [("python", "x = 1  # ```\nprint('Use the ```python fence')", True), ("", "tilde", True)]
+    assert text == "Here is the fix:\nUse the ```python\nfence inline.\n"
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 5, 7, 13])
+def test_same_events_for_any_delta_size(size):
+    assert _parse(_splits(RESPONSE, size)) == EXPECTED
+
+
+def test_same_events_for_every_two_way_split():
+    for cut in range(1, len(RESPONSE)):
+        assert _parse([RESPONSE[:cut], RESPONSE[cut:]]) == EXPECTED, cut
+
+
+def test_fence_after_a_flushed_partial_line_is_not_a_fence():
+    text, closes = _parse(["```\n", "    x = 1 # ", "```\n", "y\n", "```\n"])
+    assert closes == [("", "    x = 1 # ```\ny", True)]
+    assert text == ""
+
+
+def test_fence_in_the_middle_of_a_line_does_not_open_a_block():
+    text, closes = _parse(["Use the ", "```python\n", "x\n"])
+    assert closes == []
+    assert text == "Use the ```python\nx\n"
+
+
+def test_unterminated_block_is_closed_by_finish():
+    for deltas in (["```sh\nls\n"], list("```sh\nls\n")):
+        assert _parse(deltas)[1] == [("sh", "ls", False)]
+
+
+def test_nested_labelled_fence():
+    response = "```markdown\n# Example\n```python\nx\n```\n```\nafter\n"
+    for size in (1, 4, len(response)):
+        text, closes = _parse(_splits(response, size))
+        assert closes == [("markdown", "# Example\n```python\nx\n```", True)]
+        assert text == "after\n"
+
+
+def test_code_events_stream_before_the_block_closes():
+    parser = FencedBlockParser()
+    events = list(itertools.chain(parser.feed("```py\n"), parser.feed("a = 1\n"), parser.feed("b = ")))
+    assert [event["type"] for event in events] == ["open", "code", "code"]
+    assert "".join(event["text"] for event in events if event["type"] == "code") == "a = 1\nb = "
+
+
+def test_extract_delimited_content():
+    assert extract_delimited_content("x\n```diff\n-a\n+b\n```\n") == "-a\n+b"
+    assert extract_delimited_content("no diff") is None
+    assert extract_delimited_content("no diff", return_response_on_failure=True) == "no diff"
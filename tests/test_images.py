@@ -0,0 +1,108 @@
+import io
+import os
+
+import pytest
+from PIL import Image
+
+from services import image_index, images, thumbnails
+
+
+def _png(color="red") -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (600, 300), color).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def gallery(tmp_path, monkeypatch):
+    folder = str(tmp_path / "images")
+    monkeypatch.setattr(images, "__IMAGES_BASE_FOLDER", folder)
+    monkeypatch.setattr(image_index, "IMAGE_INDEX_PATH", str(tmp_path / "manifest.sqlite3"))
+    monkeypatch.setattr(thumbnails, "THUMBNAIL_DIR", str(tmp_path / "thumbnails"))
+    monkeypatch.setattr(thumbnails, "_failed", set())
+    monkeypatch.setattr(thumbnails, "_backfill_started", {})
+    monkeypatch.setattr(thumbnails, "start_backfill", lambda folder: started.append(folder) or True)
+    started = []
+    return folder, started
+
+
+def test_saved_images_get_thumbnails_and_are_indexed(gallery):
+    folder, started = gallery
+    image_path, content_hash = images._save_image(_png(), "a red square", "key")
+    for size, pixels in thumbnails.THUMBNAIL_SIZES.items():
+        with Image.open(thumbnails.thumbnail_path(content_hash, size)) as thumbnail:
+            assert max(thumbnail.size) == pixels
+    rows, total = images.get_images_page()
+    assert total == 1
+    assert (rows[0]["Image"], rows[0]["Description"], rows[0]["Hash"]) == (image_path, "a red square", content_hash)
+    assert rows[0]["Thumbnail"] and not rows[0]["Thumbnail Failed"]
+    assert started == []
+    assert images._find_existing("key") == (image_path, thumbnails.thumbnail_path(content_hash, "medium"))
+
+
+def test_image_is_kept_when_thumbnails_fail(gallery, monkeypatch):
+    folder, started = gallery
+
+    def fail(image_bytes, image_hash=None):
+        raise OSError("disk full")
+    monkeypatch.setattr(thumbnails, "create_thumbnails", fail)
+    image_bytes = _png()
+    image_path, content_hash = images._save_image(image_bytes, "a red square", "key")
+    with open(image_path, "rb") as image_file:
+        assert image_file.read() == image_bytes
+    assert content_hash == thumbnails.content_hash(image_bytes)
+    assert thumbnails.has_failed(os.path.basename(image_path))
+    # Previews fall back to the image itself, and the failure doesn't start a backfill on every page view
+    assert images._preview_path(image_path, content_hash) == image_path
+    assert images._find_existing("key") == (image_path, image_path)
+    rows, _ = images.get_images_page()
+    assert rows[0]["Thumbnail"] is None and rows[0]["Thumbnail Failed"]
+    assert started == []
+
+
+def test_missing_thumbnails_start_a_backfill(gallery):
+    folder, started = gallery
+    image_path, content_hash = images._save_image(_png(), "a red square")
+    thumbnails.remove_thumbnails(content_hash)
+    rows, _ = images.get_images_page()
+    assert rows[0]["Thumbnail"] is None and not rows[0]["Thumbnail Failed"]
+    assert started == [folder]
+
+
+def test_backfill_is_not_restarted_within_the_interval(tmp_path, monkeypatch):
+    monkeypatch.setattr(thumbnails, "_backfill_started", {})
+    monkeypatch.setattr(thumbnails, "_run_backfill", lambda folder: None)
+    assert thumbnails.start_backfill(str(tmp_path))
+    thumbnails._backfill_thread.join()
+    assert not thumbnails.start_backfill(str(tmp_path))
+    monkeypatch.setattr(thumbnails, "BACKFILL_INTERVAL_SECONDS", 0)
+    assert thumbnails.start_backfill(str(tmp_path))
+    thumbnails._backfill_thread.join()
+
+
+def test_index_reconciles_with_the_folder(gallery):
+    folder, _ = gallery
+    os.makedirs(folder)
+    with open(os.path.join(folder, "outside.png"), "wb") as image_file:
+        image_file.write(_png("blue"))
+    with open(os.path.join(folder, "outside.txt"), "w") as description_file:
+        description_file.write("added by hand")
+    assert image_index.reconcile(folder, force=True) == (1, 0)
+    rows, total = image_index.query_images(folder, search="BY HAND")
+    assert total == 1 and rows[0]["Hash"] is None
+    os.remove(os.path.join(folder, "outside.png"))
+    assert image_index.reconcile(folder, force=True) == (0, 1)
+    assert image_index.query_images(folder)[1] == 0
+
+
+def test_reconcile_tracks_each_folder_separately(gallery, tmp_path):
+    first, second = str(tmp_path / "first"), str(tmp_path / "second")
+    os.makedirs(first)
+    os.makedirs(second)
+    with open(os.path.join(second, "outside.png"), "wb") as image_file:
+        image_file.write(_png())
+    for folder in (first, second):
+        os.utime(folder, ns=(1_000_000_000, 1_000_000_000))
+    assert image_index.reconcile(first) == (0, 0)
+    assert image_index.reconcile(second) == (1, 0)
+    assert image_index.reconcile(second) == (0, 0)
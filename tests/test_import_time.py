@@ -0,0 +1,14 @@
+import subprocess
+import sys
+
+import pytest
+
+from benchmarks import import_time
+
+pytest.importorskip("streamlit", reason="the pages' import times are measured on top of streamlit")
+
+
+def test_pages_stay_within_their_import_budgets():
+    result = subprocess.run([sys.executable, "-m", "benchmarks.import_time", "--check"], cwd=import_time.ROOT,
+                            capture_output=True, text=True)
+    assert result.returncode == 0, result.stdout[-3000:] + result.stderr[-3000:]
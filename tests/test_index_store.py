@@ -0,0 +1,53 @@
+import os
+
+import numpy as np
+import pytest
+
+from services import index_store
+
+METADATA = {"embedding_model": "model", "dimensions": 2, "reduction": "api"}
+
+
+def _chunks(texts):
+    return [{"document_name": "book.pdf", "page_number": page, "context": text, "embedding": [3.0, 4.0 * page]}
+            for page, text in enumerate(texts, start=1)]
+
+
+def test_published_version_maps_the_chunks(tmp_path):
+    version_dir = index_store.publish(str(tmp_path), _chunks(["first", "ünïcode", ""]), METADATA)
+    assert index_store.current_version(str(tmp_path)) == os.path.realpath(version_dir)
+    version = index_store.open_version(version_dir)
+    assert isinstance(version["vectors"], np.memmap)
+    assert np.allclose(np.linalg.norm(version["vectors"], axis=1), 1)
+    assert version["metadata"]["chunks"] == 3 and version["metadata"]["embedding_model"] == "model"
+    assert version["projection"] is None
+    chunks = version["embeddings"]
+    assert len(chunks) == 3
+    assert [chunk["context"] for chunk in chunks] == ["first", "ünïcode", ""]
+    assert chunks[1] == {"document_name": "book.pdf", "page_number": 2, "context": "ünïcode"}
+    assert [chunk["page_number"] for chunk in chunks[1:]] == [2, 3]
+
+
+def test_projection_is_stored_with_the_version(tmp_path):
+    projection = (np.zeros(4, dtype=np.float32), np.eye(2, 4, dtype=np.float32))
+    version = index_store.open_version(index_store.publish(str(tmp_path), _chunks(["a"]), METADATA, projection))
+    assert np.array_equal(version["projection"][1], projection[1])
+
+
+def test_publishing_switches_current_and_keeps_recent_versions(tmp_path, monkeypatch):
+    monkeypatch.setattr(index_store, "KEEP_VERSIONS", 1)
+    first = index_store.publish(str(tmp_path), _chunks(["one"]), METADATA)
+    opened = index_store.open_version(first)
+    second = index_store.publish(str(tmp_path), _chunks(["two"]), METADATA)
+    third = index_store.publish(str(tmp_path), _chunks(["three"]), METADATA)
+    assert len({first, second, third}) == 3
+    assert index_store.current_version(str(tmp_path)) == os.path.realpath(third)
+    assert sorted(name for name in os.listdir(tmp_path) if name.startswith("v")) == [
+        os.path.basename(second), os.path.basename(third)]
+    # A process that still maps a removed version keeps reading it
+    assert opened["embeddings"][0]["context"] == "one"
+
+
+def test_directory_without_a_version(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        index_store.current_version(str(tmp_path))
@@ -0,0 +1,34 @@
+import pytest
+
+from services import intent
+
+
+@pytest.mark.parametrize("request_text, label", [
+    ("Traceback (most recent call last):\n  File 'x.py'\nKeyError: 'a'", "debug"),
+    ("Why does my app crash on startup?", "debug"),
+    ("Please review this function for code smells", "review"),
+    ("Rename the variable x to count", "modify"),
+    ("Refactor this class", "modify"),
+    ("What is a monad?", None),
+    # Rules for two labels: left to the model
+    ("Review why this crashes", None),
+])
+def test_rules(request_text, label):
+    assert intent.classify_by_rules(request_text) == label
+
+
+@pytest.mark.parametrize("response, label", [
+    ("Modify", "modify"), (" the intent is DEBUG.", "debug"), ("reviewing", "misc"), ("", "misc")])
+def test_normalize_label(response, label):
+    assert intent.normalize_label(response) == label
+
+
+def test_bundled_examples_train_a_model_for_every_label():
+    examples = intent.load_examples()
+    assert {label for _, label in examples} == set(intent.INTENT_LABELS)
+    model = intent.train_model(examples)
+    label, confidence, source = intent.classify_locally("What is the difference between a list and a tuple", model)
+    assert label in intent.INTENT_LABELS and 0 < confidence <= 1 and source == "model"
+    assert intent.classify_locally("Please review this", model) == ("review", intent.RULE_CONFIDENCE, "rules")
+    correct = sum(intent.classify_locally(text, model)[0] == label for text, label in examples)
+    assert correct / len(examples) >= 0.9
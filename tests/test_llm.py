@@ -0,0 +1,22 @@
+import asyncio
+
+from services import llm, registry
+
+
+async def _two_clients():
+    return llm.get_async_client(), llm.get_async_client()
+
+
+def test_async_client_is_shared_per_event_loop(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    registry.invalidate("openai_async_clients")
+    finished_loop, idle_loop = asyncio.new_event_loop(), asyncio.new_event_loop()
+    first, again = finished_loop.run_until_complete(_two_clients())
+    finished_loop.close()
+    other, _ = idle_loop.run_until_complete(_two_clients())
+    assert first is again
+    assert other is not first
+
+    registry.invalidate("openai_async_clients")
+    assert first.is_closed() and other.is_closed()
+    idle_loop.close()
@@ -0,0 +1,68 @@
+import pytest
+
+from services.patch import PatchError, apply_patch, parse_unified_diff
+
+ORIGINAL = "def f():\n    a = 1\n    b = 2\n    return a + b\n"
+
+
+def test_exact_hunk():
+    diff = "--- a/f.py\n+++ b/f.py\n@@ -2,2 +2,2 @@\n     a = 1\n-    b = 2\n+    b = 3\n"
+    assert apply_patch(ORIGINAL, diff) == ORIGINAL.replace("b = 2", "b = 3")
+
+
+def test_wrong_line_numbers_and_missing_headers():
+    diff = "@@ -40,3 +40,3 @@\n     a = 1\n-    b = 2\n+    b = 3\n     return a + b\n"
+    assert apply_patch(ORIGINAL, diff) == ORIGINAL.replace("b = 2", "b = 3")
+    diff = "@@ @@\n     a = 1\n-    b = 2\n+    b = 3\n"
+    assert apply_patch(ORIGINAL, diff) == ORIGINAL.replace("b = 2", "b = 3")
+
+
+def test_context_lines_that_lost_their_leading_space():
+    diff = "@@ -2,2 +2,2 @@\n    a = 1\n-    b = 2\n+    b = 3\n"
+    assert apply_patch(ORIGINAL, diff) == ORIGINAL.replace("b = 2", "b = 3")
+
+
+def test_whitespace_insensitive_match():
+    diff = "@@ -2,2 +2,2 @@\n  a = 1\n-  b = 2\n+    b = 3\n"
+    assert apply_patch(ORIGINAL, diff) == ORIGINAL.replace("b = 2", "b = 3")
+
+
+def test_fuzz_drops_wrong_context():
+    diff = "@@ -2,3 +2,3 @@\n     a = 1\n-    b = 2\n+    b = 3\n     return a - b\n"
+    assert apply_patch(ORIGINAL, diff) == ORIGINAL.replace("b = 2", "b = 3")
+    with pytest.raises(PatchError):
+        apply_patch(ORIGINAL, diff, max_fuzz=0)
+
+
+@pytest.mark.parametrize("diff, expected", [
+    ("@@ -2,0 +3,1 @@\n+c\n", "a\nb\nc\n"),
+    ("@@ -1,0 +2,1 @@\n+c\n", "a\nc\nb\n"),
+    ("@@ -0,0 +1,1 @@\n+c\n", "c\na\nb\n"),
+])
+def test_pure_insertion_goes_after_the_anchor_line(diff, expected):
+    assert apply_patch("a\nb\n", diff) == expected
+
+
+def test_pure_insertion_after_an_earlier_hunk():
+    diff = "@@ -1,1 +1,2 @@\n a\n+a2\n@@ -2,0 +4,1 @@\n+c\n"
+    assert apply_patch("a\nb\n", diff) == "a\na2\nb\nc\n"
+
+
+def test_several_hunks_and_trailing_newline():
+    original = "".join(f"line {i}\n" for i in range(1, 11))
+    diff = "@@ -2,1 +2,1 @@\n-line 2\n+two\n@@ -9,1 +9,1 @@\n-line 9\n+nine\n"
+    patched = apply_patch(original, diff)
+    assert patched == original.replace("line 2\n", "two\n").replace("line 9\n", "nine\n")
+    assert apply_patch("a\nb", "@@ -2,1 +2,1 @@\n-b\n+c\n") == "a\nc"
+
+
+def test_unparseable_and_unappliable_diffs():
+    with pytest.raises(PatchError):
+        parse_unified_diff("no hunks here")
+    with pytest.raises(PatchError):
+        apply_patch(ORIGINAL, "@@ -1,1 +1,1 @@\n-missing line\n+x\n")
+
+
+def test_parse_records_header_counts():
+    hunk, = parse_unified_diff("@@ -3,0 +4,2 @@\n+x\n+y\n")
+    assert (hunk["old_start"], hunk["old_count"], hunk["before"], hunk["after"]) == (3, 0, [], ["x", "y"])
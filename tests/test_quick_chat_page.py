@@ -0,0 +1,33 @@
+import io
+
+import pytest
+
+pytest.importorskip("streamlit")
+from PIL import Image  # noqa: E402
+from streamlit.testing.v1 import AppTest  # noqa: E402
+
+import services.rag  # noqa: E402
+
+
+def _png() -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (4, 4)).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def test_history_evidence_pages_render_only_when_shown(monkeypatch):
+    rendered = []
+    monkeypatch.setattr(services.rag, "page_image", lambda page_number: rendered.append(page_number) or _png())
+    app = AppTest.from_file("../pages/1_💬_Quick_Chat.py")
+    app.session_state.messages = [{"role": "system", "content": "system"}] + [
+        message for page_number in (3, 7) for message in (
+            {"role": "user", "content": "question"}, {"role": "assistant", "content": "answer"},
+            {"role": "evidence", "content": f"Page Number: {page_number}", "page_number": page_number})]
+    app.run(timeout=30)
+    assert not app.exception
+    assert [toggle.label for toggle in app.toggle] == ["Show page 3", "Show page 7"]
+    assert rendered == [] and len(app.get("imgs")) == 0
+
+    app.toggle[1].set_value(True).run(timeout=30)
+    assert not app.exception
+    assert rendered == [7] and len(app.get("imgs")) == 1
@@ -0,0 +1,32 @@
+import asyncio
+
+import numpy as np
+
+from services import rag, rag_batch
+
+
+def _index(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    return {"vectors": vectors / np.linalg.norm(vectors, axis=1, keepdims=True),
+            "metadata": {"embedding_model": "model", "dimensions": None, "reduction": None}}
+
+
+def test_no_questions_give_an_empty_summary(monkeypatch):
+    monkeypatch.setattr(rag_batch.services.llm, "get_client", lambda: (_ for _ in ()).throw(AssertionError))
+    summary = asyncio.run(rag_batch.ask_book_many([]))
+    assert (summary["questions"], summary["answered"], summary["failed"], summary["results"]) == (0, 0, 0, [])
+
+
+def test_no_queries_embed_and_search_to_empty_arrays():
+    index = _index([[1, 0, 0], [0, 1, 0]])
+    embeddings = asyncio.run(rag.embed_queries(None, [], index=index))
+    assert embeddings.shape == (0, 3)
+    best, similarities = rag.search_many(index, embeddings)
+    assert best.shape == similarities.shape == (0,)
+
+
+def test_search_many_finds_the_most_similar_chunk():
+    index = _index([[1, 0, 0], [0, 1, 0], [0, 0, 1]])
+    best, similarities = rag.search_many(index, np.array([[0, 2.0, 0.1], [0.1, 0, -3.0], [5.0, 0, 0]]))
+    assert best.tolist() == [1, 0, 0]
+    assert np.isclose(similarities[2], 1.0)
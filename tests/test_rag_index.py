@@ -0,0 +1,80 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from services import rag, registry
+
+DIMENSIONS = 4
+
+
+@pytest.fixture
+def full_index(tmp_path):
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(12, 16))
+    path = str(tmp_path / "book.embeddings.csv")
+    rag.save_embeddings_to_csv(path, "book.pdf", list(range(1, 13)), vectors.tolist(),
+                               [f"chunk {i}" for i in range(12)])
+    return path, vectors
+
+
+def _cache_queries(vectors, dimensions):
+    # Queries are cached by (model, API dimensions, text), so no embeddings request is made
+    cache = registry.get("query_embeddings")
+    for i, vector in enumerate(vectors):
+        cache.put((rag.EMBEDDING_MODEL, dimensions, f"query {i}"), [vector])
+
+
+def _search(index, count):
+    embeddings = asyncio.run(rag.embed_queries(None, [f"query {i}" for i in range(count)], index=index))
+    return rag.search_many(index, embeddings)[0].tolist()
+
+
+def test_truncation_matches_the_api():
+    truncated = rag.truncate(np.array([[3.0, 4.0, 12.0], [0.0, 0.0, 1.0]]), 2)
+    assert np.allclose(truncated, [[0.6, 0.8], [0.0, 0.0]])
+
+
+def test_full_size_index_finds_each_chunk(full_index):
+    path, vectors = full_index
+    index = rag.load_index(path)
+    assert rag.read_index_metadata(path) == rag.FULL_SIZE_METADATA
+    _cache_queries(vectors, None)
+    assert _search(index, len(vectors)) == list(range(len(vectors)))
+
+
+@pytest.mark.parametrize("reduction", rag.REDUCTIONS)
+def test_reduced_index_records_how_queries_are_reduced(full_index, tmp_path, reduction):
+    source, vectors = full_index
+    target = str(tmp_path / f"book.{reduction}.csv")
+    rag.reduce_index(source, target, DIMENSIONS, reduction)
+    metadata = rag.read_index_metadata(target)
+    assert (metadata["dimensions"], metadata["reduction"]) == (DIMENSIONS, reduction)
+    with pytest.raises(ValueError):
+        rag.reduce_index(target, str(tmp_path / "again.csv"), 2, reduction)
+
+    index = rag.load_index(target)
+    assert index["vectors"].shape == (len(vectors), DIMENSIONS)
+    if reduction == "api":
+        # The API returns the reduced embedding itself
+        _cache_queries(rag.truncate(vectors, DIMENSIONS), DIMENSIONS)
+    else:
+        # Full size query embeddings, projected like the index's
+        _cache_queries(vectors, None)
+    assert _search(index, len(vectors)) == list(range(len(vectors)))
+
+    # The published, memory-mapped copy answers the same
+    index_dir = str(tmp_path / f"index_{reduction}")
+    rag.publish_index(target, index_dir)
+    mapped = rag.load_index(index_dir)
+    assert isinstance(mapped["vectors"], np.memmap) and mapped["metadata"]["reduction"] == reduction
+    assert _search(mapped, len(vectors)) == list(range(len(vectors)))
+    assert mapped["embeddings"][3]["context"] == "chunk 3"
+
+
+def test_unknown_reduction_fails_before_embedding(tmp_path, monkeypatch):
+    monkeypatch.setattr(rag, "CSV_FILE_PATH", str(tmp_path / "embeddings.csv"))
+    monkeypatch.setattr(rag, "EMBEDDING_DIMENSIONS", 256)
+    monkeypatch.setattr(rag, "EMBEDDING_REDUCTION", "umap")
+    with pytest.raises(ValueError, match="Unknown reduction 'umap'"):
+        asyncio.run(rag.ensure_embeddings(None, pdf_path=str(tmp_path / "missing.pdf")))
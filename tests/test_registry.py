@@ -0,0 +1,97 @@
+import threading
+import time
+import uuid
+
+import pytest
+
+from services import registry
+
+
+def _name():
+    return f"test_{uuid.uuid4().hex}"
+
+
+def test_concurrent_first_gets_build_once():
+    name, builds = _name(), []
+
+    def factory():
+        builds.append(1)
+        time.sleep(0.05)
+        return object()
+    registry.register(name, factory)
+    values = []
+    threads = [threading.Thread(target=lambda: values.append(registry.get(name))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(builds) == 1 and len({id(value) for value in values}) == 1
+    assert registry.stats()[name]["builds"] == 1 and registry.stats()[name]["hits"] == 7
+
+
+def test_registering_again_keeps_the_built_resource():
+    name = _name()
+    registry.register(name, lambda: "first")
+    assert registry.get(name) == "first"
+    registry.register(name, lambda: "second")
+    assert registry.get(name) == "first"
+    registry.invalidate(name)
+    assert registry.get(name) == "second"
+
+
+def test_unknown_resource():
+    with pytest.raises(KeyError):
+        registry.get(_name())
+
+
+def test_invalidate_closes_only_unleased_resources():
+    name, closed = _name(), []
+    registry.register(name, object, close=closed.append)
+    first = registry.get(name)
+    registry.invalidate(name)
+    assert closed == [first]
+    with registry.lease(name) as leased:
+        registry.invalidate(name)
+        assert closed == [first]
+    assert leased is not first and registry.get(name) is not leased
+
+
+def test_leased_resource_closes_at_shutdown_after_its_last_lease(monkeypatch):
+    name, closed = _name(), []
+    registry.register(name, object, close=closed.append)
+    value = registry.acquire(name)
+    monkeypatch.setattr(registry, "_shutting_down", True)
+    with pytest.raises(RuntimeError):
+        registry.get(_register_unbuilt())
+    registry.release(name)
+    assert closed == [value]
+
+
+def _register_unbuilt():
+    name = _name()
+    registry.register(name, object)
+    return name
+
+
+def test_submit_runs_in_the_background_and_logs_errors(capsys):
+    assert registry.submit(lambda x: x * 2, 21).result(5) == 42
+    future = registry.submit(lambda: 1 / 0)
+    with pytest.raises(ZeroDivisionError):
+        future.result(5)
+    # The done callbacks run on the worker thread, possibly just after result() returned
+    output, deadline = "", time.time() + 5
+    while (registry.stats()["thread_pool"]["refs"] or "task failed" not in output) and time.time() < deadline:
+        output += capsys.readouterr().out
+        time.sleep(0.01)
+    assert "Background task failed: division by zero" in output
+    assert registry.stats()["thread_pool"]["refs"] == 0
+
+
+def test_lru_cache_evicts_the_least_recently_used():
+    cache = registry.LruCache(2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+    assert cache.get("b") is None and cache.get("a") == 1 and cache.get("c") == 3
+    assert cache.stats() == {"entries": 2, "max_entries": 2, "hits": 3, "misses": 1, "hit_rate": 0.75}
@@ -0,0 +1,41 @@
+import asyncio
+import threading
+
+import pytest
+
+from services import requirements
+
+
+@pytest.fixture
+def slow_converse(monkeypatch):
+    started = threading.Event()
+
+    async def converse(messages):
+        started.set()
+        for word in ("Vision", " statement"):
+            await asyncio.sleep(0.05)
+            yield word
+    monkeypatch.setattr(requirements, "converse", converse)
+    monkeypatch.setattr(requirements, "system_requirements_prompt", lambda name, description: "system")
+    return started
+
+
+def test_documents_cancelled_before_and_during_the_run(slow_converse):
+    run = requirements.DocumentRun("Product", "", ["Vision Statement", "RACI Matrix", "Ecosystem map"])
+    run.cancel("RACI Matrix")
+    run.start()
+    assert slow_converse.wait(5)
+    run.cancel("Ecosystem map")
+    assert run._finished.wait(5)
+    assert {kind: document["status"] for kind, document in run.documents.items()} == {
+        "Vision Statement": "done", "RACI Matrix": "cancelled", "Ecosystem map": "cancelled"}
+    assert run.documents["Vision Statement"]["text"] == "Vision statement"
+
+
+def test_cancelling_a_finished_run_is_harmless(slow_converse):
+    run = requirements.DocumentRun("Product", "", ["Vision Statement"])
+    run.start()
+    assert run._finished.wait(5)
+    run.cancel("Vision Statement")
+    run.cancel("Unknown type")
+    assert run.documents["Vision Statement"]["status"] == "done"
@@ -0,0 +1,35 @@
+import asyncio
+import json
+import os
+
+from services import requirements_batch
+
+
+async def _fake_converse(messages):
+    yield f"Document for {messages[-1]['content']}"
+
+
+def test_products_with_the_same_slug_get_their_own_directories():
+    assert requirements_batch.slugify("C++ Tools") == requirements_batch.slugify("C Tools")
+    assert requirements_batch.product_slug("C++ Tools") != requirements_batch.product_slug("C Tools")
+    assert requirements_batch.product_slug("C++ Tools") == requirements_batch.product_slug("C++ Tools")
+
+
+def test_resumed_batch_counts_only_this_runs_skipped_documents(tmp_path, monkeypatch):
+    monkeypatch.setattr(requirements_batch, "converse", _fake_converse)
+    monkeypatch.setattr(requirements_batch, "system_requirements_prompt", lambda name, description: "system")
+    monkeypatch.setattr(requirements_batch, "requirements_messages",
+                        lambda name, description, kind, system: [{"role": "user", "content": f"{name} {kind}"}])
+    products = [{"product_name": "C++ Tools", "product_description": ""},
+                {"product_name": "C Tools", "product_description": ""}]
+    output = str(tmp_path)
+
+    first = asyncio.run(requirements_batch.generate_batch(products, output, ["Vision Statement", "RACI Matrix"]))
+    assert (first["generated"], first["skipped"], first["failed"]) == (4, 0, 0)
+    assert len({os.path.dirname(item["path"]) for item in first["documents"]}) == 2
+
+    # Only one of the products is asked for now: the other one's documents are not "skipped"
+    second = asyncio.run(requirements_batch.generate_batch(products[:1], output, ["Vision Statement"]))
+    assert (second["generated"], second["skipped"]) == (0, 1)
+    with open(os.path.join(output, requirements_batch.SUMMARY_FILE)) as summary_file:
+        assert json.load(summary_file)["skipped"] == 1
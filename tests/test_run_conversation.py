@@ -0,0 +1,30 @@
+import asyncio
+
+import helpers.util
+
+
+def _run(monkeypatch, chunks):
+    async def fake_converse(messages):
+        for chunk in chunks:
+            yield chunk
+
+    monkeypatch.setattr(helpers.util, "converse", fake_converse)
+    blocks = []
+    _, response = asyncio.run(helpers.util.run_conversation([], on_block=blocks.append))
+    return blocks, response
+
+
+def test_closed_blocks_are_passed_on(monkeypatch):
+    blocks, _ = _run(monkeypatch, ["Here:\n```diff\n", "-a\n+b\n", "```\nDone."])
+    assert [block["code"] for block in blocks] == ["-a\n+b"]
+
+
+def test_block_cut_off_by_the_end_of_the_stream_is_dropped(monkeypatch):
+    blocks, _ = _run(monkeypatch, ["Here:\n```diff\n", "-a\n+b\n"])
+    assert blocks == []
+
+
+def test_block_cut_off_by_an_error_is_dropped(monkeypatch):
+    blocks, response = _run(monkeypatch, ["Here:\n```diff\n", "-a\n", "oaiEXCEPTION timeout"])
+    assert blocks == []
+    assert "trouble" in response
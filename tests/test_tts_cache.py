@@ -0,0 +1,48 @@
+from collections import OrderedDict
+
+import pytest
+
+from services import tts_cache
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(tts_cache, "TTS_CACHE_DIR", str(tmp_path / "clips"))
+    monkeypatch.setattr(tts_cache, "TTS_CACHE_PATH", str(tmp_path / "tts.sqlite3"))
+    monkeypatch.setattr(tts_cache, "_memory", OrderedDict())
+    monkeypatch.setattr(tts_cache, "_memory_bytes", 0)
+    monkeypatch.setattr(tts_cache, "_stats", {"memory_hits": 0, "disk_hits": 0, "misses": 0, "seconds_saved": 0.0})
+    return tmp_path
+
+
+def test_keys_ignore_whitespace_but_not_the_voice():
+    voice = {"tld": "com", "slow": False}
+    assert tts_cache.cache_key("Hello  world.\n", "en", voice) == tts_cache.cache_key("Hello world.", "en", voice)
+    assert tts_cache.cache_key("Hello world.", "en", voice) != tts_cache.cache_key("Hello world.", "en",
+                                                                                    {**voice, "tld": "co.uk"})
+    assert tts_cache.cache_key("Hello world.", "en", voice) != tts_cache.cache_key("Hello world.", "fr", voice)
+
+
+def test_hits_come_from_memory_then_disk(cache, monkeypatch):
+    assert tts_cache.get("missing") is None
+    tts_cache.put("key", b"mp3", synthesis_seconds=1.5)
+    assert tts_cache.get("key") == b"mp3"
+    # A new process only has the disk tier
+    monkeypatch.setattr(tts_cache, "_memory", OrderedDict())
+    assert tts_cache.get("key") == b"mp3"
+    stats = tts_cache.stats()
+    assert (stats["memory_hits"], stats["disk_hits"], stats["misses"]) == (1, 1, 1)
+    assert stats["seconds_saved"] == stats["lifetime_seconds_saved"] == 3.0
+    assert (stats["entries"], stats["disk_bytes"]) == (1, 3)
+
+
+def test_both_tiers_are_bounded(cache, monkeypatch):
+    monkeypatch.setattr(tts_cache, "TTS_MEMORY_CACHE_MAX_BYTES", 20)
+    monkeypatch.setattr(tts_cache, "TTS_CACHE_MAX_BYTES", 30)
+    for i in range(4):
+        tts_cache.put(f"key{i}", bytes(10), synthesis_seconds=1.0)
+    assert list(tts_cache._memory) == ["key2", "key3"]
+    # The disk tier evicts the least recently used clips down to 90% of its bound
+    assert tts_cache.stats()["disk_bytes"] <= 27
+    monkeypatch.setattr(tts_cache, "_memory", OrderedDict())
+    assert [tts_cache.get(f"key{i}") is not None for i in range(4)] == [False, False, True, True]
@@ -0,0 +1,54 @@
+import sys
+import threading
+
+import pytest
+
+from services import warmup
+
+
+@pytest.fixture
+def fresh_status(monkeypatch):
+    monkeypatch.setattr(warmup, "_status", {"started_at": None, "finished_at": None, "steps": {}})
+
+
+@pytest.fixture
+def frequent_thread_switches():
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    yield
+    sys.setswitchinterval(interval)
+
+
+def test_status_can_be_read_while_steps_finish(monkeypatch, fresh_status, frequent_thread_switches):
+    steps = [(f"step_{i}", lambda: None) for i in range(2000)]
+    monkeypatch.setattr(warmup, "STEPS", steps)
+    monkeypatch.setattr(warmup, "print", lambda *args: None, raising=False)
+    errors = []
+    done = threading.Event()
+
+    def read():
+        while not done.is_set():
+            try:
+                warmup.status()
+            except RuntimeError as e:
+                errors.append(e)
+
+    reader = threading.Thread(target=read)
+    reader.start()
+    try:
+        result = warmup.warm_up()
+    finally:
+        done.set()
+        reader.join()
+    assert errors == []
+    assert len(result["steps"]) == len(steps)
+    assert result["finished_at"] >= result["started_at"]
+
+
+def test_failing_step_is_recorded(monkeypatch, fresh_status):
+    def fail():
+        raise ValueError("no index")
+    monkeypatch.setattr(warmup, "STEPS", [("broken", fail), ("fine", lambda: "done")])
+    steps = warmup.warm_up()["steps"]
+    assert steps["broken"]["error"] == "ValueError: no index"
+    assert (steps["fine"]["note"], steps["fine"]["error"]) == ("done", None)